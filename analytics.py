@@ -0,0 +1,240 @@
+"""Submission history as a user x day matrix, and vectorized analytics on it.
+
+The SubmissionIndex bitmaps are unpacked into a `uint16` matrix of
+submissions per user per day (`History`). The export is an `.npz` holding
+that matrix column-packed as one bit per user-day plus a sparse list of
+repeat submissions, the usernames / real names, the first date and the
+paused-day mask. Everything below is whole-matrix NumPy, so years of
+history for thousands of users stay well under a second.
+
+    python analytics.py --export [--report report.csv]
+"""
+import argparse
+import csv
+import datetime
+import io
+import os
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
+
+# ================== CONFIG ==================
+
+HISTORY_PATH = os.getenv("HISTORY_PATH", "cpbot_history.npz")
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+# ================== HISTORY ==================
+
+@dataclass
+class History:
+    users: np.ndarray      # (U,) usernames
+    names: np.ndarray      # (U,) real names
+    start: datetime.date   # date of column 0
+    counts: np.ndarray     # (U, D) uint16 submissions per user per day
+    paused: np.ndarray     # (D,) bool, paused days don't count
+
+    @property
+    def days(self):
+        return self.counts.shape[1]
+
+    @property
+    def end(self):
+        return self.start + datetime.timedelta(days=self.days - 1)
+
+    @cached_property
+    def submitted(self):
+        """(U, D) bool: submitted at least once on a counted (not paused) day."""
+        return (self.counts > 0) & ~self.paused
+
+    @classmethod
+    def from_index(cls, index, registered_users, paused_dates, start=None, end=None):
+        """Materialize the index for `registered_users` ({username: real name})."""
+        end = end or datetime.date.today()
+        start = start or index.first_day() or end
+        users = list(registered_users)
+        days, rows = index.export(users, start, end)
+
+        width = (days + 7) // 8
+        packed = b"".join(rows[u][0].to_bytes(width, "little") for u in users)
+        bits = np.frombuffer(packed, dtype=np.uint8).reshape(len(users), width)
+        counts = np.unpackbits(bits, axis=1, bitorder="little")[:, :days].astype(np.uint16)
+        for i, u in enumerate(users):
+            for offset, extra in rows[u][1].items():
+                counts[i, offset] += extra
+
+        paused = np.zeros(days, dtype=bool)
+        for d in paused_dates:
+            offset = (datetime.date.fromisoformat(d) - start).days
+            if 0 <= offset < days:
+                paused[offset] = True
+
+        return cls(
+            users=np.array(users, dtype=str),
+            names=np.array([registered_users[u] for u in users], dtype=str),
+            start=start,
+            counts=counts,
+            paused=paused,
+        )
+
+    def save(self, path=HISTORY_PATH):
+        """Write the history as an .npz (atomically): day bits plus sparse repeat counts."""
+        repeat_user, repeat_day = np.nonzero(self.counts > 1)
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            users=self.users,
+            names=self.names,
+            start=np.array(self.start.toordinal()),
+            days=np.array(self.days),
+            bits=np.packbits(self.counts > 0, axis=1, bitorder="little"),
+            repeat_user=repeat_user.astype(np.int32),
+            repeat_day=repeat_day.astype(np.int32),
+            repeat_count=self.counts[repeat_user, repeat_day],
+            paused=self.paused,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=HISTORY_PATH):
+        with np.load(path) as data:
+            days = int(data["days"])
+            counts = np.unpackbits(data["bits"], axis=1, bitorder="little")[:, :days].astype(np.uint16)
+            counts[data["repeat_user"], data["repeat_day"]] = data["repeat_count"]
+            return cls(
+                users=data["users"],
+                names=data["names"],
+                start=datetime.date.fromordinal(int(data["start"])),
+                counts=counts,
+                paused=data["paused"],
+            )
+
+
+# ================== ANALYTICS ==================
+
+def first_submission(history):
+    """(U,) column of each user's first submission; `days` for users who never submitted."""
+    submitted = history.counts > 0
+    first = submitted.argmax(axis=1)
+    first[~submitted.any(axis=1)] = history.days
+    return first
+
+
+def consistency(history):
+    """(U,) share of counted days each user submitted on, from their first submission on."""
+    active = ~history.paused
+    # counted days from each column to the end (plus 0 for "never submitted")
+    remaining = np.append(np.cumsum(active[::-1])[::-1], 0)
+    eligible = remaining[first_submission(history)]
+    hits = np.count_nonzero(history.submitted, axis=1)
+    return np.divide(hits, eligible, out=np.zeros(len(eligible)), where=eligible > 0)
+
+
+def trailing_rate(history, window):
+    """(U,) share of counted days with a submission over the last `window` days."""
+    counted = np.count_nonzero(~history.paused[-window:])
+    hits = np.count_nonzero(history.submitted[:, -window:], axis=1)
+    return hits / counted if counted else np.zeros(len(hits))
+
+
+def cohorts(history):
+    """Users grouped by the month of their first submission.
+
+    Returns [(cohort "YYYY-MM", users, mean consistency, mean 30-day rate)], oldest first.
+    """
+    first = first_submission(history)
+    started = first < history.days
+    if not started.any():
+        return []
+    month_of_column = np.array(
+        [(history.start + datetime.timedelta(days=c)).strftime("%Y-%m") for c in range(history.days)]
+    )
+    labels, group = np.unique(month_of_column[first[started]], return_inverse=True)
+    size = np.bincount(group)
+    cons = np.bincount(group, weights=consistency(history)[started]) / size
+    rate30 = np.bincount(group, weights=trailing_rate(history, 30)[started]) / size
+    return list(zip(labels.tolist(), size.tolist(), cons.tolist(), rate30.tolist()))
+
+
+def weekday_heatmap(history):
+    """(U, 7) share of counted Mondays..Sundays each user submitted on."""
+    weekday = (history.start.weekday() + np.arange(history.days)) % 7
+    onehot = (weekday[:, None] == np.arange(7)[None, :]) & ~history.paused[:, None]   # (D, 7)
+    hits = history.submitted.astype(np.float32) @ onehot.astype(np.float32)
+    counted = onehot.sum(axis=0)
+    return np.divide(hits, counted, out=np.zeros(hits.shape, dtype=np.float32), where=counted > 0)
+
+
+# ================== REPORT ==================
+
+def build_report(history):
+    """(csv text, short text summary) for the admin report."""
+    cons = consistency(history)
+    rate7 = trailing_rate(history, 7)
+    rate30 = trailing_rate(history, 30)
+    heat = weekday_heatmap(history)
+    first = first_submission(history)
+    total = history.counts.sum(axis=1)
+
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["Real Name", "Username", "First Submission", "Submissions", "Days Submitted",
+                     "Consistency", "7-day Rate", "30-day Rate", *WEEKDAYS])
+    days_submitted = np.count_nonzero(history.counts, axis=1)
+    dates = [(history.start + datetime.timedelta(days=c)).isoformat() for c in range(history.days)] + [""]
+    columns = zip(
+        history.names.tolist(), history.users.tolist(), [dates[f] for f in first.tolist()],
+        total.tolist(), days_submitted.tolist(),
+        np.char.mod("%.3f", cons).tolist(), np.char.mod("%.3f", rate7).tolist(),
+        np.char.mod("%.3f", rate30).tolist(), np.char.mod("%.2f", heat).tolist(),
+    )
+    rows = [[*row[:-1], *row[-1]] for row in columns]
+    order = np.argsort(-cons, kind="stable")
+    writer.writerows(rows[i] for i in order.tolist())
+
+    lines = [f"📈 {len(history.users)} users, {history.start} → {history.end} ({history.days} days)"]
+    if len(history.users):
+        overall = heat.mean(axis=0)
+        lines.append("Weekday rate: " + " ".join(f"{d} {v:.0%}" for d, v in zip(WEEKDAYS, overall)))
+        lines.append(f"Median consistency {np.median(cons):.0%}, mean 7-day rate {rate7.mean():.0%}, "
+                     f"30-day {rate30.mean():.0%}")
+    for label, size, c, r in cohorts(history)[-6:]:
+        lines.append(f"Cohort {label}: {size} users, consistency {c:.0%}, 30-day {r:.0%}")
+    return out.getvalue(), "\n".join(lines)
+
+
+# ================== CLI ==================
+
+def main():
+    parser = argparse.ArgumentParser(description="Export submission history and report on it")
+    parser.add_argument("--export", action="store_true",
+                        help=f"rebuild {HISTORY_PATH} from the bot's local state snapshot")
+    parser.add_argument("--report", metavar="CSV", help="write the per-user report here")
+    args = parser.parse_args()
+
+    if args.export:
+        from local_store import LocalStore, STORE_PATH
+        from submission_index import SubmissionIndex
+
+        store = LocalStore(STORE_PATH)
+        index = SubmissionIndex()
+        data, _ = store.load_snapshot("submission_index")
+        if data is None:
+            parser.error("no index snapshot in the local store yet; start the bot once first")
+        index.restore(data)
+        history = History.from_index(index, store.registrations(), store.paused_dates())
+        history.save()
+        print(f"💾 Exported {history.counts.shape[0]} users x {history.days} days to {HISTORY_PATH}")
+    else:
+        history = History.load()
+
+    report, summary = build_report(history)
+    print(summary)
+    if args.report:
+        with open(args.report, "w", newline="") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
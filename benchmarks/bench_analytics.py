@@ -0,0 +1,88 @@
+"""History export and vectorized analytics at scale.
+
+    python benchmarks/bench_analytics.py --users 5000 --days 1095
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from analytics import History, build_report, cohorts, consistency, trailing_rate, weekday_heatmap  # noqa: E402
+from submission_index import SubmissionIndex  # noqa: E402
+
+
+def rolling_rate(history, window):
+    """(U, D) share of counted days with a submission over the trailing `window` days, for every day.
+
+    The report only needs the last column (trailing_rate); the full matrix
+    is the reference it is checked against.
+    """
+    hits = np.cumsum(history.submitted, axis=1, dtype=np.int32)
+    hits[:, window:] -= hits[:, :-window]
+    counted = np.cumsum(~history.paused, dtype=np.int32)
+    counted[window:] -= counted[:-window].copy()
+    return hits / np.maximum(counted, 1).astype(np.float32)
+
+
+def timed(label, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    print(f"{label:<28}{(time.perf_counter() - t0) * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=3 * 365)
+    args = parser.parse_args()
+
+    random.seed(3)
+    users = [f"user{i}" for i in range(args.users)]
+    end = datetime.date(2025, 12, 31)
+    dates = [end - datetime.timedelta(days=n) for n in range(args.days)][::-1]
+    joined = {u: random.randrange(args.days) for u in users}
+    index = SubmissionIndex()
+    for i, d in enumerate(dates):
+        index.set_day(d, [u for u in users if joined[u] <= i and random.random() < 0.5])
+    paused = {d.isoformat() for d in dates[::23]}
+    registered = {u: u.title() for u in users}
+
+    t0 = time.perf_counter()
+    history = timed("matrix from index", lambda: History.from_index(index, registered, paused, end=end))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.npz")
+        timed("save .npz", lambda: history.save(path))
+        size = os.path.getsize(path)
+        loaded = timed("load .npz", lambda: History.load(path))
+    assert (loaded.counts == history.counts).all() and (loaded.paused == history.paused).all()
+    cons = timed("consistency", lambda: consistency(history))
+    rates = timed("trailing 7 + 30 day", lambda: (trailing_rate(history, 7), trailing_rate(history, 30)))
+    for window, rate in zip((7, 30), rates):
+        assert np.allclose(rate, rolling_rate(history, window)[:, -1]), f"{window}-day rate"
+    timed("cohorts", lambda: cohorts(history))
+    timed("weekday heatmap", lambda: weekday_heatmap(history))
+    timed("full csv report", lambda: build_report(history))
+    print(f"{'total':<28}{(time.perf_counter() - t0) * 1000:9.1f} ms "
+          f"({args.users} users x {args.days} days, .npz {size / 1024:.0f} KiB)")
+
+    # spot-check consistency against a plain loop
+    active = [d for d in dates if d.isoformat() not in paused]
+    for i in random.sample(range(args.users), 20):
+        u = users[i]
+        first = next((d for d in dates if index.submitted_on(u, d)), None)
+        eligible = [d for d in active if first and d >= first]
+        hit = sum(1 for d in eligible if index.submitted_on(u, d))
+        assert np.isclose(cons[i], hit / len(eligible) if eligible else 0), (u, cons[i])
+    print("consistency matches a plain loop on 20 sampled users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Bot commands and the form sync at scale, against the in-memory fakes.
+
+    python benchmarks/bench_commands.py --users 1000 --days 365
+
+Imports main.py (it no longer connects at import) with its store, images and
+form checkpoint in a temporary directory, points its gateway at a
+FakeSpreadsheet pre-filled with `--days` day sheets for `--users` users, and
+calls the command callbacks with fake contexts. For each operation it prints
+wall time, the Sheets API calls it made, and how long those calls would take
+at the simulated 60 requests/min quota (`--latency` per call on top).
+
+It finishes by checking a redeploy: a store rebuilt from the sheet keeps
+the sheet's row IDs, so a delete still removes the right row.
+"""
+import argparse
+import asyncio
+import datetime
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image  # noqa: E402
+
+from fakes import FakeAttachment, FakeContext, FakeSpreadsheet, FakeUser  # noqa: E402
+from sheet_layout import DAY_HEADER, get_layout  # noqa: E402
+from sheet_sync import SheetsFlusher  # noqa: E402
+from sheets_gateway import SheetsGateway  # noqa: E402
+
+
+def import_bot(tmp):
+    """Point the bot's paths into `tmp`, then import it; they are read at import.
+
+    Not done at module level: the recompression workers import this script
+    as `__mp_main__`, and must not make directories or build a second bot.
+    """
+    os.environ.setdefault("STORE_PATH", os.path.join(tmp, "state.db"))
+    os.environ.setdefault("IMAGE_DIR", os.path.join(tmp, "images"))
+    os.environ.setdefault("FORM_SYNC_CHECKPOINT", os.path.join(tmp, "form_checkpoint.json"))
+    import form_to_daily
+    import main
+    return form_to_daily, main
+
+
+def build_book(book, users, days, today, layout):
+    book.load("Registered_Users", [["Discord Username", "Real Name"]] + [[u, u.title()] for u in users])
+    dates = [today - datetime.timedelta(days=n) for n in range(days)]
+    book.load("Paused_Dates", [["Date"]] + [[d.isoformat()] for d in dates[5::30]])
+    sheets = {}
+    for d in reversed(dates):
+        ds = d.isoformat()
+        rows = sheets.setdefault(layout.title_for(ds), [DAY_HEADER])
+        rows += [[ds, u, f"http://img/{ds}/{u}.webp", "A"] for u in users if random.random() < 0.5]
+    for title, rows in sheets.items():
+        book.load(title, rows)
+
+
+def form_sheet(book, users, today, count):
+    """Form responses, kept in the same fake so their reads count against the same quota."""
+    header = ["Timestamp", "NAME", "DATE OF SUBMISSION", "PROBLEM NAME", "SCREENSHOT"]
+    rows = [header]
+    for i in range(count):
+        d = today - datetime.timedelta(days=random.randrange(3))
+        rows.append([f"t{i}", random.choice(users), d.strftime("%d/%m/%Y"), f"P{i}", f"http://form/{i}"])
+    return book.load("Form Responses 1", rows)
+
+
+def png(seed):
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (seed % 256, seed // 256 % 256, 7)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+async def check_rebuilt_store(today, tmp):
+    """Delete after a redeploy: the new store starts empty and is filled from the sheet."""
+    from local_store import LocalStore
+    ds = today.isoformat()
+    book = FakeSpreadsheet(quota_per_minute=0)
+    sheet = book.load(ds, [DAY_HEADER, [ds, "alice", "http://img/a", "A", "7"], [ds, "bob", "http://img/b", "B", "3"]])
+    gateway = SheetsGateway(lambda: book)
+    store = LocalStore(os.path.join(tmp, "rebuilt.db"))
+    per_day = await gateway.read_day_rows(get_layout("daily"), today, today)
+    assert store.merge_sheet_submissions(ds, per_day[ds]) == 2
+    store.add_submission(ds, "carol", "http://img/c", "C")
+    store.delete_last_submission(ds, "bob")
+    await SheetsFlusher(store, gateway, gateway.worksheet).flush()
+    ids = [row[4] for row in sheet.rows[1:]]
+    assert [row[1] for row in sheet.rows[1:]] == ["alice", "carol"], sheet.rows
+    assert ids[0] == "7" and len(set(ids)) == len(ids), ids
+    per_day = await gateway.read_day_rows(get_layout("daily"), today, today)
+    assert store.merge_sheet_submissions(ds, per_day[ds]) == 0, "bob's deleted row came back"
+    gateway.close()
+    store.close()
+
+
+class Report:
+    def __init__(self, book):
+        self.book = book
+        self.lines = []
+
+    async def measure(self, label, fn, repeat=1):
+        calls, virtual = self.book.snapshot()
+        t0 = time.perf_counter()
+        for i in range(repeat):
+            result = fn(i)
+            if asyncio.iscoroutine(result):
+                await result
+        wall = time.perf_counter() - t0
+        delta = self.book.calls - calls
+        self.lines.append((label, repeat, wall, delta, self.book.virtual_seconds() - virtual))
+
+    def print(self):
+        print(f"{'operation':<34}{'n':>5}{'ms/op':>10}{'calls':>8}{'at quota':>11}  by op")
+        for label, n, wall, delta, virtual in self.lines:
+            ops = ", ".join(f"{op}={c}" for op, c in sorted(delta.items()))
+            print(f"{label:<34}{n:>5}{wall / n * 1000:>10.2f}{sum(delta.values()):>8}{virtual:>10.1f}s  {ops}")
+
+
+async def run(args, tmp):
+    form_to_daily, main = import_bot(tmp)
+    random.seed(5)
+    users = [f"user{i}" for i in range(args.users)]
+    today = datetime.datetime.now(main.IST).date()
+    book = FakeSpreadsheet(latency=args.latency, quota_per_minute=args.quota)
+    layout = main.layout = get_layout(args.layout)
+    build_book(book, users, args.days, today, layout)
+
+    main.gateway = SheetsGateway(lambda: book)
+    main.flusher = SheetsFlusher(main.store, main.gateway, main.open_sheet)
+    if args.no_pipeline:
+        main.ingestor.pipeline = None
+
+    report = Report(book)
+    admin = FakeUser("admin", 1, administrator=True)
+    guild = object()
+    people = [FakeUser(u, 1000 + i) for i, u in enumerate(users)]
+    sample = random.sample(people, min(args.ops, len(people)))
+
+    await report.measure("startup: local state", lambda _: main.load_local_state())
+    await report.measure("startup: reconcile with sheets", lambda _: main.reconcile_with_sheets())
+    main.index_refresh.cancel()
+
+    confirmations = []
+
+    async def confirm(user_id, text):
+        confirmations.append(user_id)
+
+    main.confirm = confirm
+    await report.measure(
+        "submit (queue + reply)",
+        lambda i: main.submit.callback(
+            FakeContext(sample[i], attachments=[FakeAttachment(png(i))]), args=f"Problem {i}"
+        ),
+        repeat=len(sample),
+    )
+    main.jobs.start()
+    await report.measure("  submit jobs (image + store)", lambda _: main.jobs.drain())
+    assert len(confirmations) == len(sample), (len(confirmations), main.jobs.stats())
+    await report.measure("  flush submits to sheets", lambda _: main.flusher.flush())
+    await report.measure(
+        "status", lambda i: main.status.callback(FakeContext(sample[i])), repeat=len(sample)
+    )
+    await report.measure(
+        "streak", lambda i: main.streak.callback(FakeContext(sample[i])), repeat=len(sample)
+    )
+    await report.measure("leaderboard", lambda _: main.leaderboard.callback(FakeContext(admin, guild)), repeat=20)
+    await report.measure("  rebuild streaks", lambda _: main.rebuild_streaks(), repeat=5)
+    deleting = sample[: max(1, len(sample) // 4)]
+    await report.measure(
+        "delete", lambda i: main.delete.callback(FakeContext(deleting[i])), repeat=len(deleting)
+    )
+    await report.measure("  flush deletes to sheets", lambda _: main.flusher.flush())
+
+    for label, days in (("week", 7), ("month", 31), ("year", 365)):
+        start = today - datetime.timedelta(days=days - 1)
+        await report.measure(
+            f"count_submissions_between {label}",
+            lambda _: main.count_submissions_between(start, today),
+            repeat=20,
+        )
+
+    await report.measure("nightly aggregate (21:00)", lambda _: main.aggregator.get(today))
+    await report.measure("  reminder reads of the snapshot", lambda _: main.aggregator.get(today), repeat=4)
+    await report.measure("  /nightly", lambda _: main.nightly.callback(FakeContext(admin, guild)))
+    await report.measure("summarize", lambda _: main.summarize.callback(FakeContext(admin, guild)))
+    await report.measure(
+        "weeksummarize",
+        lambda _: main.weeksummarize.callback(FakeContext(admin, guild), today.isoformat()),
+    )
+
+    form_ws = form_sheet(book, users, today, args.form_rows)
+    await report.measure("form_to_daily sync (new rows)", lambda _: form_to_daily.sync(form_ws, book, layout=layout))
+    await report.measure(
+        "form_to_daily sync (nothing new)", lambda _: form_to_daily.sync(form_ws, book, layout=layout)
+    )
+
+    print(f"{args.users} users x {args.days} days, {layout.name} layout, {len(book._sheets)} sheets, "
+          f"{sum(len(ws.rows) for ws in book._sheets.values())} sheet rows, "
+          f"latency {args.latency * 1000:.0f} ms/call, quota {args.quota}/min")
+    report.print()
+    total = sum(book.calls.values())
+    print(f"total: {total} calls, {book.reads.throttled + book.writes.throttled:.1f}s throttled at quota")
+    await check_rebuilt_store(today, tmp)
+    print("redeploy: rebuilt store kept the sheet's row IDs, delete removed the right row")
+    await main.jobs.stop()
+    main.gateway.close()
+    if main.ingestor.pipeline is not None:
+        main.ingestor.pipeline.close()
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--ops", type=int, default=200, help="users that submit / status / delete")
+    parser.add_argument("--form-rows", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated seconds per API call")
+    parser.add_argument("--quota", type=int, default=60, help="requests per minute (0 = unlimited)")
+    parser.add_argument("--layout", choices=["daily", "monthly"], default="daily")
+    parser.add_argument("--no-pipeline", action="store_true", help="skip WebP recompression on submit")
+    args = parser.parse_args()
+    tmp = tempfile.mkdtemp(prefix="cpbot-bench-")
+    try:
+        asyncio.run(run(args, tmp))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    cli()
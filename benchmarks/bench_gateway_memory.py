@@ -0,0 +1,224 @@
+"""Gateway cache memory and startup work: GATEWAY_MODE=full (Intents.all()) vs. lean.
+
+    python benchmarks/bench_gateway_memory.py --guilds 2 --members 20000 --messages 5000
+
+There is no live gateway here, so each mode is fed the events Discord would
+send it, through discord.py's own parsers: GUILD_CREATE and, for full, the
+startup member chunks (1000 members per chunk, with presences) plus one
+presence update per online member. Both modes then receive the same
+`--messages` guild messages. Lean gets none of the member traffic because
+without the members/presences intents Discord does not send it. Python heap
+growth is measured with tracemalloc. Parse time comes from a second, untraced
+run, since tracing slows allocation down several times. The
+chunk count and payload bytes are what full mode has to wait for before
+on_ready.
+
+Resolving registered users for a reminder pass goes through the
+UserDirectory LRU. Its fetch_user calls are counted for two passes.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP = tempfile.mkdtemp(prefix="cpbot-gateway-")
+os.environ.setdefault("STORE_PATH", os.path.join(TMP, "state.db"))
+os.environ.setdefault("IMAGE_DIR", os.path.join(TMP, "images"))
+
+import discord  # noqa: E402
+from discord.state import ChunkRequest  # noqa: E402
+
+from main import gateway_options  # noqa: E402
+from local_store import LocalStore  # noqa: E402
+from notify import UserDirectory  # noqa: E402
+
+BOT_ID = 1
+CHUNK_SIZE = 1000
+ONLINE_SHARE = 0.3
+
+
+def user(uid):
+    return {"id": str(uid), "username": f"user{uid}", "discriminator": "0", "avatar": None, "global_name": None}
+
+
+def member(uid):
+    return {"user": user(uid), "roles": [], "joined_at": "2024-01-01T00:00:00+00:00",
+            "deaf": False, "mute": False, "flags": 0}
+
+
+def presence(uid):
+    return {"user": {"id": str(uid)}, "status": "online", "activities": [], "client_status": {"desktop": "online"}}
+
+
+def member_ids(guild_id, members):
+    return range(guild_id * 10**6, guild_id * 10**6 + members)
+
+
+def online(uid):
+    return uid % 100 < ONLINE_SHARE * 100
+
+
+def guild_create(guild_id, members, full):
+    ids = member_ids(guild_id, members)
+    first = ids[:250] if full else ids[:0]
+    return {
+        "id": str(guild_id), "name": f"guild{guild_id}", "owner_id": str(BOT_ID), "large": members > 250,
+        "member_count": members + 1, "features": [], "emojis": [], "stickers": [], "threads": [],
+        "voice_states": [], "stage_instances": [], "guild_scheduled_events": [],
+        "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+                   "hoist": False, "managed": False, "mentionable": False}],
+        "channels": [{"id": str(guild_id + 1), "type": 0, "name": "general", "position": 0,
+                      "permission_overwrites": []}],
+        "members": [member(BOT_ID)] + [member(uid) for uid in first],
+        "presences": [presence(uid) for uid in first if online(uid)] if full else [],
+    }
+
+
+def member_chunks(guild_id, members, nonce):
+    ids = member_ids(guild_id, members)
+    count = -(-members // CHUNK_SIZE)
+    for i in range(count):
+        part = ids[i * CHUNK_SIZE:(i + 1) * CHUNK_SIZE]
+        yield {"guild_id": str(guild_id), "members": [member(uid) for uid in part],
+               "presences": [presence(uid) for uid in part if online(uid)],
+               "chunk_index": i, "chunk_count": count, "nonce": nonce}
+
+
+def message(guild_id, n, members):
+    uid = member_ids(guild_id, members)[n % members]
+    return {"id": str(10**12 + n), "channel_id": str(guild_id + 1), "guild_id": str(guild_id),
+            "author": user(uid), "member": {k: v for k, v in member(uid).items() if k != "user"},
+            "content": "/submit two-sum", "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None,
+            "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [],
+            "embeds": [], "pinned": False, "type": 0}
+
+
+def guild_ids(guilds):
+    return [(g + 1) * 10**9 for g in range(guilds)]
+
+
+async def run_mode(mode, args, traced):
+    """(heap bytes or None, parse seconds, counts) after the mode's startup and message traffic."""
+    full = mode == "full"
+    client = discord.Client(**gateway_options(mode))
+    await client._async_setup_hook()
+    st = client._connection
+    st.user = discord.ClientUser(state=st, data=user(BOT_ID))
+    stats = {"bytes": 0, "chunks": 0, "need_chunking": 0}
+
+    def feed(parse, payload):
+        stats["bytes"] += len(json.dumps(payload))
+        started = time.perf_counter()
+        parse(payload)
+        return time.perf_counter() - started
+
+    gc.collect()
+    if traced:
+        tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    parse = 0.0
+    for gid in guild_ids(args.guilds):
+        parse += feed(st._get_create_guild, guild_create(gid, args.members, full))
+        guild = st._get_guild(gid)
+        if st._guild_needs_chunking(guild):
+            stats["need_chunking"] += 1
+            request = ChunkRequest(gid, 0, asyncio.get_running_loop(), st._get_guild, cache=True)
+            st._chunk_requests[request.nonce] = request
+            for chunk in member_chunks(gid, args.members, request.nonce):
+                stats["chunks"] += 1
+                parse += feed(st.parse_guild_members_chunk, chunk)
+            for uid in member_ids(gid, args.members):
+                if online(uid):
+                    update = {**presence(uid), "guild_id": str(gid)}
+                    parse += feed(st.parse_presence_update, update)
+    startup_bytes = stats["bytes"]
+    for n in range(args.messages):
+        gid = guild_ids(args.guilds)[n % args.guilds]
+        parse += feed(st.parse_message_create, message(gid, n, args.members))
+    gc.collect()
+    heap = tracemalloc.get_traced_memory()[0] - base if traced else None
+    tracemalloc.stop()
+
+    counts = {
+        "members": sum(len(g.members) for g in client.guilds),
+        "users": len(client.users),
+        "messages": len(client.cached_messages),
+        "chunks": stats["chunks"],
+        "need_chunking": stats["need_chunking"],
+        "startup_bytes": startup_bytes,
+    }
+    await client.close()
+    return heap, parse, counts
+
+
+class DirectoryBot:
+    """get_user/fetch_user for UserDirectory, counting fetches."""
+
+    def __init__(self):
+        self.fetched = 0
+
+    def get_user(self, user_id):
+        return None   # lean mode: no member cache to find registered users in
+
+    async def fetch_user(self, user_id):
+        self.fetched += 1
+        return discord.Object(user_id)
+
+
+async def lru_passes(registered, cache_size):
+    directory = UserDirectory(LocalStore(os.path.join(TMP, "directory.db")), cache_size=cache_size)
+    for i in range(registered):
+        directory.remember(SimpleNamespace(name=f"u{i}", id=i))
+    fake = DirectoryBot()
+    passes = []
+    for _ in range(2):
+        before = fake.fetched
+        for i in range(registered):
+            await directory.resolve(fake, f"u{i}")
+        passes.append(fake.fetched - before)
+    return passes, directory.cached_count()
+
+
+async def run(args):
+    results = {}
+    for mode in ("full", "lean"):
+        heap, _, counts = await run_mode(mode, args, traced=True)
+        _, parse, _ = await run_mode(mode, args, traced=False)
+        results[mode] = heap, parse, counts
+    print(f"{args.guilds} guild(s) x {args.members} members, {args.messages} messages, "
+          f"{ONLINE_SHARE:.0%} online")
+    print(f"{'mode':6} {'heap':>9} {'parse':>9} {'members':>8} {'users':>7} {'messages':>8} "
+          f"{'chunks':>6} {'startup payload':>15}")
+    for mode, (heap, parse, c) in results.items():
+        print(f"{mode:6} {heap / 1024:7.0f}KB {parse * 1000:7.0f}ms {c['members']:8} {c['users']:7} "
+              f"{c['messages']:8} {c['chunks']:6} {c['startup_bytes'] / 2**20:13.1f}MB")
+    full, lean = results["full"], results["lean"]
+    print(f"lean holds {full[0] / max(lean[0], 1):.0f}x less heap, parses {full[1] / max(lean[1], 1e-9):.1f}x less, "
+          f"and skips {full[2]['chunks']} chunk(s) from {full[2]['need_chunking']} guild(s) before on_ready")
+
+    passes, held = await lru_passes(args.registered, args.cache_size)
+    print(f"directory LRU ({args.cache_size} users) for {args.registered} registered: "
+          f"fetch_user calls per reminder pass {passes[0]} then {passes[1]}, {held} users held")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=2)
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--registered", type=int, default=200)
+    parser.add_argument("--cache-size", type=int, default=256)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
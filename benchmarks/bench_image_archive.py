@@ -0,0 +1,129 @@
+"""Tiered image archive: inode count and disk use before/after compaction, and serving cost.
+
+    python benchmarks/bench_image_archive.py --images 5000 --old 0.9
+
+Builds a throwaway content-addressed tree, with a screenshot and a
+thumbnail per image, and ages `--old` of it past IMAGE_ARCHIVE_AFTER_DAYS.
+It records every URL's ETag from a running ImageServer, runs
+image_archive.compact() and fetches every URL again. Bytes and ETags must
+be unchanged, and a Range and a conditional request are checked on a
+packed image. Latency is reported for loose and packed images over a
+keep-alive connection. A second compaction with a quota shows old images
+being dropped and the then mostly-dead pack being rewritten.
+"""
+import argparse
+import hashlib
+import http.client
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import image_archive  # noqa: E402
+import image_server  # noqa: E402
+
+
+class QuietHandler(image_server.ImageHandler):
+    def log_message(self, *args):
+        pass
+
+
+def make_tree(root, images, old_share, now):
+    """{relpath: bytes}; the first `old_share` of images get mtimes 31..400 days back."""
+    rng = random.Random(7)
+    files = {}
+    for i in range(images):
+        data = rng.randbytes(rng.randint(20_000, 120_000))
+        digest = hashlib.sha256(data).hexdigest()
+        base = f"{digest[:2]}/{digest[2:4]}/{digest}"
+        age = rng.uniform(31, 400) if i < images * old_share else rng.uniform(0, 29)
+        for rel, body in ((f"{base}.webp", data), (f"{base}.thumb.webp", data[:4000])):
+            path = root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(body)
+            mtime = now - age * 86400
+            os.utime(path, (mtime, mtime))
+            files[rel] = body
+    return files
+
+
+def tree_usage(root):
+    """(inodes, allocated bytes) under root, directories included."""
+    inodes = blocks = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            st = os.lstat(os.path.join(dirpath, name))
+            inodes += 1
+            blocks += st.st_blocks * 512
+    return inodes, blocks
+
+
+def fetch(conn, rel, headers=None):
+    started = time.perf_counter()
+    conn.request("GET", "/" + rel, headers=headers or {})
+    resp = conn.getresponse()
+    body = resp.read()
+    return resp.status, resp.getheader("ETag"), body, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=5000)
+    parser.add_argument("--old", type=float, default=0.9, help="share of images past the archive age")
+    args = parser.parse_args()
+
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        files = make_tree(root, args.images, args.old, now)
+        before = tree_usage(root)
+
+        server = image_server.ImageServer(("127.0.0.1", 0), root, QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+        etags = {rel: fetch(conn, rel)[1] for rel in files}
+
+        started = time.perf_counter()
+        report = image_archive.compact(root, now=now)
+        elapsed = time.perf_counter() - started
+        after = tree_usage(root)
+
+        loose, packed = [], []
+        for rel, body in files.items():
+            status, etag, got, seconds = fetch(conn, rel)
+            assert status == 200 and got == body, f"{rel}: {status}, {len(got)} bytes"
+            assert etag == etags[rel], f"{rel}: ETag changed"
+            (loose if (root / rel).exists() else packed).append(seconds)
+        rel = next(r for r in files if not (root / r).exists())
+        status, _, got, _ = fetch(conn, rel, {"Range": "bytes=100-199"})
+        assert status == 206 and got == files[rel][100:200]
+        assert fetch(conn, rel, {"If-None-Match": etags[rel]})[0] == 304
+        assert fetch(conn, f"{image_archive.PACK_DIR}/{image_archive.INDEX_NAME}")[0] == 404
+
+        print(f"{args.images} images + thumbnails, {args.old:.0%} older than {image_archive.ARCHIVE_AFTER_DAYS:.0f} days")
+        print(f"before: {before[0]:6} inodes, {before[1] / 2**20:7.1f} MiB allocated")
+        print(f"after:  {after[0]:6} inodes, {after[1] / 2**20:7.1f} MiB allocated "
+              f"({report['archived']} files packed into {report['packs']} pack(s) in {elapsed:.2f}s)")
+        print(f"GET loose  median {statistics.median(loose) * 1000:.3f} ms over {len(loose)}")
+        print(f"GET packed median {statistics.median(packed) * 1000:.3f} ms over {len(packed)}, "
+              "bytes and ETags unchanged, Range and 304 OK")
+
+        total = report["live_bytes"] + report["loose_bytes"]
+        quota = total // 2
+        second = image_archive.compact(root, quota_bytes=quota, now=now)
+        missing = sum(fetch(conn, rel)[0] == 404 for rel in files)
+        print(f"quota {quota / 2**20:.0f} MiB: dropped {second['dropped']} oldest archived images ({missing} URLs now 404), "
+              f"{second['live_bytes'] / 2**20:.0f} MiB live in {second['pack_bytes'] / 2**20:.0f} MiB of packs")
+        conn.close()
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
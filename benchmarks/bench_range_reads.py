@@ -0,0 +1,90 @@
+"""Per-day col_values loop vs batched values_batch_get for count_submissions_between.
+
+Runs against the shared FakeSpreadsheet (benchmarks/fakes.py), sleeping a
+fixed latency per API call, so it needs no credentials:
+
+    python benchmarks/bench_range_reads.py --users 300 --latency 0.05
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gspread.exceptions import WorksheetNotFound  # noqa: E402
+
+import bulk_reader  # noqa: E402
+from fakes import FakeSpreadsheet  # noqa: E402
+
+
+def build(days, users, latency):
+    book = FakeSpreadsheet(latency=latency, quota_per_minute=0, sleep=True)
+    names = [f"user{i}" for i in range(users)]
+    today = datetime.date(2025, 12, 31)
+    for offset in range(days):
+        d = (today - datetime.timedelta(days=offset)).strftime("%Y-%m-%d")
+        rows = [["Date", "Username", "Screenshot", "Problem"]]
+        rows += [[d, u, "", ""] for u in names if random.random() < 0.6]
+        book.load(d, rows)
+    return book, names, today
+
+
+def count_loop(book, names, start, end):
+    """The original count_submissions_between: two API calls per day."""
+    counts = {u: 0 for u in names}
+    current = start
+    while current <= end:
+        try:
+            ws = book.worksheet(current.strftime("%Y-%m-%d"))
+            for uname in ws.col_values(2)[1:]:
+                if uname in counts:
+                    counts[uname] += 1
+        except WorksheetNotFound:
+            pass
+        current += datetime.timedelta(days=1)
+    return counts
+
+
+def count_batched(book, names, start, end):
+    # Titles come from the worksheet catalog in the bot, which costs no call.
+    titles = sorted(t for t in book._sheets if start.strftime("%Y-%m-%d") <= t <= end.strftime("%Y-%m-%d"))
+    counts = {u: 0 for u in names}
+    for submitted in bulk_reader.read_columns(book, titles, "B").values():
+        for uname in submitted:
+            if uname in counts:
+                counts[uname] += 1
+    return counts
+
+
+def run(label, fn, book, names, start, end):
+    book.calls.clear()
+    t0 = time.perf_counter()
+    result = fn(book, names, start, end)
+    elapsed = time.perf_counter() - t0
+    calls = sum(book.calls.values())
+    print(f"  {label:<8} {calls:>5} API calls  {elapsed * 1000:>9.1f} ms  {dict(book.calls)}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per API call")
+    args = parser.parse_args()
+
+    random.seed(7)
+    book, names, today = build(366, args.users, args.latency)
+    for label, days in (("week", 7), ("4-day", 4), ("month", 31), ("year", 365)):
+        start = today - datetime.timedelta(days=days - 1)
+        print(f"{label} ({days} days, {args.users} users, {args.latency * 1000:.0f} ms/call)")
+        old = run("loop", count_loop, book, names, start, today)
+        new = run("batched", count_batched, book, names, start, today)
+        assert old == new, "batched reader disagrees with the per-day loop"
+
+
+if __name__ == "__main__":
+    main()
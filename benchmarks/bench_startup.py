@@ -0,0 +1,132 @@
+"""Time until the bot can answer commands: local snapshot vs. the old Sheets-first startup.
+
+    python benchmarks/bench_startup.py --users 1000 --days 365 --latency 0.4
+
+The local path is main.load_local_state itself, run against a throwaway
+SQLite store that STORE_PATH points at before main is imported. The old path
+is replayed against a FakeSpreadsheet holding the same users, which really
+sleeps `--latency` per call: authorize + open_by_key, the worksheet list,
+Registered_Users, Paused_Dates and the four recent day sheets, one after
+another and merged into a fresh store, which is what on_ready awaited
+before any registered user was known.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import FakeSpreadsheet  # noqa: E402
+from submission_index import SubmissionIndex  # noqa: E402
+
+
+def import_bot(tmp):
+    """main.py with its store and images in `tmp`.
+
+    main and local_store read both paths at import, so nothing here imports
+    either before this runs.
+    """
+    os.environ["STORE_PATH"] = os.path.join(tmp, "state.db")
+    os.environ["IMAGE_DIR"] = os.path.join(tmp, "images")
+    import main as cpbot
+    return cpbot
+
+
+def build_store(path, users, dates, today):
+    from local_store import LocalStore
+    store = LocalStore(path)
+    for u in users:
+        store.register(u, u.title())
+    for d in dates[::17]:
+        store.pause(d.isoformat())
+    index = SubmissionIndex()
+    for d in dates:
+        index.set_day(d, [u for u in users if random.random() < 0.5])
+    store.save_snapshot("submission_index", index.snapshot())
+    for u in users[: len(users) // 2]:
+        store.add_submission(today.isoformat(), u, "http://img/x.webp", "A")
+    store.ack_ops([seq for seq, *_ in store.pending_ops(10 ** 9)])
+    store.close()
+
+
+def build_book(users, dates, today, latency):
+    """The sheets the old startup read, filled like build_store fills the store."""
+    book = FakeSpreadsheet(latency=latency, quota_per_minute=0, sleep=True)
+    book.load("Registered_Users", [["Discord Username", "Real Name"]] + [[u, u.title()] for u in users])
+    book.load("Paused_Dates", [["Date"]] + [[d.isoformat()] for d in dates[::17]])
+    for offset in range(4):
+        d = (today - datetime.timedelta(days=offset)).isoformat()
+        rows = [[d, u, "http://img/x.webp", "A"] for u in users[: len(users) // 2]] if offset == 0 else []
+        book.load(d, [["Date", "Username", "Screenshot", "Problem"]] + rows)
+    return book
+
+
+def load_from_sheets(book, path, today, state):
+    """The pre-snapshot on_ready: every read in sequence, merged into the store, then loaded."""
+    book.charge("authorize")
+    book.charge("open_by_key")
+    from local_store import LocalStore
+    sheets = {ws.title: ws for ws in book.worksheets()}
+    store = LocalStore(path)
+    store.merge_sheet_registrations(sheets["Registered_Users"].get_all_values()[1:])
+    store.merge_sheet_paused_dates(d for d in sheets["Paused_Dates"].col_values(1)[1:] if d)
+    for offset in range(4):
+        d = (today - datetime.timedelta(days=offset)).isoformat()
+        store.merge_sheet_submissions(d, sheets[d].get_all_values()[1:])
+    registered, paused, today_counts = state
+    registered.update(store.registrations())
+    paused.update(store.paused_dates())
+    today_counts.update(store.submission_counts(today.isoformat()))
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--latency", type=float, default=0.4, help="seconds per Sheets round trip")
+    args = parser.parse_args()
+
+    random.seed(13)
+    users = [f"user{i}" for i in range(args.users)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cpbot = import_bot(tmp)
+        today = datetime.datetime.now(cpbot.IST).date()   # what main's recent_dates / today_str use
+        dates = [today - datetime.timedelta(days=n) for n in range(args.days)][::-1]
+        path = os.environ["STORE_PATH"]
+        build_store(path, users, dates, today)
+        size = os.path.getsize(path)
+
+        def loaded():
+            return (dict(cpbot.registered_users), set(cpbot.paused_dates), dict(cpbot.submissions_today),
+                    cpbot.index.snapshot())
+
+        t0 = time.perf_counter()
+        cpbot.load_local_state()
+        local = time.perf_counter() - t0
+
+        first = loaded()
+        cpbot.load_local_state()  # a reconnect / second load must not change anything
+        assert loaded() == first, "reloading local state is not idempotent"
+
+        book = build_book(users, dates, today, args.latency)
+        sheets_state = ({}, set(), {})
+        t0 = time.perf_counter()
+        load_from_sheets(book, os.path.join(tmp, "sheets.db"), today, sheets_state)
+        old = time.perf_counter() - t0
+        assert sheets_state == first[:3], "sheets-first startup loaded different state"
+
+    calls = sum(book.calls.values())
+    print(f"store on disk: {size / 1024:.0f} KiB for {args.users} users x {args.days} days")
+    print(f"local snapshot load:   {local * 1000:7.1f} ms")
+    print(f"sheets-first startup:  {old * 1000:7.1f} ms ({calls} sequential calls at {args.latency}s each)")
+    print(f"time to first command: {old / local:.0f}x sooner, reload is idempotent")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""SubmissionIndex popcount queries vs the per-day set scans they replace.
+
+    python benchmarks/bench_submission_index.py --users 5000 --days 1095
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from submission_index import SubmissionIndex  # noqa: E402
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=3 * 365)
+    args = parser.parse_args()
+
+    random.seed(11)
+    users = [f"user{i}" for i in range(args.users)]
+    end = datetime.date(2025, 12, 31)
+    dates = [end - datetime.timedelta(days=n) for n in range(args.days)][::-1]
+    per_day = {d: [u for u in users if random.random() < 0.5] for d in dates}
+    for d in dates[::9]:  # some users submit twice on a day
+        per_day[d] += per_day[d][:20]
+    paused = set(dates[::17])
+
+    index = SubmissionIndex()
+    _, load = timed(lambda: [index.set_day(d, per_day[d]) for d in dates])
+    print(f"load {args.users} users x {args.days} days: {load * 1000:.0f} ms")
+
+    for label, days in (("week", 7), ("month", 31), ("year", 365), ("all", args.days)):
+        start = end - datetime.timedelta(days=days - 1)
+        window = [d for d in dates if start <= d]
+
+        def scan():
+            counts = {u: 0 for u in users}
+            for d in window:
+                if d in paused:
+                    continue
+                for u in per_day[d]:
+                    counts[u] += 1
+            return counts
+
+        def scan_days():
+            sets = [set(per_day[d]) for d in window]
+            return {u: sum(1 for day in sets if u in day) for u in users}
+
+        expected, t_scan = timed(scan)
+        got, t_index = timed(lambda: index.submissions_between(users, start, end, skip=paused))
+        assert got == expected, f"{label}: submission counts differ"
+        expected_days, t_scan_days = timed(scan_days)
+        got_days, t_index_days = timed(lambda: index.days_between(users, start, end))
+        assert got_days == expected_days, f"{label}: day counts differ"
+
+        per_user = t_index / args.users * 1e6
+        print(
+            f"{label:>5}: submissions scan {t_scan * 1000:8.1f} ms  index {t_index * 1000:6.1f} ms"
+            f" ({per_user:.2f} us/user) | days scan {t_scan_days * 1000:8.1f} ms"
+            f"  index {t_index_days * 1000:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
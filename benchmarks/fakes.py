@@ -0,0 +1,312 @@
+"""In-memory stand-ins for the Google Sheets and Discord surfaces the bot uses.
+
+`FakeSpreadsheet` implements the gspread Spreadsheet/Worksheet calls made by
+main.py, form_to_daily.py, bulk_reader and report_writer. Every call is
+counted per operation, can sleep a fixed `latency`, and is charged against a
+simulated per-minute quota on a virtual clock, so a benchmark can report how
+long a run would take at 60 requests/min without actually waiting for it.
+
+The Discord side is just enough for calling command callbacks directly:
+`FakeContext`, `FakeUser`, `FakeAttachment`.
+"""
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter, deque
+
+import requests
+from gspread.exceptions import APIError, WorksheetNotFound
+
+READ_OPS = {"worksheets", "worksheet", "col_values", "get_all_values", "row_values", "get",
+            "values_batch_get"}
+
+_RANGE = re.compile(r"^(?:'((?:[^']|'')*)'!|([^'!]+)!)?([A-Z]+)(\d+)?(?::([A-Z]+)(\d+)?)?$")
+
+
+def _api_error(code, message):
+    response = requests.models.Response()
+    response.status_code = code
+    response._content = json.dumps({"error": {"code": code, "message": message}}).encode()
+    return APIError(response)
+
+
+def _col_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+def parse_range(a1):
+    """(title or None, first_col, last_col, first_row, last_row or None), zero-based columns."""
+    m = _RANGE.match(a1)
+    if not m:
+        raise ValueError(f"unsupported range {a1!r}")
+    quoted, bare, c1, r1, c2, r2 = m.groups()
+    title = quoted.replace("''", "'") if quoted is not None else bare
+    first_row = int(r1) if r1 else 1
+    if c2 is None:
+        return title, _col_index(c1), _col_index(c1), first_row, first_row
+    return title, _col_index(c1), _col_index(c2), first_row, int(r2) if r2 else None
+
+
+# ================== QUOTA ==================
+
+class Quota:
+    """Per-minute request quota on a virtual clock.
+
+    `mode="throttle"` advances the clock until the request fits (what a
+    well-behaved client would wait); `mode="error"` raises a 429 APIError the
+    way Google does.
+    """
+
+    def __init__(self, per_minute=60, mode="throttle"):
+        self.per_minute = per_minute
+        self.mode = mode
+        self.clock = 0.0
+        self.throttled = 0.0
+        self.rejected = 0
+        self._window = deque()
+
+    def charge(self, latency):
+        if self.per_minute:
+            while self._window and self._window[0] <= self.clock - 60:
+                self._window.popleft()
+            if len(self._window) >= self.per_minute:
+                if self.mode == "error":
+                    self.rejected += 1
+                    raise _api_error(429, "Quota exceeded (simulated)")
+                wait = self._window[0] + 60 - self.clock
+                self.throttled += wait
+                self.clock += wait
+                self._window.popleft()
+            self._window.append(self.clock)
+        self.clock += latency
+
+
+# ================== SHEETS ==================
+
+class FakeWorksheet:
+    def __init__(self, book, title, sheet_id, rows=None):
+        self.book = book
+        self.title = title
+        self.id = sheet_id
+        self.rows = rows if rows is not None else []
+
+    def __repr__(self):
+        return f"<FakeWorksheet {self.title!r} rows={len(self.rows)}>"
+
+    def _slice(self, first_col, last_col, first_row, last_row):
+        body = self.rows[first_row - 1:last_row]
+        out = [row[first_col:last_col + 1] for row in body]
+        for row in out:
+            while row and row[-1] == "":
+                row.pop()
+        while out and not out[-1]:
+            out.pop()
+        return out
+
+    def _write(self, first_col, first_row, values):
+        for r, row in enumerate(values):
+            idx = first_row - 1 + r
+            while len(self.rows) <= idx:
+                self.rows.append([])
+            target = self.rows[idx]
+            for c, value in enumerate(row):
+                while len(target) <= first_col + c:
+                    target.append("")
+                target[first_col + c] = value
+
+    # ---- gspread surface ----
+
+    def _append(self, rows):
+        first = len(self.rows) + 1
+        self.rows.extend([str(v) for v in row] for row in rows)
+        escaped = self.title.replace("'", "''")
+        return {"updates": {"updatedRange": f"'{escaped}'!A{first}:E{len(self.rows)}",
+                            "updatedRows": len(rows)}}
+
+    def append_row(self, row, **kwargs):
+        self.book.charge("append_row")
+        return self._append([row])
+
+    def append_rows(self, rows, **kwargs):
+        self.book.charge("append_rows")
+        return self._append(rows)
+
+    def col_values(self, col):
+        self.book.charge("col_values")
+        values = [row[col - 1] if len(row) >= col else "" for row in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def row_values(self, row):
+        self.book.charge("row_values")
+        return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def get_all_values(self):
+        self.book.charge("get_all_values")
+        width = max((len(r) for r in self.rows), default=0)
+        return [r + [""] * (width - len(r)) for r in self.rows]
+
+    def get(self, a1):
+        self.book.charge("get")
+        _, c1, c2, r1, r2 = parse_range(a1)
+        return self._slice(c1, c2, r1, r2)
+
+    def delete_rows(self, index, end_index=None):
+        self.book.charge("delete_rows")
+        del self.rows[index - 1:(end_index or index)]
+
+
+class FakeSpreadsheet:
+    """A spreadsheet held in memory; `calls` counts API calls per operation."""
+
+    def __init__(self, latency=0.0, quota_per_minute=60, quota_mode="throttle", sleep=False):
+        self.latency = latency
+        self.sleep = sleep
+        self.calls = Counter()
+        self.reads = Quota(quota_per_minute, quota_mode)
+        self.writes = Quota(quota_per_minute, quota_mode)
+        self._sheets = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()   # the gateway calls in from several pool threads
+
+    def charge(self, op):
+        with self._lock:
+            self.calls[op] += 1
+            (self.reads if op in READ_OPS else self.writes).charge(self.latency)
+        if self.sleep and self.latency:
+            time.sleep(self.latency)
+
+    def snapshot(self):
+        """Counters to diff around an operation."""
+        return Counter(self.calls), self.virtual_seconds()
+
+    def virtual_seconds(self):
+        """Time the calls so far would take, one after another, under the quota (latency + throttling)."""
+        return self.reads.clock + self.writes.clock
+
+    def load(self, title, rows):
+        """Create a sheet with rows directly, without charging any calls (test setup)."""
+        ws = FakeWorksheet(self, title, next(self._ids), [list(map(str, r)) for r in rows])
+        self._sheets[title] = ws
+        return ws
+
+    def _get(self, title):
+        try:
+            return self._sheets[title]
+        except KeyError:
+            raise WorksheetNotFound(title) from None
+
+    # ---- gspread surface ----
+
+    def worksheets(self):
+        self.charge("worksheets")
+        return list(self._sheets.values())
+
+    def worksheet(self, title):
+        self.charge("worksheet")
+        return self._get(title)
+
+    def add_worksheet(self, title, rows=1000, cols=26, index=None):
+        self.charge("add_worksheet")
+        if title in self._sheets:
+            raise _api_error(400, f'A sheet with the name "{title}" already exists.')
+        return self.load(title, [])
+
+    def del_worksheet(self, ws):
+        self.charge("del_worksheet")
+        self._sheets.pop(ws.title, None)
+
+    def values_batch_get(self, ranges, params=None):
+        self.charge("values_batch_get")
+        out = []
+        for a1 in ranges:
+            title, c1, c2, r1, r2 = parse_range(a1)
+            out.append({"range": a1, "values": self._get(title)._slice(c1, c2, r1, r2)})
+        return {"valueRanges": out}
+
+    def values_batch_update(self, body):
+        self.charge("values_batch_update")
+        for item in body.get("data", []):
+            title, c1, _, r1, _ = parse_range(item["range"])
+            self._get(title)._write(c1, r1, item["values"])
+
+    def batch_update(self, body):
+        self.charge("batch_update")
+        by_id = {ws.id: ws for ws in self._sheets.values()}
+        for request in body.get("requests", []):
+            if "deleteSheet" in request:
+                ws = by_id.pop(request["deleteSheet"]["sheetId"])
+                del self._sheets[ws.title]
+                continue
+            if "deleteDimension" in request:
+                span = request["deleteDimension"]["range"]
+                del by_id[span["sheetId"]].rows[span["startIndex"]:span["endIndex"]]
+                continue
+            cells = request.get("updateCells")
+            if not cells:
+                continue  # formatting requests have nothing to store
+            start = cells["start"]
+            values = [
+                [next(iter(c["userEnteredValue"].values())) for c in row["values"]]
+                for row in cells["rows"]
+            ]
+            by_id[start["sheetId"]]._write(start["columnIndex"], start["rowIndex"] + 1, values)
+
+
+# ================== DISCORD ==================
+
+class FakeUser:
+    def __init__(self, name, user_id, administrator=False):
+        self.name = name
+        self.id = user_id
+        self.guild_permissions = type("Permissions", (), {"administrator": administrator})()
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content)
+
+
+class FakeAttachment:
+    """A small in-memory attachment; read() avoids any download."""
+
+    def __init__(self, data, filename="shot.png", content_type="image/png"):
+        self.data = data
+        self.filename = filename
+        self.content_type = content_type
+        self.size = len(data)
+        self.url = f"https://cdn.invalid/{filename}"
+
+    async def read(self):
+        return self.data
+
+
+class FakeMessage:
+    def __init__(self, author, attachments=(), message_id=None):
+        self.author = author
+        self.attachments = list(attachments)
+        self.id = message_id
+
+
+class FakeContext:
+    """Just what the commands touch: guild, author, message, reply/send."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, author, guild=None, attachments=()):
+        self.author = author
+        self.guild = guild
+        self.channel = None
+        self.message = FakeMessage(author, attachments, next(self._ids))
+        self.replies = []
+
+    async def reply(self, content=None, **kwargs):
+        self.replies.append(content)
+
+    async def send(self, content=None, **kwargs):
+        self.replies.append(content)
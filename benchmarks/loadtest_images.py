@@ -0,0 +1,197 @@
+"""Load test: legacy SimpleHTTPRequestHandler server vs image_server.ImageServer.
+
+Creates a temporary sharded image tree, starts each server in its own
+process (so it does not share a GIL with the clients) and hammers it with
+concurrent keep-alive clients, reporting requests/second and latency
+percentiles. A few --slow clients dribble their request headers in, the way
+a phone on a poor link does; a single-threaded server stalls behind them.
+Point --url at a running server to test that instead.
+
+    python benchmarks/loadtest_images.py --clients 32 --seconds 5
+    python benchmarks/loadtest_images.py --url http://127.0.0.1:8080 --paths paths.txt
+"""
+import argparse
+import hashlib
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The server image_server.py replaced, verbatim apart from the quiet log.
+LEGACY_SERVER = """
+import os, sys
+from http.server import SimpleHTTPRequestHandler, HTTPServer
+class H(SimpleHTTPRequestHandler):
+    def log_message(self, *a): pass
+os.chdir(sys.argv[1])
+HTTPServer(("127.0.0.1", int(sys.argv[2])), H).serve_forever()
+"""
+
+NEW_SERVER = """
+import sys
+sys.path.insert(0, sys.argv[3])
+import image_server
+class H(image_server.ImageHandler):
+    def log_message(self, *a): pass
+image_server.ImageServer(("127.0.0.1", int(sys.argv[2])), sys.argv[1], H).serve_forever()
+"""
+
+
+def make_tree(root, files, size):
+    paths = []
+    for i in range(files):
+        data = os.urandom(size)
+        digest = hashlib.sha256(data).hexdigest()
+        rel = f"{digest[:2]}/{digest[2:4]}/{digest}.png"
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel).write_bytes(data)
+        paths.append("/" + rel)
+    return paths
+
+
+def client(host, port, paths, deadline, latencies, errors, revalidate):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    etags = {}
+    while time.perf_counter() < deadline:
+        path = random.choice(paths)
+        headers = {}
+        if revalidate and path in etags:
+            headers["If-None-Match"] = etags[path]
+        t0 = time.perf_counter()
+        try:
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status not in (200, 304):
+                errors.append(resp.status)
+            if resp.getheader("ETag"):
+                etags[path] = resp.getheader("ETag")
+            if resp.getheader("Connection", "").lower() == "close" or resp.version == 10:
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=10)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - t0)
+    conn.close()
+
+
+def slow_client(host, port, paths, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=10) as sock:
+                request = f"GET {random.choice(paths)} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n"
+                for byte in request.encode():
+                    sock.sendall(bytes([byte]))
+                    time.sleep(0.01)
+                while sock.recv(65536):
+                    pass
+        except OSError:
+            pass
+
+
+def run_load(label, host, port, paths, clients, seconds, revalidate=False, slow=0):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=client, args=(host, port, paths, deadline, latencies, errors, revalidate))
+        for _ in range(clients)
+    ]
+    threads += [
+        threading.Thread(target=slow_client, args=(host, port, paths, deadline), daemon=True)
+        for _ in range(slow)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    n = len(latencies)
+    if not n:
+        print(f"{label:<26} no successful requests ({len(errors)} errors)")
+        return
+
+    def pct(p):
+        return latencies[min(n - 1, int(n * p))] * 1000
+
+    print(
+        f"{label:<26} {n / seconds:>8.0f} req/s   p50 {pct(0.50):6.2f} ms"
+        f"   p99 {pct(0.99):7.2f} ms   errors {len(errors)}"
+    )
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn(code, root):
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, "-c", code, str(root), str(port), REPO])
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return proc, port
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size", type=int, default=200_000, help="bytes per test image")
+    parser.add_argument("--slow", type=int, default=2, help="slow clients mixed into the load")
+    parser.add_argument("--url", help="test an already running server instead")
+    parser.add_argument("--paths", help="file with one URL path per line (with --url)")
+    args = parser.parse_args()
+
+    if args.url:
+        target = urlsplit(args.url)
+        paths = [line.strip() for line in open(args.paths) if line.strip()]
+        run_load(args.url, target.hostname, target.port or 80, paths, args.clients, args.seconds,
+                 slow=args.slow)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        paths = make_tree(root, args.files, args.size)
+        print(f"{args.files} files x {args.size} bytes, {args.clients} clients, {args.seconds:.0f}s each")
+
+        proc, port = spawn(LEGACY_SERVER, root)
+        try:
+            run_load("legacy HTTPServer", "127.0.0.1", port, paths, args.clients, args.seconds)
+            run_load(f"legacy + {args.slow} slow", "127.0.0.1", port, paths, args.clients,
+                     args.seconds, slow=args.slow)
+        finally:
+            proc.kill()
+
+        proc, port = spawn(NEW_SERVER, root)
+        try:
+            run_load("ImageServer", "127.0.0.1", port, paths, args.clients, args.seconds)
+            run_load(f"ImageServer + {args.slow} slow", "127.0.0.1", port, paths, args.clients,
+                     args.seconds, slow=args.slow)
+            run_load("ImageServer (304 reval)", "127.0.0.1", port, paths, args.clients,
+                     args.seconds, revalidate=True)
+        finally:
+            proc.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import os
+from urllib.parse import quote
+
+# ================== CONFIG ==================
+
+# values:batchGet takes its ranges in the query string, so keep each request
+# well below both the range count and the URL length Google accepts.
+BATCH_GET_MAX_RANGES = int(os.getenv("BATCH_GET_MAX_RANGES", 100))
+BATCH_GET_MAX_URL_CHARS = int(os.getenv("BATCH_GET_MAX_URL_CHARS", 6000))
+
+
+def a1_range(title, column, first_row=2, last_column=None):
+    """A1 range for one column (or columns up to `last_column`) of a worksheet, from `first_row` down."""
+    escaped = title.replace("'", "''")
+    return f"'{escaped}'!{column}{first_row}:{last_column or column}"
+
+
+def a1_cell(title, column, row):
+    escaped = title.replace("'", "''")
+    return f"'{escaped}'!{column}{row}"
+
+
+def chunk_ranges(ranges, max_ranges=BATCH_GET_MAX_RANGES, max_chars=BATCH_GET_MAX_URL_CHARS):
+    """Split ranges into batches that fit a single values:batchGet request."""
+    chunk, size = [], 0
+    for r in ranges:
+        cost = len("&ranges=") + len(quote(r, safe=""))
+        if chunk and (len(chunk) >= max_ranges or size + cost > max_chars):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(r)
+        size += cost
+    if chunk:
+        yield chunk
+
+
+def read_rows(spreadsheet, titles, first_column, last_column, first_row=2):
+    """Rows `first_column:last_column` of many worksheets via batched values_batch_get.
+
+    Returns {title: [[cells], ...]}, each row padded to the full width.
+    """
+    titles = list(titles)
+    width = ord(last_column) - ord(first_column) + 1
+    result = {title: [] for title in titles}
+    ranges = [a1_range(title, first_column, first_row, last_column) for title in titles]
+    by_range = dict(zip(ranges, titles))
+
+    for chunk in chunk_ranges(ranges):
+        response = spreadsheet.values_batch_get(chunk)
+        for requested, value_range in zip(chunk, response.get("valueRanges", [])):
+            result[by_range[requested]] = [
+                row + [""] * (width - len(row)) for row in value_range.get("values", [])
+            ]
+    return result
+
+
+def read_ranges(spreadsheet, ranges, width):
+    """{range: [[cells], ...]} for arbitrary A1 ranges, rows padded to `width`, in batched calls."""
+    result = {}
+    for chunk in chunk_ranges(list(ranges)):
+        response = spreadsheet.values_batch_get(chunk)
+        for requested, value_range in zip(chunk, response.get("valueRanges", [])):
+            result[requested] = [row + [""] * (width - len(row)) for row in value_range.get("values", [])]
+    return result
+
+
+def read_column_cells(spreadsheet, titles, column="B", first_row=2):
+    """Read one column from many worksheets with as few batchGet calls as possible.
+
+    Returns {title: [cell values]} where position i is row `first_row + i`
+    (empty cells come back as ""); every requested title is present.
+    """
+    titles = list(titles)
+    result = {title: [] for title in titles}
+    ranges = [a1_range(title, column, first_row) for title in titles]
+    by_range = dict(zip(ranges, titles))
+
+    for chunk in chunk_ranges(ranges):
+        response = spreadsheet.values_batch_get(chunk)
+        # Google echoes ranges normalised (e.g. "'2024-01-01'!B2:B300"), but keeps request order.
+        for requested, value_range in zip(chunk, response.get("valueRanges", [])):
+            values = value_range.get("values", [])
+            result[by_range[requested]] = [row[0] if row else "" for row in values]
+    return result
+
+
+def read_columns(spreadsheet, titles, column="B", first_row=2):
+    """Like read_column_cells, but with empty cells dropped."""
+    cells = read_column_cells(spreadsheet, titles, column, first_row)
+    return {title: [v for v in values if v] for title, values in cells.items()}
@@ -1,89 +1,203 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from datetime import datetime, date
-
-SCOPE = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive"
-]
-
-creds = ServiceAccountCredentials.from_json_keyfile_name(
-    "service_account.json", SCOPE
-)
-client = gspread.authorize(creds)
-
-# 🟢 GOOGLE FORM RESPONSE SHEET
-FORM_SHEET_ID = "1u7BWSXLXzDMaUCjuglw1MxPCHNoAGsDtlBG99k9_Plg"
-form_sheet = client.open_by_key(FORM_SHEET_ID)
-form_ws = form_sheet.worksheet("Form Responses 1")
-
-# 🔵 DISCORD BOT MASTER SHEET
-BOT_SHEET_ID = "1qPoJ0uBdVCQZMZYWRS6Bt60YjJnYUkD4OePSTRMiSrI"
-bot_sheet = client.open_by_key(BOT_SHEET_ID)
-
-rows = form_ws.get_all_records()
-
-print("📥 Total form rows found:", len(rows))  # DEBUG (keep it)
-
-# 🔒 DATE NORMALIZATION (FINAL + SAFE)
-from datetime import datetime, date
-
-
-def normalize_date(raw_date):
-    """
-    Convert Google Form date into YYYY-MM-DD
-    """
-    # Case 1: Google Sheets gives datetime.date
-    if isinstance(raw_date, date):
-        return raw_date.strftime("%Y-%m-%d")
-
-    # Case 2: Google Form gives string
-    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"):
-        try:
-            return datetime.strptime(raw_date, fmt).strftime("%Y-%m-%d")
-        except ValueError:
-            pass
-
-    raise ValueError(f"Unsupported date format: {raw_date}")
-
-
-def get_day_sheet(date_str):
-    try:
-        return bot_sheet.worksheet(date_str)
-    except:
-        ws = bot_sheet.add_worksheet(date_str, rows=300, cols=4)
-        ws.append_row(["Date", "Username", "Screenshot", "Problem"])
-        return ws
-
-for row in rows:
-    name = row.get("NAME")
-    problem = row.get("PROBLEM NAME")
-    raw_date = row.get("DATE OF SUBMISSION")
-    screenshot = row.get("SCREENSHOT")
-
-    if not raw_date or not name:
-        continue
-
-    try:
-        date_str = normalize_date(raw_date)
-    except Exception as e:
-        print("⚠️ Skipping row due to date error:", raw_date)
-        continue
-
-    day_ws = get_day_sheet(date_str)
-
-    existing = day_ws.get_all_values()
-    if any(r[1] == name and r[3] == problem for r in existing[1:]):
-        continue
-
-    day_ws.append_row([
-        date_str,
-        name,
-        screenshot,
-        problem
-    ])
-
-print("✅ Google Form → Discord Bot sheet sync DONE")
-
-
-
+import argparse
+import json
+import os
+import time
+from datetime import datetime, date
+
+from sheet_layout import DAY_HEADER, get_layout
+from sheets_client import QuotaHTTPClient, authorize
+
+SCOPE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# 🟢 GOOGLE FORM RESPONSE SHEET
+FORM_SHEET_ID = "1u7BWSXLXzDMaUCjuglw1MxPCHNoAGsDtlBG99k9_Plg"
+
+# 🔵 DISCORD BOT MASTER SHEET
+BOT_SHEET_ID = "1qPoJ0uBdVCQZMZYWRS6Bt60YjJnYUkD4OePSTRMiSrI"
+
+# Last form row already synced, so each run only reads what's new.
+CHECKPOINT_PATH = os.getenv("FORM_SYNC_CHECKPOINT", "form_sync_checkpoint.json")
+
+
+# 🔒 DATE NORMALIZATION (FINAL + SAFE)
+def normalize_date(raw_date):
+    """
+    Convert Google Form date into YYYY-MM-DD
+    """
+    # Case 1: Google Sheets gives datetime.date
+    if isinstance(raw_date, date):
+        return raw_date.strftime("%Y-%m-%d")
+
+    # Case 2: Google Form gives string
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(raw_date, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+
+    raise ValueError(f"Unsupported date format: {raw_date}")
+
+
+# ================== CHECKPOINT ==================
+
+def load_checkpoint():
+    try:
+        with open(CHECKPOINT_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"last_row": 1, "last_timestamp": None}
+
+
+def save_checkpoint(last_row, last_timestamp):
+    tmp = CHECKPOINT_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"last_row": last_row, "last_timestamp": last_timestamp}, f)
+    os.replace(tmp, CHECKPOINT_PATH)
+
+
+# ================== READ ==================
+
+def column_letter(n):
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def read_new_responses(form_ws, checkpoint, full):
+    """(records, last_row, last_timestamp) for form rows after the checkpoint.
+
+    The checkpointed row is re-read with the new ones; if its timestamp no
+    longer matches (rows were deleted or re-sorted) the whole sheet is read
+    again, which is safe because appends are deduplicated.
+    """
+    header = form_ws.row_values(1)
+    last_col = column_letter(len(header))
+    first_row = 2
+    values = None
+
+    if not full and checkpoint["last_row"] >= 2:
+        values = form_ws.get(f"A{checkpoint['last_row']}:{last_col}")
+        if values and values[0][:1] == [checkpoint["last_timestamp"]]:
+            values = values[1:]
+            first_row = checkpoint["last_row"] + 1
+        else:
+            print("⚠️ Checkpoint no longer matches the form sheet, doing a full sync")
+            values = None
+    if values is None:
+        values = form_ws.get(f"A2:{last_col}")
+
+    records = [dict(zip(header, row + [""] * (len(header) - len(row)))) for row in values]
+    if values:
+        last_row = first_row + len(values) - 1
+        last_timestamp = values[-1][0] if values[-1] else None
+    else:
+        last_row, last_timestamp = checkpoint["last_row"], checkpoint["last_timestamp"]
+    return records, last_row, last_timestamp
+
+
+def group_by_day(records, stats):
+    """{date_str: [[date, name, screenshot, problem], ...]} for the usable form rows."""
+    by_day = {}
+    for row in records:
+        name = row.get("NAME")
+        problem = row.get("PROBLEM NAME")
+        raw_date = row.get("DATE OF SUBMISSION")
+        screenshot = row.get("SCREENSHOT")
+
+        if not raw_date or not name:
+            stats["skipped"] += 1
+            continue
+
+        try:
+            date_str = normalize_date(raw_date)
+        except Exception as e:
+            print("⚠️ Skipping row due to date error:", raw_date)
+            stats["skipped"] += 1
+            continue
+
+        by_day.setdefault(date_str, []).append([date_str, name, screenshot, problem])
+    return by_day
+
+
+# ================== SYNC ==================
+
+def sync(form_ws, bot_sheet, full=False, dry_run=False, layout=None):
+    layout = layout or get_layout()
+    started = time.perf_counter()
+    stats = {"read": 0, "skipped": 0, "duplicates": 0, "appended": 0, "days": 0, "sheets_created": 0}
+
+    checkpoint = load_checkpoint()
+    records, last_row, last_timestamp = read_new_responses(form_ws, checkpoint, full)
+    stats["read"] = len(records)
+    print("📥 New form rows found:", len(records))
+
+    by_day = group_by_day(records, stats)
+    sheets = {ws.title: ws for ws in bot_sheet.worksheets()}
+
+    # One batched read of the existing rows of every affected sheet (day or month log).
+    present = sorted({layout.title_for(d) for d in by_day} & sheets.keys())
+    if by_day:
+        first, last = (datetime.strptime(d, "%Y-%m-%d").date() for d in (min(by_day), max(by_day)))
+        existing_rows = layout.read_rows(bot_sheet, present, first, last)
+    else:
+        existing_rows = {}
+
+    pending = {}   # {sheet title: [rows to append]}
+    for date_str, rows in sorted(by_day.items()):
+        seen = {(r[1], r[3]) for r in existing_rows.get(date_str, [])}
+        new_rows = []
+        for row in rows:
+            key = (row[1], row[3])
+            if key in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(key)
+            new_rows.append(row)
+
+        if not new_rows:
+            continue
+        stats["days"] += 1
+        stats["appended"] += len(new_rows)
+        pending.setdefault(layout.title_for(date_str), []).extend(new_rows)
+
+    for title, new_rows in pending.items():
+        if dry_run:
+            continue
+        if title in sheets:
+            sheets[title].append_rows(new_rows)
+        else:
+            ws = bot_sheet.add_worksheet(title, rows=layout.rows, cols=len(DAY_HEADER))
+            ws.append_rows([DAY_HEADER, *new_rows])
+            sheets[title] = ws
+            stats["sheets_created"] += 1
+
+    if not dry_run:
+        save_checkpoint(last_row, last_timestamp)
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync Google Form responses into the bot's day sheets")
+    parser.add_argument("--full", action="store_true", help="ignore the checkpoint and re-read every response")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be written, write nothing")
+    args = parser.parse_args()
+
+    client = authorize(SCOPE)
+    form_ws = client.open_by_key(FORM_SHEET_ID).worksheet("Form Responses 1")
+    bot_sheet = client.open_by_key(BOT_SHEET_ID)
+
+    stats = sync(form_ws, bot_sheet, full=args.full, dry_run=args.dry_run)
+    print("📊", ", ".join(f"{k}={v}" for k, v in stats.items()))
+    print("🌐 Sheets:", ", ".join(f"{k}={round(v, 2)}" for k, v in QuotaHTTPClient.stats.items()))
+    print("✅ Google Form → Discord Bot sheet sync DONE" + (" (dry run)" if args.dry_run else ""))
+
+
+if __name__ == "__main__":
+    main()
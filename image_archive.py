@@ -0,0 +1,374 @@
+"""Tiered screenshot storage: old images packed into large append-only files.
+
+Loose images (`ab/cd/<sha256>.<ext>` and their thumbnails) are packed once
+they are older than IMAGE_ARCHIVE_AFTER_DAYS. Each one is appended to
+`packs/pack-NNNNNN.pack` and recorded in the offset index `packs/index.db`
+(relpath -> pack, offset, length, mtime). Only after that commit is the
+loose file removed. The image server falls back to the index for paths
+that are not on disk and serves an `mmap` slice of the pack with the ETag
+the loose file had. Old URLs keep working and client caches stay valid,
+while the file and inode count stays flat however much history piles up.
+
+Retention is opt-in. IMAGE_RETENTION_DAYS drops archived images older than
+that, and IMAGE_QUOTA_BYTES drops the oldest archived images until
+everything fits. Those URLs then 404. Dropped or replaced entries leave
+dead bytes behind, and a pack that is mostly dead is rewritten into the
+active pack.
+
+    python image_archive.py compact [--dry-run]
+    python image_archive.py stats
+"""
+import argparse
+import fcntl
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from image_store import CONTENT_ADDRESSED
+
+# ================== CONFIG ==================
+
+IMAGE_DIR = Path(os.getenv("IMAGE_DIR", "/home/Chakradhar/cpbot_images"))
+ARCHIVE_AFTER_DAYS = float(os.getenv("IMAGE_ARCHIVE_AFTER_DAYS", 30))
+RETENTION_DAYS = float(os.getenv("IMAGE_RETENTION_DAYS", 0))      # 0 = keep forever
+QUOTA_BYTES = int(os.getenv("IMAGE_QUOTA_BYTES", 0))              # 0 = no quota
+PACK_MAX_BYTES = int(os.getenv("IMAGE_PACK_MAX_BYTES", 256 * 1024 * 1024))
+PACK_MIN_LIVE = float(os.getenv("IMAGE_PACK_MIN_LIVE", 0.5))      # rewrite packs below this live share
+
+PACK_DIR = "packs"
+INDEX_NAME = "index.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packs (
+    id     INTEGER PRIMARY KEY,
+    size   INTEGER NOT NULL,            -- committed bytes; anything past it is an interrupted append
+    sealed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS images (
+    relpath     TEXT PRIMARY KEY,
+    digest      TEXT NOT NULL,
+    pack        INTEGER NOT NULL,
+    offset      INTEGER NOT NULL,
+    length      INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,       -- of the loose file, so the served ETag doesn't change
+    archived_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_digest ON images(digest);
+CREATE INDEX IF NOT EXISTS images_pack ON images(pack);
+CREATE INDEX IF NOT EXISTS images_mtime ON images(mtime_ns);
+"""
+
+
+def pack_name(pack_id):
+    return f"pack-{pack_id:06d}.pack"
+
+
+def loose_images(root):
+    """(relpath, path, stat) of every content-addressed image stored as its own file."""
+    for path in Path(root).glob("??/??/*"):
+        rel = path.relative_to(root).as_posix()
+        if CONTENT_ADDRESSED.match(rel):
+            try:
+                yield rel, path, path.stat()
+            except FileNotFoundError:
+                continue
+
+
+# ================== INDEX ==================
+
+class PackArchive:
+    """The offset index plus the pack files it points into."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.dir = self.root / PACK_DIR
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.dir / INDEX_NAME), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def pack_path(self, pack_id):
+        return self.dir / pack_name(pack_id)
+
+    def lookup(self, relpath):
+        """(pack, offset, length, mtime_ns) of an archived image, or None."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT pack, offset, length, mtime_ns FROM images WHERE relpath = ?", (relpath,)
+            ).fetchone()
+
+    def find(self, digest):
+        """Relative path of an archived image with this hash; `.webp` wins, thumbnails never match."""
+        with self._lock:
+            rows = self._db.execute("SELECT relpath FROM images WHERE digest = ?", (digest,)).fetchall()
+        names = [r for (r,) in rows if ".thumb." not in r]
+        webp = [r for r in names if r.endswith(".webp")]
+        return (webp or names or [None])[0]
+
+    def stats(self):
+        """{"images", "live_bytes", "packs", "pack_bytes"}."""
+        with self._lock:
+            images, live = self._db.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM images").fetchone()
+            packs, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM packs").fetchone()
+        return {"images": images, "live_bytes": live, "packs": packs, "pack_bytes": size}
+
+    def pack_usage(self):
+        """[(pack id, committed size, live bytes, sealed)]."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT p.id, p.size, COALESCE(SUM(i.length), 0), p.sealed FROM packs p "
+                "LEFT JOIN images i ON i.pack = p.id GROUP BY p.id ORDER BY p.id"
+            ).fetchall()
+
+    def oldest(self, before_ns=None):
+        """[(relpath, length)] of archived images, oldest first (only older than `before_ns` if given)."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT relpath, length FROM images WHERE mtime_ns < ? ORDER BY mtime_ns",
+                (before_ns if before_ns is not None else 2**63 - 1,),
+            ).fetchall()
+
+    def entries(self, pack_id):
+        """[(relpath, digest, offset, length, mtime_ns)] still live in a pack."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT relpath, digest, offset, length, mtime_ns FROM images WHERE pack = ? ORDER BY offset",
+                (pack_id,),
+            ).fetchall()
+
+    # ---- writes (compaction only) ----
+
+    def append(self, items):
+        """Append [(relpath, digest, mtime_ns, data)] to the active pack(s) and index them.
+
+        Bytes are fsynced before the index commit, so a crash leaves at most an
+        unindexed tail, which the next append truncates away. An already
+        archived relpath is repointed at the new copy.
+        """
+        pack_id, size = self._active_pack()
+        f = open(self.pack_path(pack_id), "ab")
+        f.truncate(size)
+        rows = []
+        try:
+            for relpath, digest, mtime_ns, data in items:
+                if size and size + len(data) > PACK_MAX_BYTES:
+                    self._commit(f, pack_id, size, rows, seal=True)
+                    f.close()
+                    pack_id, size = self._active_pack()
+                    f = open(self.pack_path(pack_id), "ab")
+                    f.truncate(size)
+                    rows = []
+                f.write(data)
+                rows.append((relpath, digest, pack_id, size, len(data), mtime_ns, time.time()))
+                size += len(data)
+            self._commit(f, pack_id, size, rows)
+        finally:
+            f.close()
+
+    def drop(self, relpaths):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany("DELETE FROM images WHERE relpath = ?", [(r,) for r in relpaths])
+            self._db.execute("COMMIT")
+
+    def seal(self, pack_id):
+        """Stop appending to a pack (the next append starts a new one)."""
+        with self._lock:
+            self._db.execute("UPDATE packs SET sealed = 1 WHERE id = ?", (pack_id,))
+
+    def remove_pack(self, pack_id):
+        """Forget an empty pack and delete its file (readers with it mapped keep their view)."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            live = self._db.execute("SELECT COUNT(*) FROM images WHERE pack = ?", (pack_id,)).fetchone()[0]
+            if live:
+                self._db.execute("ROLLBACK")
+                raise ValueError(f"pack {pack_id} still holds {live} image(s)")
+            self._db.execute("DELETE FROM packs WHERE id = ?", (pack_id,))
+            self._db.execute("COMMIT")
+        try:
+            os.unlink(self.pack_path(pack_id))
+        except FileNotFoundError:
+            pass
+
+    def _active_pack(self):
+        """(id, committed size) of the pack appends go to, starting a new one when it is full."""
+        with self._lock:
+            row = self._db.execute("SELECT id, size FROM packs WHERE sealed = 0 ORDER BY id DESC LIMIT 1").fetchone()
+            if row is not None and row[1] < PACK_MAX_BYTES:
+                return row
+            if row is not None:
+                self._db.execute("UPDATE packs SET sealed = 1 WHERE id = ?", (row[0],))
+            last = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM packs").fetchone()[0]
+            self._db.execute("INSERT INTO packs (id, size) VALUES (?, 0)", (last + 1,))
+            return last + 1, 0
+
+    def _commit(self, f, pack_id, size, rows, seal=False):
+        f.flush()
+        os.fsync(f.fileno())
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.execute("UPDATE packs SET size = ?, sealed = ? WHERE id = ?", (size, int(seal), pack_id))
+            self._db.execute("COMMIT")
+
+
+# ================== READER ==================
+
+class PackReader:
+    """Archived images as zero-copy `mmap` slices, for the image server's threads.
+
+    The index is opened on first use, so a server started before the first
+    compaction picks it up later. Each pack is mapped once and remapped when
+    the active pack has grown past the mapping.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._archive = None
+        self._maps = {}   # {pack id: mmap}
+        self._lock = threading.Lock()
+
+    def open(self, relpath):
+        """(memoryview of the image bytes, mtime_ns) for an archived image, or None."""
+        archive = self._get_archive()
+        if archive is None:
+            return None
+        for _ in range(2):   # a pack rewritten between lookup and map: look up again
+            entry = archive.lookup(relpath)
+            if entry is None:
+                return None
+            pack_id, offset, length, mtime_ns = entry
+            mm = self._map(archive, pack_id, offset + length)
+            if mm is not None:
+                return memoryview(mm)[offset:offset + length], mtime_ns
+        return None
+
+    def _get_archive(self):
+        if self._archive is None and (self.root / PACK_DIR / INDEX_NAME).exists():
+            with self._lock:
+                if self._archive is None:
+                    self._archive = PackArchive(self.root)
+        return self._archive
+
+    def _map(self, archive, pack_id, end):
+        with self._lock:
+            mm = self._maps.get(pack_id)
+            if mm is not None and len(mm) >= end:
+                return mm
+            try:
+                with open(archive.pack_path(pack_id), "rb") as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (FileNotFoundError, ValueError):
+                return None
+            if len(mm) < end:
+                return None
+            self._maps[pack_id] = mm
+            # drop mappings of rewritten packs; views still being sent keep theirs alive
+            for gone in [p for p in self._maps if not archive.pack_path(p).exists()]:
+                del self._maps[gone]
+            return mm
+
+
+# ================== COMPACTION ==================
+
+def compact(root=IMAGE_DIR, archive_after_days=ARCHIVE_AFTER_DAYS, retention_days=RETENTION_DAYS,
+            quota_bytes=QUOTA_BYTES, dry_run=False, now=None):
+    """Pack old loose images, apply retention and quota, rewrite mostly-dead packs. Returns a report dict."""
+    root = Path(root)
+    now = time.time() if now is None else now
+    archive = PackArchive(root)
+    with open(archive.dir / "compact.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)   # one compaction at a time
+
+        cutoff_ns = int((now - archive_after_days * 86400) * 1e9)
+        loose, old = 0, []
+        for rel, path, st in loose_images(root):
+            loose += st.st_size
+            if st.st_mtime_ns < cutoff_ns:
+                old.append((rel, path, st))
+        old.sort(key=lambda item: item[2].st_mtime_ns)
+        report = {"archived": len(old), "archived_bytes": sum(st.st_size for _, _, st in old)}
+        if dry_run:
+            report.update(archive.stats(), loose_bytes=loose - report["archived_bytes"], dropped=0, rewritten=0)
+            return report
+
+        archive.append(
+            (rel, rel.split("/")[-1].split(".")[0], st.st_mtime_ns, path.read_bytes()) for rel, path, st in old
+        )
+        for rel, path, _ in old:
+            path.unlink()
+        for shard in {path.parent for _, path, _ in old}:
+            for d in (shard, shard.parent):
+                try:
+                    d.rmdir()   # only succeeds once empty
+                except OSError:
+                    pass
+        loose -= report["archived_bytes"]
+
+        dropped = []
+        if retention_days:
+            dropped += archive.oldest(int((now - retention_days * 86400) * 1e9))
+        if quota_bytes:
+            over = loose + archive.stats()["live_bytes"] - sum(n for _, n in dropped) - quota_bytes
+            already = {r for r, _ in dropped}
+            for rel, length in archive.oldest():
+                if over <= 0:
+                    break
+                if rel not in already:
+                    dropped.append((rel, length))
+                    over -= length
+        archive.drop([r for r, _ in dropped])
+
+        rewritten = 0
+        for pack_id, size, live, _ in archive.pack_usage():
+            if live and live >= PACK_MIN_LIVE * size:
+                continue
+            if live:
+                archive.seal(pack_id)   # its survivors go to a new pack
+                with open(archive.pack_path(pack_id), "rb") as f, \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                    archive.append(
+                        (rel, digest, mtime_ns, view[offset:offset + length])
+                        for rel, digest, offset, length, mtime_ns in archive.entries(pack_id)
+                    )
+            archive.remove_pack(pack_id)
+            rewritten += 1
+
+        report.update(archive.stats(), loose_bytes=loose, dropped=len(dropped), rewritten=rewritten)
+        return report
+
+
+# ================== CLI ==================
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack old screenshots and apply the retention policy")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("compact", help="pack images older than IMAGE_ARCHIVE_AFTER_DAYS, then retention/quota")
+    run.add_argument("--dry-run", action="store_true", help="report what would be packed")
+    run.add_argument("--after-days", type=float, default=ARCHIVE_AFTER_DAYS)
+    sub.add_parser("stats", help="show archive and loose-file totals")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        stats = PackArchive(IMAGE_DIR).stats()
+        loose = [st.st_size for _, _, st in loose_images(IMAGE_DIR)]
+        print(f"🗄️ {stats['images']} archived images, {stats['live_bytes'] / 2**20:.1f} MiB live "
+              f"in {stats['packs']} pack(s) of {stats['pack_bytes'] / 2**20:.1f} MiB")
+        print(f"📁 {len(loose)} loose images, {sum(loose) / 2**20:.1f} MiB")
+        return
+
+    report = compact(archive_after_days=args.after_days, dry_run=args.dry_run)
+    print(f"📦 Packed {report['archived']} images ({report['archived_bytes'] / 2**20:.1f} MiB)"
+          + (" (dry run)" if args.dry_run else ""))
+    print(f"🧹 Dropped {report['dropped']} by retention/quota, rewrote {report['rewritten']} pack(s)")
+    print(f"🗄️ {report['images']} archived images in {report['packs']} pack(s), "
+          f"{report['loose_bytes'] / 2**20:.1f} MiB still loose")
+
+
+if __name__ == "__main__":
+    main()
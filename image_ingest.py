@@ -0,0 +1,148 @@
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import aiohttp
+
+from image_archive import PackArchive
+from image_store import ContentStore, new_hasher
+from metrics import IMAGE_BYTES, IMAGE_SECONDS
+
+# ================== CONFIG ==================
+
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+IMAGE_CHUNK_BYTES = 64 * 1024
+# Attachments at or below this size go through discord.Attachment.read();
+# anything bigger is streamed so it is never held in memory at once.
+IMAGE_INLINE_BYTES = int(os.getenv("IMAGE_INLINE_BYTES", 256 * 1024))
+IMAGE_TIMEOUT_SECONDS = float(os.getenv("IMAGE_TIMEOUT_SECONDS", 30))
+
+CONTENT_TYPES = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/gif": "gif",
+    "image/webp": "webp",
+}
+
+
+class ImageRejected(Exception):
+    """The attachment is not an accepted image (wrong type or too large)."""
+
+
+def _base_type(content_type):
+    return (content_type or "").split(";")[0].strip().lower()
+
+
+@dataclass
+class AttachmentRef:
+    """What a queued job keeps of a discord.Attachment: enough to download it again after a restart."""
+    url: str
+    filename: str
+    content_type: str | None
+    size: int
+
+    @classmethod
+    def of(cls, attachment):
+        return cls(attachment.url, attachment.filename, attachment.content_type, attachment.size)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+# ================== INGESTOR ==================
+
+class ImageIngestor:
+    """Downloads screenshot attachments into `image_dir` without blocking the event loop.
+
+    Files are hashed while they are written to a temp file in the same
+    directory, then renamed into the content-addressed store, so a
+    half-downloaded image is never visible under its final name.
+    """
+
+    def __init__(self, image_dir, base_url, max_bytes=IMAGE_MAX_BYTES, pipeline=None):
+        self.image_dir = Path(image_dir)
+        self.store = ContentStore(image_dir, base_url, archive=PackArchive(image_dir))
+        self.max_bytes = max_bytes
+        self.pipeline = pipeline
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=IMAGE_TIMEOUT_SECONDS),
+                raise_for_status=True,
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    def check(self, attachment):
+        """Raise ImageRejected for a wrong type or an oversized file, before anything is downloaded."""
+        self._check(attachment.content_type, attachment.size, attachment.filename)
+
+    def _check(self, content_type, size, filename=""):
+        base = _base_type(content_type)
+        if not base:
+            # Discord omits the type for some uploads; fall back to the extension.
+            ext = filename.rsplit(".", 1)[-1].lower()
+            ext = "jpg" if ext == "jpeg" else ext
+            ext = ext if ext in CONTENT_TYPES.values() else "png"
+        else:
+            ext = CONTENT_TYPES.get(base)
+        if ext is None:
+            raise ImageRejected(f"unsupported content type {content_type!r}")
+        if size is not None and size > self.max_bytes:
+            raise ImageRejected(f"image is {size} bytes, limit is {self.max_bytes}")
+        return ext
+
+    async def save(self, attachment):
+        """Store a discord.Attachment (or an AttachmentRef) and return its public URL."""
+        ext = self._check(attachment.content_type, attachment.size, attachment.filename)
+        fd, tmp = tempfile.mkstemp(dir=self.image_dir, suffix=".part")
+        digest = new_hasher()
+        # an AttachmentRef has no read(), so it is always fetched from its URL
+        inline = attachment.size <= IMAGE_INLINE_BYTES and hasattr(attachment, "read")
+        mode = "inline" if inline else "stream"
+        started = time.perf_counter()
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if mode == "inline":
+                    data = await attachment.read()
+                    digest.update(data)
+                    f.write(data)
+                else:
+                    await self._stream(attachment.url, f, digest)
+                size = f.tell()
+            relpath, created = self.store.put_file(tmp, digest.hexdigest(), ext)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        IMAGE_SECONDS.observe(time.perf_counter() - started, mode)
+        IMAGE_BYTES.observe(size, mode)
+        if created and self.pipeline is not None:
+            relpath = await self._recompress(relpath)
+        return self.store.url_for(relpath)
+
+    async def _recompress(self, relpath):
+        try:
+            return await self.pipeline.process(relpath)
+        except Exception as e:
+            # A screenshot Pillow can't decode is still a valid submission.
+            print(f"⚠️ Recompress failed for {relpath}: {e}")
+            return relpath
+
+    async def _stream(self, url, f, digest):
+        written = 0
+        async with self._get_session().get(url) as resp:
+            if resp.content_length and resp.content_length > self.max_bytes:
+                raise ImageRejected(f"image exceeds {self.max_bytes} bytes")
+            async for chunk in resp.content.iter_chunked(IMAGE_CHUNK_BYTES):
+                written += len(chunk)
+                if written > self.max_bytes:
+                    raise ImageRejected(f"image exceeds {self.max_bytes} bytes")
+                digest.update(chunk)
+                f.write(chunk)
@@ -0,0 +1,177 @@
+"""Post-ingest recompression of screenshots, off the event loop.
+
+Each stored original `ab/cd/<sha256>.<ext>` is re-encoded to
+`ab/cd/<sha256>.webp` (kept only when it is actually smaller) plus a small
+`ab/cd/<sha256>.thumb.webp`. The work runs in a process pool so it never
+competes with the bot for the GIL.
+
+Backfill everything already on disk (and repoint the sheets at it):
+
+    python image_pipeline.py --backfill [--dry-run]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+# ================== CONFIG ==================
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", 80))
+THUMB_SIZE = (320, 320)
+THUMB_SUFFIX = ".thumb.webp"
+# Animated GIFs lose their frames in a still WebP, so they are left alone.
+SKIP_EXTS = {"gif"}
+
+
+def pool_context():
+    """Process start method for the recompression workers.
+
+    forkserver: workers fork from a single-threaded server process, never
+    from the bot itself. The bot's threads (Sheets pool, keep-alive server,
+    aiohttp) could hold a lock at fork time that a forked worker would then
+    wait on forever. The server preloads only this module. Each worker
+    still imports the entry script as `__mp_main__`, so entry scripts keep
+    their work under the `__main__` guard (run.py, not main.py, starts the bot).
+    """
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload(["image_pipeline"])
+    return ctx
+
+
+def thumb_path(path):
+    """Thumbnail location next to an image; works on relpaths and URLs alike."""
+    return f"{path.rsplit('.', 1)[0]}{THUMB_SUFFIX}"
+
+
+# ================== WORKER ==================
+
+def recompress(root, relpath, keep_original=False):
+    """Re-encode one stored image. Returns the relpath the sheet should point at.
+
+    Runs in a worker process. The original is removed once a smaller WebP
+    exists (unless `keep_original`); otherwise it stays and only the
+    thumbnail is added.
+    """
+    root = Path(root)
+    src = root / relpath
+    base, ext = relpath.rsplit(".", 1)
+    if ext.lower() in SKIP_EXTS or relpath.endswith(THUMB_SUFFIX):
+        return relpath
+
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+        thumb = img.copy()
+        thumb.thumbnail(THUMB_SIZE)
+        _atomic_save(thumb, root / thumb_path(relpath), quality=70)
+
+        if ext.lower() == "webp":
+            return relpath
+        webp_rel = f"{base}.webp"
+        webp = root / webp_rel
+        _atomic_save(img, webp, quality=WEBP_QUALITY, method=6)
+
+    if webp.stat().st_size < src.stat().st_size:
+        if not keep_original:
+            src.unlink()
+        return webp_rel
+    webp.unlink()
+    return relpath
+
+
+def _atomic_save(img, dest, **options):
+    tmp = dest.with_name(dest.name + ".part")
+    img.save(tmp, format="WEBP", **options)
+    os.replace(tmp, dest)
+
+
+# ================== POOL ==================
+
+class ImagePipeline:
+    """Async front end for the recompression process pool."""
+
+    def __init__(self, root, workers=IMAGE_WORKERS):
+        self.root = str(root)
+        self.workers = workers
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context())
+        return self._pool
+
+    async def process(self, relpath):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_pool(), recompress, self.root, relpath)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+
+# ================== BACKFILL ==================
+
+def pending_originals(root):
+    """Stored originals that have not been through the pipeline yet."""
+    for path in sorted(Path(root).glob("??/??/*.*")):
+        name = path.name
+        if name.endswith(THUMB_SUFFIX) or name.endswith(".part"):
+            continue
+        if Path(thumb_path(str(path))).exists():
+            continue
+        if name.rsplit(".", 1)[-1].lower() in SKIP_EXTS:
+            continue
+        yield path.relative_to(root).as_posix()
+
+
+def backfill(dry_run):
+    from local_store import LocalStore, STORE_PATH
+    from migrate_images import IMAGE_BASE_URL, IMAGE_DIR, SCOPE, SHEET_ID, rewrite_sheets
+    from sheets_client import authorize
+
+    todo = list(pending_originals(IMAGE_DIR))
+    print(f"🖼️ Images to process: {len(todo)}")
+    if dry_run or not todo:
+        return
+
+    mapping = {}
+    replaced = {}   # {old url: original}
+    with ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=pool_context()) as pool:
+        # Originals stay on disk until the sheet points at the new files.
+        results = pool.map(recompress, [str(IMAGE_DIR)] * len(todo), todo, [True] * len(todo))
+        for relpath, new_rel in zip(todo, results):
+            if new_rel != relpath:
+                mapping[f"{IMAGE_BASE_URL}/{relpath}"] = f"{IMAGE_BASE_URL}/{new_rel}"
+                replaced[f"{IMAGE_BASE_URL}/{relpath}"] = IMAGE_DIR / relpath
+
+    print(f"📉 Re-encoded {len(mapping)} images to WebP")
+    remaining = set()
+    if mapping:
+        sheet = authorize(SCOPE).open_by_key(SHEET_ID)
+        remaining = rewrite_sheets(sheet, mapping, dry_run=False)
+        LocalStore(STORE_PATH).rewrite_screenshots(mapping)
+    for url, path in replaced.items():
+        if url not in remaining:   # still linked from a sheet: keep the original
+            path.unlink()
+    print("✅ Image backfill DONE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompress stored screenshots")
+    parser.add_argument("--backfill", action="store_true", help="process every stored original")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be processed")
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error("nothing to do (use --backfill)")
+    backfill(args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
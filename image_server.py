@@ -1,8 +1,199 @@
-from http.server import SimpleHTTPRequestHandler, HTTPServer
+import email.utils
+import mimetypes
 import os
+import re
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
 
-os.chdir("/home/Chakradhar/cpbot_images")
+from image_archive import PACK_DIR, PackReader
+from image_store import CONTENT_ADDRESSED
 
-server = HTTPServer(("0.0.0.0", 8080), SimpleHTTPRequestHandler)
-print("Serving images on port 8080")
-server.serve_forever()
+# ================== CONFIG ==================
+
+IMAGE_DIR = Path(os.getenv("IMAGE_DIR", "/home/Chakradhar/cpbot_images"))
+HOST = os.getenv("IMAGE_HOST", "0.0.0.0")
+PORT = int(os.getenv("IMAGE_PORT", 8080))
+
+# Content-addressed paths never change once written, so they can be cached forever.
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+DEFAULT_CACHE = "public, max-age=3600"
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+# ================== HANDLER ==================
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """Read-only static file handler with validators, Range and zero-copy bodies.
+
+    Images compacted into packs (see image_archive) are served from an mmap
+    slice of their pack, with the same ETag their loose file had.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "CPBotImages/1.0"
+    # Headers and body go out in separate writes; with Nagle on, each keep-alive
+    # response after the first waits out the client's delayed ACK (~40 ms).
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def log_request(self, code="-", size="-"):
+        pass  # replaced by the access log line written in _serve
+
+    # ---- helpers ----
+
+    def _resolve(self):
+        """Path under the image root for the request, or None if it escapes the root."""
+        rel = unquote(urlsplit(self.path).path).lstrip("/")
+        if not rel or "\0" in rel:
+            return None, rel
+        root = self.server.root
+        path = (root / rel).resolve()
+        if root != path and root not in path.parents:
+            return None, rel
+        return path, rel
+
+    def _serve(self, send_body):
+        started = time.perf_counter()
+        status, sent = HTTPStatus.NOT_FOUND, 0
+        try:
+            status, sent = self._respond(send_body)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.log_message('"%s" %d %d %.2fms', self.requestline, status, sent, elapsed_ms)
+
+    def _error(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return status, 0
+
+    def _respond(self, send_body):
+        path, rel = self._resolve()
+        if path is None or rel.split("/", 1)[0] == PACK_DIR:
+            return self._error(HTTPStatus.NOT_FOUND)
+        try:
+            f = open(path, "rb")
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError, PermissionError):
+            archived = self.server.packs.open(rel) if CONTENT_ADDRESSED.match(rel) else None
+            if archived is None:
+                return self._error(HTTPStatus.NOT_FOUND)
+            view, mtime_ns = archived
+            with view:
+                return self._send(rel, view.nbytes, mtime_ns, send_body,
+                                  lambda start, length: self.wfile.write(view[start:start + length]))
+
+        with f:
+            st = os.fstat(f.fileno())
+            # socket.sendfile uses os.sendfile (zero-copy) where the platform has it.
+            return self._send(rel, st.st_size, st.st_mtime_ns, send_body,
+                              lambda start, length: self.connection.sendfile(f, offset=start, count=length))
+
+    def _send(self, rel, size, mtime_ns, send_body, write):
+        """Headers for a `size`-byte image, then `write(start, length)` for the body."""
+        mtime = mtime_ns / 1e9
+        etag = f'"{mtime_ns:x}-{size:x}"'
+        last_modified = email.utils.formatdate(mtime, usegmt=True)
+        cache = IMMUTABLE_CACHE if CONTENT_ADDRESSED.match(rel) else DEFAULT_CACHE
+
+        if self._not_modified(etag, mtime):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache)
+            self.end_headers()
+            return HTTPStatus.NOT_MODIFIED, 0
+
+        start, end = 0, size - 1
+        status = HTTPStatus.OK
+        byte_range = self._byte_range(size, etag)
+        if byte_range == "invalid":
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, 0
+        if byte_range is not None:
+            start, end = byte_range
+            status = HTTPStatus.PARTIAL_CONTENT
+
+        length = max(0, end - start + 1)
+        self.send_response(status)
+        self.send_header("Content-Type", mimetypes.guess_type(rel)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Cache-Control", cache)
+        if status == HTTPStatus.PARTIAL_CONTENT:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        if send_body and length:
+            write(start, length)
+        return status, length if send_body else 0
+
+    def _not_modified(self, etag, mtime):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [t.strip() for t in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since
+        return False
+
+    def _byte_range(self, size, etag):
+        """(start, end) for a single satisfiable Range, None for a full response, or "invalid"."""
+        header = self.headers.get("Range")
+        if not header:
+            return None
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range.strip() != etag:
+            return None
+        m = RANGE_RE.match(header.strip())
+        if not m:
+            return None  # multi-range or unknown unit: serve the whole file
+        first, last = m.groups()
+        if not first and not last:
+            return None
+        if not first:
+            start = max(0, size - int(last))
+            end = size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        if start >= size or start > end:
+            return "invalid"
+        return start, end
+
+
+class ImageServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, root, handler=ImageHandler):
+        self.root = Path(root).resolve()
+        self.packs = PackReader(self.root)
+        super().__init__(address, handler)
+
+
+def make_server(root=IMAGE_DIR, host=HOST, port=PORT):
+    return ImageServer((host, port), root)
+
+
+if __name__ == "__main__":
+    server = make_server()
+    print(f"Serving images on port {server.server_address[1]}")
+    server.serve_forever()
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import re
+from pathlib import Path
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# ab/cd/<sha256>.<ext> (and its .thumb.webp): never changes once written.
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.thumb)?\.\w+$")
+
+
+def new_hasher():
+    return hashlib.sha256()
+
+
+def hash_file(path):
+    h = new_hasher()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def shard_relpath(digest, ext):
+    """Relative path for a content hash, fanned out two levels: ab/cd/abcd....ext"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+# ================== STORE ==================
+
+class ContentStore:
+    """Images named by the SHA-256 of their bytes, sharded into nested directories.
+
+    Storing the same bytes twice returns the existing file, so resubmitted
+    screenshots cost no extra disk and keep a single URL. That includes
+    images already moved into `archive` (an image_archive.PackArchive).
+    """
+
+    def __init__(self, root, base_url, archive=None):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+        self.archive = archive
+
+    def url_for(self, relpath):
+        return f"{self.base_url}/{relpath}"
+
+    def find(self, digest):
+        """Relative path of an already stored image with this hash, whatever its extension.
+
+        A recompressed `.webp` wins over a leftover original; thumbnails never match.
+        """
+        shard = self.root / digest[:2] / digest[2:4]
+        found = None
+        for path in shard.glob(f"{digest}.*"):
+            name = path.name
+            if name.endswith(".part") or ".thumb." in name:
+                continue
+            found = path
+            if name.endswith(".webp"):
+                break
+        if found is not None:
+            return found.relative_to(self.root).as_posix()
+        return self.archive.find(digest) if self.archive is not None else None
+
+    def put_file(self, src, digest, ext):
+        """Move `src` into the store under its hash. Returns (relpath, created).
+
+        When the content is already stored, `src` is removed and nothing is written.
+        """
+        existing = self.find(digest)
+        if existing is not None:
+            os.unlink(src)
+            return existing, False
+        relpath = shard_relpath(digest, ext)
+        dest = self.root / relpath
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(src, dest)
+        return relpath, True
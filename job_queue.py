@@ -0,0 +1,135 @@
+"""Durable background jobs: persisted in the LocalStore, keyed by Discord message ID.
+
+A command queues the slow part of its work with `submit()` and replies at
+once. Workers claim due jobs from SQLite, run the handler registered for
+the job's kind and mark it done. A failed attempt is rescheduled with
+exponential backoff. A running job's short lease is renewed every few
+seconds, so a job whose worker died mid-run (crash, restart) becomes due
+again within JOB_LEASE_SECONDS of it, and every job runs at least once
+and handlers must be idempotent for their message ID. Queuing the same
+message twice is a no-op.
+"""
+import asyncio
+import os
+import time
+
+from metrics import JOB_RESULTS, JOB_SECONDS
+from sheets_client import backoff_delay
+
+# ================== CONFIG ==================
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 6))
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", 5.0))
+JOB_BACKOFF_CAP = float(os.getenv("JOB_BACKOFF_CAP", 300.0))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 30))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 5))
+JOB_KEEP_DAYS = int(os.getenv("JOB_KEEP_DAYS", 7))
+
+
+class PermanentJobError(Exception):
+    """The job can never succeed (rejected input), so it fails without further attempts."""
+
+
+# ================== QUEUE ==================
+
+class JobQueue:
+    def __init__(self, store, workers=JOB_WORKERS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.store = store
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._handlers = {}   # {kind: (run, failed)}
+        self._wake = asyncio.Event()
+        self._tasks = []
+
+    def register(self, kind, run, failed=None):
+        """`run(message_id, payload)` does the work; `failed(message_id, payload, error)` hears about give-ups."""
+        self._handlers[kind] = (run, failed)
+
+    def submit(self, message_id, kind, payload):
+        """Persist a job and wake a worker. Returns False when the message was already queued."""
+        added = self.store.add_job(message_id, kind, payload)
+        if added:
+            self._wake.set()
+        return added
+
+    def start(self):
+        """Start the workers (idempotent). Jobs left pending by the last run are picked up too."""
+        if self._tasks:
+            return
+        self.store.prune_jobs(time.time() - JOB_KEEP_DAYS * 86400)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self):
+        """Wait until nothing is pending (benchmarks and tests)."""
+        while self.stats()["pending"]:
+            await asyncio.sleep(0.01)
+
+    def stats(self):
+        """{"pending", "done", "failed": counts, "oldest_pending": age in seconds}."""
+        by_state = self.store.job_stats()
+        out = {state: by_state.get(state, (0, None))[0] for state in ("pending", "done", "failed")}
+        oldest = by_state.get("pending", (0, None))[1]
+        out["oldest_pending"] = time.time() - oldest if oldest else 0.0
+        return out
+
+    async def _worker(self):
+        while True:
+            self._wake.clear()   # before claiming, so a submit that lands after this still wakes us
+            job = self.store.claim_job(JOB_LEASE_SECONDS)
+            if job is None:
+                await self._idle()
+                continue
+            await self._run(*job)
+
+    async def _idle(self):
+        next_at = self.store.next_job_at()
+        timeout = JOB_POLL_SECONDS if next_at is None else min(max(next_at - time.time(), 0.01), JOB_POLL_SECONDS)
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _heartbeat(self, message_id):
+        """Renew the job's lease while its handler runs."""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            self.store.extend_job(message_id, JOB_LEASE_SECONDS)
+
+    async def _run(self, message_id, kind, payload, attempts):
+        run, failed = self._handlers[kind]
+        started = time.perf_counter()
+        heartbeat = asyncio.create_task(self._heartbeat(message_id))
+        try:
+            await run(message_id, payload)
+        except PermanentJobError as e:
+            outcome, error = "rejected", e
+        except Exception as e:
+            outcome, error = ("failed" if attempts >= self.max_attempts else "retried"), e
+        else:
+            outcome, error = "done", None
+        finally:
+            heartbeat.cancel()
+        JOB_SECONDS.observe(time.perf_counter() - started, kind, outcome)
+        JOB_RESULTS.inc(kind, outcome)
+
+        if outcome == "done":
+            self.store.finish_job(message_id)
+        elif outcome == "retried":
+            delay = backoff_delay(attempts, JOB_BACKOFF_BASE, JOB_BACKOFF_CAP)
+            print(f"⚠️ {kind} job {message_id} attempt {attempts} failed, retrying in {delay:.0f}s: {error!r}")
+            self.store.retry_job(message_id, delay, repr(error))
+        else:
+            print(f"❌ {kind} job {message_id} gave up after {attempts} attempt(s): {error!r}")
+            self.store.finish_job(message_id, "failed", repr(error))
+            if failed is not None:
+                try:
+                    await failed(message_id, payload, error)
+                except Exception as e:
+                    print(f"⚠️ {kind} job {message_id} failure hook raised: {e!r}")
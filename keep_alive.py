@@ -1,6 +1,8 @@
-from flask import Flask
+from flask import Flask, Response
 from threading import Thread
 
+import metrics
+
 app = Flask('')
 
 
@@ -9,10 +11,15 @@ def home():
     return "CP Bot Alive 💪🔥"
 
 
-def run():
-    app.run(host='0.0.0.0', port=8080)
+@app.route('/metrics')
+def metrics_page():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+def run(port=8080):
+    app.run(host='0.0.0.0', port=port)
 
 
-def keep_alive():
-    t = Thread(target=run)
+def keep_alive(port=8080):
+    t = Thread(target=run, args=(port,), daemon=True)
     t.start()
@@ -0,0 +1,498 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+
+from sheet_layout import ID_COLUMN
+
+# ================== CONFIG ==================
+
+STORE_PATH = os.getenv("STORE_PATH", "cpbot_state.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    date        TEXT NOT NULL,
+    username    TEXT NOT NULL,
+    screenshot  TEXT NOT NULL DEFAULT '',
+    problem     TEXT NOT NULL DEFAULT '',
+    created_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submissions_by_date ON submissions (date, username);
+
+CREATE TABLE IF NOT EXISTS registrations (
+    username   TEXT PRIMARY KEY,
+    real_name  TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_ids (
+    username  TEXT PRIMARY KEY,
+    user_id   INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS paused_dates (
+    date  TEXT PRIMARY KEY
+);
+
+-- derived state saved so a restart doesn't have to rebuild it from Sheets
+CREATE TABLE IF NOT EXISTS snapshots (
+    name      TEXT PRIMARY KEY,
+    payload   TEXT NOT NULL,
+    saved_at  REAL NOT NULL
+);
+
+-- background work (submit processing), one row per Discord message
+CREATE TABLE IF NOT EXISTS jobs (
+    message_id  INTEGER PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    state       TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    run_at      REAL NOT NULL,
+    created_at  REAL NOT NULL,
+    error       TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (state, run_at);
+
+-- single-runner roles (the reminder scheduler) held by one process at a time
+CREATE TABLE IF NOT EXISTS leases (
+    name        TEXT PRIMARY KEY,
+    holder      TEXT NOT NULL,
+    expires_at  REAL NOT NULL
+);
+
+-- changes waiting to be mirrored into Google Sheets, in order
+CREATE TABLE IF NOT EXISTS outbox (
+    seq      INTEGER PRIMARY KEY AUTOINCREMENT,
+    op       TEXT NOT NULL,
+    sheet    TEXT NOT NULL,
+    payload  TEXT NOT NULL
+);
+"""
+
+
+# ================== STORE ==================
+
+class LocalStore:
+    """SQLite source of truth for submissions, registrations and paused dates.
+
+    Every mutation also queues an outbox entry so the Sheets mirror can be
+    brought up to date later by `SheetsFlusher`.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._migrate()
+        self._data_version = self._current_data_version()
+
+    def _migrate(self):
+        """Columns added after a database may already have been created."""
+        columns = {name for _, name, *_ in self._db.execute("PRAGMA table_info(submissions)")}
+        if "message_id" not in columns:
+            self._db.execute("ALTER TABLE submissions ADD COLUMN message_id INTEGER")
+        if "row_id" not in columns:
+            # The sheet's ID column used to hold the local id; keep what was already written.
+            self._db.execute("ALTER TABLE submissions ADD COLUMN row_id TEXT")
+            self._db.execute("UPDATE submissions SET row_id = CAST(id AS TEXT)")
+        self._db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS submissions_by_message ON submissions (message_id) "
+            "WHERE message_id IS NOT NULL"
+        )
+
+    def _current_data_version(self):
+        with self._lock:
+            return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed_elsewhere(self):
+        """True once after another process (connection) committed since the last call."""
+        version = self._current_data_version()
+        changed = version != self._data_version
+        self._data_version = version
+        return changed
+
+    def _tx(self):
+        return _Transaction(self._db, self._lock)
+
+    def _enqueue(self, op, sheet, payload):
+        self._db.execute(
+            "INSERT INTO outbox (op, sheet, payload) VALUES (?, ?, ?)",
+            (op, sheet, json.dumps(payload)),
+        )
+
+    # ---- submissions ----
+
+    def add_submission(self, date_str, username, screenshot, problem, message_id=None):
+        """Store a submission and queue its sheet row; the row's last cell is a new random row ID.
+
+        The row ID is a uuid4, not the local id, so it stays unique when the
+        store is rebuilt from the sheet. With a `message_id` the call is
+        idempotent: a second call for the same Discord message returns the
+        first submission's id and writes nothing. Returns (submission id, created).
+        """
+        with self._tx():
+            if message_id is not None:
+                found = self._db.execute(
+                    "SELECT id FROM submissions WHERE message_id = ?", (message_id,)
+                ).fetchone()
+                if found:
+                    return found[0], False
+            row_id = uuid.uuid4().hex
+            cur = self._db.execute(
+                "INSERT INTO submissions (date, username, screenshot, problem, created_at, message_id, row_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (date_str, username, screenshot, problem, time.time(), message_id, row_id),
+            )
+            row = [date_str, username, screenshot, problem, row_id]
+            self._enqueue("append", date_str, row)
+        return cur.lastrowid, True
+
+    def delete_last_submission(self, date_str, username):
+        """Remove the user's most recent submission for a date. Returns the removed row or None."""
+        with self._tx():
+            found = self._db.execute(
+                "SELECT id, screenshot, problem, row_id FROM submissions "
+                "WHERE date = ? AND username = ? ORDER BY id DESC LIMIT 1",
+                (date_str, username),
+            ).fetchone()
+            if not found:
+                return None
+            sub_id, screenshot, problem, row_id = found
+            self._db.execute("DELETE FROM submissions WHERE id = ?", (sub_id,))
+            row = [date_str, username, screenshot, problem, row_id or ""]
+            self._enqueue("delete", date_str, row)
+        return row
+
+    def count_submissions(self, date_str, username):
+        with self._lock:
+            (count,) = self._db.execute(
+                "SELECT COUNT(*) FROM submissions WHERE date = ? AND username = ?",
+                (date_str, username),
+            ).fetchone()
+        return count
+
+    def day_usernames(self, date_str):
+        """One username per submission on a date, in submission order."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT username FROM submissions WHERE date = ? ORDER BY id", (date_str,)
+            ).fetchall()
+        return [u for (u,) in rows]
+
+    def submission_counts(self, date_str):
+        """{username: submissions} for a single date."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT username, COUNT(*) FROM submissions WHERE date = ? GROUP BY username",
+                (date_str,),
+            ).fetchall()
+        return dict(rows)
+
+    def merge_sheet_submissions(self, date_str, sheet_rows):
+        """Import rows that exist in the sheet but not locally (manual edits, form imports).
+
+        Rows with an ID are matched on it and imported with it, so a store
+        rebuilt from the sheet deletes the same rows the old one would have.
+        Rows without one are compared as a multiset on (username, screenshot,
+        problem) against local rows the sheet holds no ID for, so rows
+        already present locally are never duplicated.
+        """
+        remote_ids = {}   # {row ID: (username, screenshot, problem)}
+        remote = Counter()
+        for r in sheet_rows:
+            if len(r) > 1 and r[1]:
+                cells = (r[1], r[2] if len(r) > 2 else "", r[3] if len(r) > 3 else "")
+                row_id = r[ID_COLUMN] if len(r) > ID_COLUMN else ""
+                if row_id:
+                    remote_ids[row_id] = cells
+                else:
+                    remote[cells] += 1
+        with self._tx():
+            local_ids = set()
+            local = Counter()
+            for username, screenshot, problem, row_id in self._db.execute(
+                "SELECT username, screenshot, problem, row_id FROM submissions WHERE date = ?",
+                (date_str,),
+            ):
+                local_ids.add(row_id)
+                if row_id not in remote_ids:
+                    local[username, screenshot, problem] += 1
+            # Rows deleted locally but still in the sheet must not come back.
+            for (payload,) in self._db.execute(
+                "SELECT payload FROM outbox WHERE op = 'delete' AND sheet = ?", (date_str,)
+            ):
+                row = json.loads(payload)
+                row_id = row[ID_COLUMN] if len(row) > ID_COLUMN else ""
+                local_ids.add(row_id)
+                if row_id not in remote_ids:
+                    local[tuple(row[1:4])] += 1
+            missing = [(*cells, row_id) for row_id, cells in remote_ids.items() if row_id not in local_ids]
+            missing += [(*cells, None) for cells, n in (remote - local).items() for _ in range(n)]
+            now = time.time()
+            self._db.executemany(
+                "INSERT INTO submissions (date, username, screenshot, problem, created_at, row_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(date_str, u, s, p, now, row_id) for u, s, p, row_id in missing],
+            )
+        return len(missing)
+
+    def rewrite_screenshots(self, mapping):
+        """Point stored and still-queued rows at new screenshot URLs ({old: new})."""
+        with self._tx():
+            self._db.executemany(
+                "UPDATE submissions SET screenshot = ? WHERE screenshot = ?",
+                [(new, old) for old, new in mapping.items()],
+            )
+            for seq, payload in self._db.execute("SELECT seq, payload FROM outbox").fetchall():
+                row = json.loads(payload)
+                if len(row) > 2 and row[2] in mapping:
+                    row[2] = mapping[row[2]]
+                    self._db.execute(
+                        "UPDATE outbox SET payload = ? WHERE seq = ?", (json.dumps(row), seq)
+                    )
+
+    # ---- registrations ----
+
+    def register(self, username, real_name):
+        with self._tx():
+            self._db.execute(
+                "INSERT OR REPLACE INTO registrations (username, real_name) VALUES (?, ?)",
+                (username, real_name),
+            )
+            self._enqueue("append", "Registered_Users", [username, real_name])
+
+    def registrations(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT username, real_name FROM registrations"))
+
+    def merge_sheet_registrations(self, rows):
+        with self._tx():
+            self._db.executemany(
+                "INSERT OR IGNORE INTO registrations (username, real_name) VALUES (?, ?)",
+                [(r[0], r[1]) for r in rows if len(r) >= 2 and r[0]],
+            )
+
+    def set_user_id(self, username, user_id):
+        with self._tx():
+            self._db.execute(
+                "INSERT OR REPLACE INTO user_ids (username, user_id) VALUES (?, ?)",
+                (username, user_id),
+            )
+
+    def user_ids(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT username, user_id FROM user_ids"))
+
+    # ---- paused dates ----
+
+    def pause(self, date_str):
+        with self._tx():
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO paused_dates (date) VALUES (?)", (date_str,)
+            )
+            if cur.rowcount:
+                self._enqueue("append", "Paused_Dates", [date_str])
+
+    def unpause(self, date_str):
+        with self._tx():
+            cur = self._db.execute("DELETE FROM paused_dates WHERE date = ?", (date_str,))
+            if cur.rowcount:
+                self._enqueue("delete", "Paused_Dates", [date_str])
+
+    def paused_dates(self):
+        with self._lock:
+            return {d for (d,) in self._db.execute("SELECT date FROM paused_dates")}
+
+    def merge_sheet_paused_dates(self, dates):
+        with self._tx():
+            unpaused = {
+                json.loads(payload)[0]
+                for (payload,) in self._db.execute(
+                    "SELECT payload FROM outbox WHERE op = 'delete' AND sheet = 'Paused_Dates'"
+                )
+            }
+            self._db.executemany(
+                "INSERT OR IGNORE INTO paused_dates (date) VALUES (?)",
+                [(d,) for d in dates if d and d not in unpaused],
+            )
+
+    # ---- snapshots ----
+
+    def save_snapshot(self, name, data):
+        payload = json.dumps(data, separators=(",", ":"))
+        with self._tx():
+            self._db.execute(
+                "INSERT OR REPLACE INTO snapshots (name, payload, saved_at) VALUES (?, ?, ?)",
+                (name, payload, time.time()),
+            )
+
+    def load_snapshot(self, name):
+        """(data, saved_at) for a saved snapshot, or (None, None) when there is none."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT payload, saved_at FROM snapshots WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    # ---- jobs ----
+
+    def add_job(self, message_id, kind, payload):
+        """Queue a job for a Discord message. Returns False when that message already has one."""
+        now = time.time()
+        with self._tx():
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO jobs (message_id, kind, payload, run_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (message_id, kind, json.dumps(payload), now, now),
+            )
+        return bool(cur.rowcount)
+
+    def claim_job(self, lease):
+        """Take the oldest due pending job as (message_id, kind, payload, attempts), or None.
+
+        The job stays pending but isn't due again for `lease` seconds, so a
+        worker that dies mid-job only delays it; the worker renews the lease
+        with extend_job while it runs, and finishing or rescheduling it ends
+        the lease.
+        """
+        now = time.time()
+        with self._tx():
+            found = self._db.execute(
+                "SELECT message_id, kind, payload, attempts FROM jobs "
+                "WHERE state = 'pending' AND run_at <= ? ORDER BY run_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if not found:
+                return None
+            message_id, kind, payload, attempts = found
+            self._db.execute(
+                "UPDATE jobs SET attempts = attempts + 1, run_at = ? WHERE message_id = ?",
+                (now + lease, message_id),
+            )
+        return message_id, kind, json.loads(payload), attempts + 1
+
+    def finish_job(self, message_id, state="done", error=""):
+        with self._tx():
+            self._db.execute(
+                "UPDATE jobs SET state = ?, error = ? WHERE message_id = ?", (state, error, message_id)
+            )
+
+    def extend_job(self, message_id, lease):
+        """Push a running job's lease out to `lease` seconds from now."""
+        with self._tx():
+            self._db.execute(
+                "UPDATE jobs SET run_at = ? WHERE message_id = ? AND state = 'pending'",
+                (time.time() + lease, message_id),
+            )
+
+    def retry_job(self, message_id, delay, error):
+        with self._tx():
+            self._db.execute(
+                "UPDATE jobs SET run_at = ?, error = ? WHERE message_id = ?",
+                (time.time() + delay, error, message_id),
+            )
+
+    def next_job_at(self):
+        """When the next pending job falls due (epoch seconds), or None when there is none."""
+        with self._lock:
+            (run_at,) = self._db.execute(
+                "SELECT MIN(run_at) FROM jobs WHERE state = 'pending'"
+            ).fetchone()
+        return run_at
+
+    def job_stats(self):
+        """{state: (count, oldest created_at)} over the jobs table."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT state, COUNT(*), MIN(created_at) FROM jobs GROUP BY state"
+            ).fetchall()
+        return {state: (count, oldest) for state, count, oldest in rows}
+
+    def prune_jobs(self, before):
+        """Forget finished jobs created before `before`; pending ones are kept."""
+        with self._tx():
+            cur = self._db.execute(
+                "DELETE FROM jobs WHERE state != 'pending' AND created_at < ?", (before,)
+            )
+        return cur.rowcount
+
+    # ---- leases ----
+
+    def acquire_lease(self, name, holder, ttl):
+        """Take or renew a named lease for `ttl` seconds. False while another holder's lease is live."""
+        now = time.time()
+        with self._tx():
+            found = self._db.execute(
+                "SELECT holder, expires_at FROM leases WHERE name = ?", (name,)
+            ).fetchone()
+            if found and found[0] != holder and found[1] > now:
+                return False
+            self._db.execute(
+                "INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                (name, holder, now + ttl),
+            )
+        return True
+
+    def release_lease(self, name, holder):
+        with self._tx():
+            self._db.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def lease_holder(self, name):
+        """(holder, expires_at) of a live lease, or (None, None)."""
+        with self._lock:
+            found = self._db.execute(
+                "SELECT holder, expires_at FROM leases WHERE name = ? AND expires_at > ?", (name, time.time())
+            ).fetchone()
+        return tuple(found) if found else (None, None)
+
+    # ---- outbox ----
+
+    def pending_ops(self, limit=500):
+        """Oldest unsynced changes as (seq, op, sheet, row)."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, op, sheet, payload FROM outbox ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+        return [(seq, op, sheet, json.loads(payload)) for seq, op, sheet, payload in rows]
+
+    def ack_ops(self, seqs):
+        if not seqs:
+            return
+        with self._tx():
+            self._db.executemany("DELETE FROM outbox WHERE seq = ?", [(s,) for s in seqs])
+
+    def pending_count(self):
+        with self._lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()
+        return count
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class _Transaction:
+    def __init__(self, db, lock):
+        self._db = db
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire()
+        self._db.execute("BEGIN IMMEDIATE")
+        return self._db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._lock.release()
+        return False
@@ -1,14 +1,32 @@
 import discord
 from discord.ext import commands, tasks
+import asyncio
 import os
 import datetime
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-import requests
-import uuid
+import io
+import socket
+import time
 from pathlib import Path
 import pytz
 
+from analytics import History, build_report
+from image_ingest import AttachmentRef, ImageIngestor, ImageRejected
+from image_pipeline import ImagePipeline
+from job_queue import JobQueue, PermanentJobError
+from keep_alive import keep_alive
+from local_store import LocalStore, STORE_PATH
+import metrics
+from nightly import WINDOWS, NightlyAggregator
+from notify import UserDirectory, fan_out
+from sheet_layout import DAY_HEADER, get_layout
+from sheet_sync import SheetsFlusher, SHEETS_FLUSH_SECONDS
+from sheets_client import authorize
+from sheets_gateway import SheetsGateway
+from streaks import StreakBoard
+from submission_index import SubmissionIndex
+
+STARTED_AT = time.perf_counter()
+
 # ================== CONFIG ==================
 
 TOKEN = os.getenv("TOKEN")
@@ -16,9 +34,12 @@ TOKEN = os.getenv("TOKEN")
 VM_PUBLIC_IP = "52.172.194.26"
 IMAGE_BASE_URL = f"http://{VM_PUBLIC_IP}:8080"
 
-IMAGE_DIR = Path("/home/Chakradhar/cpbot_images")
+IMAGE_DIR = Path(os.getenv("IMAGE_DIR", "/home/Chakradhar/cpbot_images"))
 IMAGE_DIR.mkdir(parents=True, exist_ok=True)
 
+pipeline = ImagePipeline(IMAGE_DIR)
+ingestor = ImageIngestor(IMAGE_DIR, IMAGE_BASE_URL, pipeline=pipeline)
+
 SHEET_ID = "1qPoJ0uBdVCQZMZYWRS6Bt60YjJnYUkD4OePSTRMiSrI"
 SCOPE = ["https://www.googleapis.com/auth/spreadsheets"]
 
@@ -26,24 +47,129 @@ ANNOUNCE_CHANNEL_ID = int(os.getenv("ANNOUNCE_CHANNEL_ID", 1446465532441395372))
 
 IST = pytz.timezone("Asia/Kolkata")
 
+SUMMARY_HEADER = ["Real Name", "Days Submitted", "Total Days", "Consistency %"]
+
+INDEX_REFRESH_MINUTES = int(os.getenv("INDEX_REFRESH_MINUTES", 60))
+INDEX_REFRESH_DAYS = int(os.getenv("INDEX_REFRESH_DAYS", 35))
+INDEX_SNAPSHOT = "submission_index"
+
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", 10))
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # keep_alive + /metrics; 0 = off; one port per process
+
+# Which parts this process runs. The default runs everything in one process.
+# Split deployments run one process per role against the same STORE_PATH:
+#   gateway   - Discord gateway connection and commands
+#   scheduler - reminders, nightly aggregation and the Sheets flush; only the
+#               holder of the "scheduler" lease runs them, so extra copies are standbys
+#   ingest    - submit job workers (scale by running more of them)
+# Without `gateway` the process logs in over HTTP only, for DMs and channel posts.
+# Each process serves its own /metrics, so split processes on one host need
+# different METRICS_PORT values (or 0); on a taken port the bind fails and
+# that process has no metrics endpoint.
+ROLES = {r.strip() for r in os.getenv("CPBOT_ROLES", "gateway,scheduler,ingest").split(",") if r.strip()}
+SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", 30))
+STATE_SYNC_SECONDS = float(os.getenv("STATE_SYNC_SECONDS", 5))
+INSTANCE = f"{socket.gethostname()}:{os.getpid()}"
+
+# 0 = one connection; "auto" or a number = AutoShardedBot with that many shards
+BOT_SHARDS = os.getenv("BOT_SHARDS", "0")
+
+# "full": Intents.all() with discord.py's default caches.
+# "lean": only the intents the commands use, no member chunking, no message cache.
+# Registered users' IDs are then looked up by name once at startup (backfill_user_ids).
+GATEWAY_MODE = os.getenv("GATEWAY_MODE", "full")
+
+layout = get_layout()  # per-day sheets or monthly logs, from SHEET_LAYOUT
+
 # ================== GOOGLE SHEETS ==================
 
-sheets_creds = ServiceAccountCredentials.from_json_keyfile_name(
-    "service_account.json",
-    SCOPE
-)
+def open_spreadsheet():
+    """Authorize and open the bot sheet. Called by the gateway on first use, not at import."""
+    return authorize(SCOPE).open_by_key(SHEET_ID)
+
 
-sheet_client = gspread.authorize(sheets_creds)
-sheet = sheet_client.open_by_key(SHEET_ID)
+gateway = SheetsGateway(open_spreadsheet)
+
+# ================== LOCAL STORE ==================
+
+store = LocalStore(STORE_PATH)
+directory = UserDirectory(store)
+jobs = JobQueue(store)
 
 # ================== BOT ==================
 
-intents = discord.Intents.all()
-bot = commands.Bot(command_prefix="/", intents=intents)
+def gateway_options(mode=GATEWAY_MODE):
+    """Intents and cache settings for the Bot constructor."""
+    if mode == "full":
+        return {"intents": discord.Intents.all()}
+    if mode != "lean":
+        raise ValueError(f"unknown GATEWAY_MODE {mode!r} (use lean or full)")
+    intents = discord.Intents.none()
+    intents.guilds = True           # channels, roles and guild.me for admin checks and announcements
+    intents.guild_messages = True   # admin commands in the server
+    intents.dm_messages = True      # member commands in DMs
+    intents.message_content = True  # prefix commands need the message text
+    return {
+        "intents": intents,
+        "chunk_guilds_at_startup": False,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+        "max_messages": None,
+    }
+
+
+class ReleaseOnClose:
+    """Bot mixin: close() (where bot.run and run_headless both end) releases our resources, then disconnects."""
+
+    async def close(self):
+        await release_resources()
+        await super().close()
+
+
+class CPBot(ReleaseOnClose, commands.Bot):
+    pass
+
+
+class ShardedCPBot(ReleaseOnClose, commands.AutoShardedBot):
+    pass
+
+
+if BOT_SHARDS == "0":
+    bot = CPBot(command_prefix="/", **gateway_options())
+else:
+    bot = ShardedCPBot(
+        command_prefix="/", shard_count=None if BOT_SHARDS == "auto" else int(BOT_SHARDS), **gateway_options()
+    )
 
 registered_users = {}      # {username: real_name}
 submissions_today = {}     # {username: count}
 paused_dates = set()       # {"YYYY-MM-DD"}
+index = SubmissionIndex()  # per-user day bitmaps for window counts
+streaks = StreakBoard(index)  # streak aggregates over the index, skipping paused days
+first_command_at = None    # perf_counter() when the first command after start completed
+is_scheduler = False       # holds the scheduler lease right now
+live_attachments = {}      # {message_id: discord.Attachment} for queued submits, until they run
+
+metrics.Callback("cpbot_registered_users", "Entries in registered_users.", lambda: len(registered_users))
+metrics.Callback("cpbot_submissions_today", "Entries in submissions_today.", lambda: len(submissions_today))
+metrics.Callback("cpbot_paused_dates", "Entries in paused_dates.", lambda: len(paused_dates))
+metrics.Callback("cpbot_indexed_users", "Users in the submission index.", lambda: len(index))
+metrics.Callback("cpbot_outbox_pending", "Changes not yet mirrored to Sheets.", lambda: store.pending_count())
+metrics.Callback(
+    "cpbot_jobs", "Background jobs by state.",
+    lambda: {(state,): n for state, n in jobs.stats().items() if state != "oldest_pending"},
+    labelnames=["state"],
+)
+metrics.Callback("cpbot_cached_users", "Users held by discord.py plus the directory LRU.",
+                 lambda: len(bot.users) + directory.cached_count())
+metrics.Callback("cpbot_user_fetches_total", "fetch_user calls made to resolve DM recipients.",
+                 lambda: directory.fetches, kind="counter")
+metrics.Callback("cpbot_scheduler_leader", "1 while this process holds the scheduler lease.",
+                 lambda: int(is_scheduler))
+metrics.Callback(
+    "cpbot_job_oldest_pending_seconds", "Age of the oldest pending background job.",
+    lambda: jobs.stats()["oldest_pending"],
+)
 
 # ================== HELPERS ==================
 def get_week_range(date_str):
@@ -71,121 +197,217 @@ def is_date_within_last_3_days(date_str):
     except:
         return False
 
-def load_registered_users():
+async def get_registered_ws():
+    return await gateway.ensure_worksheet(
+        "Registered_Users", rows=200, cols=2, header=["Discord Username", "Real Name"]
+    )
+
+
+async def load_registered_users():
+    """Fold sheet-side registrations into the local store, then load from the store."""
     try:
-        ws = sheet.worksheet("Registered_Users")
-    except:
-        ws = sheet.add_worksheet("Registered_Users", rows=200, cols=2)
-        ws.append_row(["Discord Username", "Real Name"])
-        return
+        ws = await get_registered_ws()
+        store.merge_sheet_registrations((await gateway.get_all_values(ws))[1:])
+    except Exception as e:
+        print(f"⚠️ Registered users sync failed: {e}")
+    registered_users.update(store.registrations())
+
 
-    rows = ws.get_all_values()[1:]
-    for row in rows:
-        if len(row) >= 2:
-            registered_users[row[0]] = row[1]
+def recent_dates():
+    """Today and the last 3 days: the dates submit/status/delete can touch."""
+    today = datetime.datetime.now(IST).date()
+    return [(today - datetime.timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range(4)]
+
+
+async def sync_recent_submissions():
+    """Import rows written straight to the sheet for the recent days (form sync, manual edits)."""
+    dates = recent_dates()
+    start = datetime.date.fromisoformat(dates[-1])
+    end = datetime.date.fromisoformat(dates[0])
+    per_day = await gateway.read_day_rows(layout, start, end)
+    for date_str in dates:
+        store.merge_sheet_submissions(date_str, per_day.get(date_str, []))
 
 
 def load_submissions_today():
-    """Preload today's submission counts so reminders don't ping submitters after restart."""
-    date_str = today_str()
-    try:
-        ws = sheet.worksheet(date_str)
-    except:
-        return
+    """Today's submission counts from the store; replaces the dict, so reloading never double counts."""
+    counts = store.submission_counts(today_str())
+    submissions_today.clear()
+    submissions_today.update(counts)
 
-    submitted = ws.col_values(2)[1:]
-    for uname in submitted:
-        submissions_today[uname] = submissions_today.get(uname, 0) + 1
 
+async def get_paused_ws():
+    return await gateway.ensure_worksheet("Paused_Dates", rows=200, cols=1, header=["Date"])
 
-def get_paused_ws():
+
+async def load_paused_dates():
     try:
-        ws = sheet.worksheet("Paused_Dates")
-    except:
-        ws = sheet.add_worksheet("Paused_Dates", rows=200, cols=1)
-        ws.append_row(["Date"])
-    return ws
+        ws = await get_paused_ws()
+        dates = (await gateway.col_values(ws, 1))[1:]
+        store.merge_sheet_paused_dates(d.strip() for d in dates if d)
+    except Exception as e:
+        print(f"⚠️ Paused dates sync failed: {e}")
+    dates = store.paused_dates()
+    paused_dates.clear()
+    paused_dates.update(dates)
 
 
-def load_paused_dates():
-    ws = get_paused_ws()
-    dates = ws.col_values(1)[1:]
-    for d in dates:
-        if d:
-            paused_dates.add(d.strip())
+def is_paused_date(date_str: str) -> bool:
+    return date_str in paused_dates
 
+async def get_sheet_for_date(date_str):
+    return await gateway.ensure_worksheet(
+        layout.title_for(date_str), rows=layout.rows, cols=len(DAY_HEADER), header=DAY_HEADER
+    )
 
-def is_paused_date(date_str: str) -> bool:
-    if date_str in paused_dates:
-        return True
-    try:
-        ws = get_paused_ws()
-        rows = set(v.strip() for v in ws.col_values(1)[1:] if v)
-        if date_str in rows:
-            paused_dates.add(date_str)
-            return True
-    except:
-        pass
-    return False
 
-def get_sheet_for_date(date_str):
-    try:
-        ws = sheet.worksheet(date_str)
-    except:
-        ws = sheet.add_worksheet(date_str, rows=300, cols=4)
-        ws.append_row(["Date", "Username", "Screenshot", "Problem"])
-    return ws
+async def open_sheet(title):
+    """Worksheet for an outbox entry, created with its header when missing."""
+    if title == "Registered_Users":
+        return await get_registered_ws()
+    if title == "Paused_Dates":
+        return await get_paused_ws()
+    return await get_sheet_for_date(title)
 
-def save_image_locally(discord_url):
-    r = requests.get(discord_url)
-    r.raise_for_status()
 
-    ext = discord_url.split('.')[-1].split('?')[0]
-    if ext not in ["png", "jpg", "jpeg", "gif", "webp"]:
-        ext = "png"
+flusher = SheetsFlusher(store, gateway, open_sheet)
 
-    filename = f"{uuid.uuid4()}.{ext}"
-    filepath = IMAGE_DIR / filename
 
-    with open(filepath, "wb") as f:
-        f.write(r.content)
+async def fetch_day_usernames(start_date, end_date):
+    """{date_str: [usernames]} for every day with rows in the range, in batched reads."""
+    return await gateway.read_day_usernames(layout, start_date, end_date)
 
-    return f"{IMAGE_BASE_URL}/{filename}"
+
+async def reconcile_index(start_date, end_date):
+    """Rebuild a date range of the index from the sheet, then overlay the local store.
+
+    The store is authoritative for the recent days commands can change, since
+    its latest writes may not have reached the sheet yet.
+    """
+    per_day = await fetch_day_usernames(start_date, end_date)
+    for date_str, usernames in per_day.items():
+        index.set_day(date_str, usernames)
+    for date_str in index.known_days(start_date, end_date) - per_day.keys():
+        index.set_day(date_str, [])  # every row of that day is gone from the sheet
+    await sync_recent_submissions()
+    for date_str in recent_dates():
+        index.set_day(date_str, store.day_usernames(date_str))
+
+
+async def refresh_index(start_date, end_date):
+    """Reconcile part of the index and save the result, so the next start can skip the full read."""
+    await reconcile_index(start_date, end_date)
+    store.save_snapshot(INDEX_SNAPSHOT, index.snapshot())
+    rebuild_streaks()
+
+
+def rebuild_streaks():
+    """Recompute streaks after the index or paused dates changed wholesale (reload, form import, pause)."""
+    streaks.rebuild(registered_users, paused_dates)
+
+
+def record_day_change(uname, date_str):
+    """Bring the streak aggregates in line with one changed user-day in the index."""
+    if not streaks.update(uname, date_str):
+        rebuild_streaks()
+
+
+def load_local_state():
+    """Fill every in-memory structure from the local store alone. No network, safe to repeat."""
+    users = store.registrations()
+    registered_users.clear()
+    registered_users.update(users)
+    dates = store.paused_dates()
+    paused_dates.clear()
+    paused_dates.update(dates)
+    load_submissions_today()
+    data, saved_at = store.load_snapshot(INDEX_SNAPSHOT)
+    if data is not None:
+        index.restore(data)
+    for date_str in recent_dates():
+        index.set_day(date_str, store.day_usernames(date_str))
+    rebuild_streaks()
+    return saved_at
+
+
+def sync_shared_state():
+    """Reload what other processes changed in the shared store. A no-op (one PRAGMA) when nothing did."""
+    if not store.changed_elsewhere():
+        return False
+    users = store.registrations()
+    registered_users.clear()
+    registered_users.update(users)
+    dates = store.paused_dates()
+    paused_dates.clear()
+    paused_dates.update(dates)
+    load_submissions_today()
+    for date_str in recent_dates():
+        index.set_day(date_str, store.day_usernames(date_str))
+    rebuild_streaks()
+    directory.reload()
+    return True
+
+
+async def reconcile_with_sheets():
+    """Catch the local state up with Sheets in the background while commands are already served."""
+    started = time.perf_counter()
+    today = datetime.datetime.now(IST).date()
+    results = await asyncio.gather(
+        load_registered_users(),
+        load_paused_dates(),
+        refresh_index(datetime.date.min, today),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"⚠️ Sheets reconcile failed: {result}")
+    load_submissions_today()
+    rebuild_streaks()
+    directory.seed(bot.users, registered_users)
+    if not index_refresh.is_running():
+        index_refresh.start()
+    print(f"🔄 Reconciled with Sheets in {time.perf_counter() - started:.1f}s")
+
+
+async def backfill_user_ids():
+    """Find IDs for registered users never seen by this bot, so reminders can reach them.
+
+    In lean mode nothing else does: there is no member cache to seed from and
+    no member events. Runs once the startup reconcile has loaded every
+    registration; users still unknown afterwards are logged.
+    """
+    reconcile = getattr(bot, "reconcile_task", None)
+    if reconcile is not None:
+        await asyncio.wait([reconcile])
+    directory.seed(bot.users, registered_users)
+    if not directory.missing(registered_users):
+        return
+    unresolved = await directory.backfill(bot.guilds, registered_users)
+    if unresolved:
+        print(f"⚠️ No Discord user found for {len(unresolved)} registered user(s): {', '.join(unresolved)}")
 
 
 def count_submissions_between(start_date, end_date):
     """Count submissions per user between two dates (inclusive)."""
-    counts = {u: 0 for u in registered_users}
-    current = start_date
-    while current <= end_date:
-        date_str = current.strftime("%Y-%m-%d")
-        if date_str in paused_dates:
-            current += datetime.timedelta(days=1)
-            continue
-        try:
-            ws = sheet.worksheet(date_str)
-            submitted = ws.col_values(2)[1:]
-            for uname in submitted:
-                if uname in counts:
-                    counts[uname] += 1
-        except:
-            pass
-        current += datetime.timedelta(days=1)
-    return counts
+    return index.submissions_between(registered_users, start_date, end_date, skip=paused_dates)
 
 
 def last_four_day_range():
-    today = datetime.datetime.now(IST).date()
-    start = today - datetime.timedelta(days=4)
-    end = today - datetime.timedelta(days=1)
-    return start, end
+    return WINDOWS["last_4_days"](datetime.datetime.now(IST).date())
 
 
-def get_announcement_channel():
+# every reminder reads one evening snapshot; Sheets is read once per evening for all of them
+aggregator = NightlyAggregator(refresh_index, count_submissions_between, store)
+
+
+async def get_announcement_channel():
     """Best-effort lookup for a text channel to post announcements."""
     if ANNOUNCE_CHANNEL_ID:
         try:
             channel = bot.get_channel(ANNOUNCE_CHANNEL_ID)
+            if channel is None and "gateway" not in ROLES:
+                # no gateway cache in a scheduler process; a failed send reports missing access
+                return await bot.fetch_channel(ANNOUNCE_CHANNEL_ID)
             if channel and channel.permissions_for(channel.guild.me).send_messages:
                 return channel
         except:
@@ -202,20 +424,78 @@ def get_announcement_channel():
 
 # ================== EVENTS ==================
 
+@bot.event
+async def setup_hook():
+    """Runs once before connecting: serve from the local snapshot, reconcile with Sheets later."""
+    saved_at = load_local_state()
+    age = f"{(time.time() - saved_at) / 3600:.1f}h old" if saved_at else "none yet"
+    print(
+        f"💾 Local state ready in {(time.perf_counter() - STARTED_AT) * 1000:.0f} ms: "
+        f"{len(registered_users)} users, {len(paused_dates)} paused dates, index snapshot {age}"
+    )
+    bot.loop_lag_task = asyncio.create_task(metrics.monitor_loop_lag())
+    if ROLES & {"gateway", "scheduler"}:
+        bot.reconcile_task = asyncio.create_task(reconcile_with_sheets())
+    if "ingest" in ROLES:
+        jobs.start()  # also resumes submits queued before a restart
+    if "scheduler" in ROLES:
+        start_scheduler()
+    if not state_sync.is_running():
+        state_sync.start()
+    print(f"🧩 Roles: {', '.join(sorted(ROLES))} ({INSTANCE})")
+
+
+def start_scheduler():
+    """Start every scheduled loop. They all stand by unless this process holds the scheduler lease."""
+    global is_scheduler
+    is_scheduler = store.acquire_lease("scheduler", INSTANCE, SCHEDULER_LEASE_SECONDS)
+    for loop in (scheduler_lease, sheets_flush, nightly_aggregate, daily_reminder, weekly_reminder,
+                 monthly_target_check, inactive_reminder):
+        if not loop.is_running():
+            loop.start()  # sheets_flush's first run pushes anything left unsynced before the last shutdown
+
+
 @bot.event
 async def on_ready():
-    load_registered_users()
-    load_paused_dates()
-    load_submissions_today()
-    if not daily_reminder.is_running():
-        daily_reminder.start()
-    if not weekly_reminder.is_running():
-        weekly_reminder.start()
-    if not monthly_target_check.is_running():
-        monthly_target_check.start()
-    if not inactive_reminder.is_running():
-        inactive_reminder.start()
-    print(f"✅ Bot online: {bot.user}")
+    """Runs again on every reconnect, so it only does idempotent work."""
+    directory.seed(bot.users, registered_users)
+    if getattr(bot, "backfill_task", None) is None:
+        bot.backfill_task = asyncio.create_task(backfill_user_ids())
+    print(f"✅ Bot online: {bot.user} ({time.perf_counter() - STARTED_AT:.1f}s after start)")
+
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started_at = time.perf_counter()
+    sync_shared_state()
+    if ctx.author.name in registered_users:
+        directory.remember(ctx.author)  # without member events, commands are where IDs are learned
+
+
+@bot.after_invoke
+async def record_command_time(ctx):
+    outcome = "error" if ctx.command_failed else "ok"
+    metrics.COMMAND_SECONDS.observe(time.perf_counter() - ctx.started_at, ctx.command.name, outcome)
+
+
+@bot.event
+async def on_command_completion(ctx):
+    global first_command_at
+    if first_command_at is None:
+        first_command_at = time.perf_counter()
+        print(f"⏱️ First command /{ctx.command} answered {first_command_at - STARTED_AT:.1f}s after start")
+
+
+@bot.event
+async def on_member_join(member):
+    if member.name in registered_users:
+        directory.remember(member)
+
+
+@bot.event
+async def on_user_update(before, after):
+    if before.name in registered_users or after.name in registered_users:
+        directory.rename(before, after)
 
 # ================== COMMANDS ==================
 
@@ -237,7 +517,8 @@ async def register(ctx):
     real_name = msg.content.strip()
 
     registered_users[uname] = real_name
-    sheet.worksheet("Registered_Users").append_row([uname, real_name])
+    store.register(uname, real_name)
+    directory.remember(ctx.author)
 
     await ctx.reply(f"✅ Registered as **{real_name}**")
 
@@ -267,23 +548,69 @@ async def submit(ctx, *, args=""):
     if is_paused_date(date_str):
         return await ctx.reply(f"⏸️ Submissions paused for **{date_str}**")
 
-    await ctx.reply("📤 Saving image…")
-
-    image_url = save_image_locally(ctx.message.attachments[0].url)
-
-    ws = get_sheet_for_date(date_str)
-    ws.append_row([
-        date_str,
-        uname,
-        image_url,
-        problem
-    ])
-
+    attachment = ctx.message.attachments[0]
+    try:
+        ingestor.check(attachment)
+    except ImageRejected as e:
+        return await ctx.reply(f"❌ Screenshot rejected: {e}")
+
+    payload = {
+        "username": uname,
+        "user_id": ctx.author.id,
+        "date": date_str,
+        "problem": problem,
+        "attachment": AttachmentRef.of(attachment).to_dict(),
+    }
+    if "ingest" in ROLES:
+        live_attachments[ctx.message.id] = attachment  # a local worker can skip the re-download
+    if not jobs.submit(ctx.message.id, "submit", payload):
+        live_attachments.pop(ctx.message.id, None)
+        return await ctx.reply("ℹ️ This message was already submitted")
+
+    label = "today" if date_str == today_str() else date_str
+    await ctx.reply(f"📥 Got it! Saving your submission for **{label}**, I'll DM you when it's stored")
+
+
+async def run_submit(message_id, payload):
+    """Submit job: store the screenshot, record the row, confirm by DM. Safe to run again."""
+    attachment = live_attachments.get(message_id) or AttachmentRef(**payload["attachment"])
+    try:
+        image_url = await ingestor.save(attachment)
+    except ImageRejected as e:
+        raise PermanentJobError(f"Screenshot rejected: {e}") from e
+
+    uname, date_str = payload["username"], payload["date"]
+    _, created = store.add_submission(date_str, uname, image_url, payload["problem"], message_id=message_id)
+    live_attachments.pop(message_id, None)
+    if not created:
+        return  # an earlier attempt stored it and already confirmed (or is about to)
+
+    index.add(uname, date_str)
+    record_day_change(uname, date_str)
     if date_str == today_str():
         submissions_today[uname] = submissions_today.get(uname, 0) + 1
-        await ctx.reply(f"🔥 Submission #{submissions_today[uname]} saved for **today**")
+        text = f"🔥 Submission #{submissions_today[uname]} saved for **today**"
     else:
-        await ctx.reply(f"✅ Backdated submission saved for **{date_str}**")
+        text = f"✅ Backdated submission saved for **{date_str}**"
+    await confirm(payload["user_id"], text)
+
+
+async def submit_failed(message_id, payload, error):
+    live_attachments.pop(message_id, None)
+    await confirm(payload["user_id"], f"❌ Couldn't save your submission for **{payload['date']}**: {error}")
+
+
+async def confirm(user_id, text):
+    """Best-effort DM; the submission is stored whether or not it arrives."""
+    try:
+        user = await directory.resolve_id(bot, user_id)
+        if user is not None:
+            await user.send(text)
+    except discord.HTTPException as e:
+        print(f"⚠️ Confirmation DM to {user_id} failed: {e}")
+
+
+jobs.register("submit", run_submit, submit_failed)
 
 @bot.command()
 async def status(ctx, date: str | None = None):
@@ -301,13 +628,7 @@ async def status(ctx, date: str | None = None):
         
         target_date = date
 
-    try:
-        ws = sheet.worksheet(target_date)
-    except:
-        return await ctx.reply(f"❌ No submissions logged for **{target_date}**.")
-    
-    submitted_users = ws.col_values(2)[1:]
-    count=submitted_users.count(ctx.author.name)
+    count = store.count_submissions(target_date, ctx.author.name)
     
     if target_date==today_str():
         label = "today"
@@ -335,25 +656,11 @@ async def delete(ctx, date: str | None = None):
             return await ctx.reply("❌ You can delete submissions only for **today or last 3 days**.")
         target_date = date
 
-    try:
-        ws=sheet.worksheet(target_date)
-    except:
-        return await ctx.reply(f"❌ No submissions recorded for **{target_date}**.")
-    rows = ws.get_all_values()
-    if len(rows) <= 1:
-        return await ctx.reply(f"❌ No submissions on **{target_date}**.")
-    
-    user_rows = []
-    for row_idx, row in enumerate(rows[1:], 2):  
-        if row[1] == uname:  
-            user_rows.append(row_idx)
-
-    if not user_rows:
+    if store.delete_last_submission(target_date, uname) is None:
         label = "today" if target_date == today_str() else target_date
         return await ctx.reply(f"❌ No submissions for you on **{label}**.")
-    
-    row_to_delete = user_rows[-1]
-    ws.delete_rows(row_to_delete)
+    index.remove(uname, target_date)
+    record_day_change(uname, target_date)
 
     if target_date == today_str():
         submissions_today[uname] = max(0, submissions_today.get(uname, 1) - 1)
@@ -365,18 +672,53 @@ async def delete(ctx, date: str | None = None):
     await ctx.reply(f"✅ Deleted your submission from **{label}**.")
 
 
+@bot.command()
+async def streak(ctx):
+    uname = ctx.author.name
+    if uname not in registered_users:
+        return await ctx.reply("❌ Please /register first")
+
+    today = datetime.datetime.now(IST).date()
+    current, longest, total, month = streaks.stats(uname, today)
+    if current and not index.submitted_on(uname, today) and not is_paused_date(today.isoformat()):
+        note = "\n⏰ Submit today to keep it going!"
+    else:
+        note = ""
+    await ctx.reply(
+        f"🔥 Current streak: **{current}** day(s)\n"
+        f"🏆 Longest streak: **{longest}** day(s)\n"
+        f"📅 {today.strftime('%B')}: **{month}** day(s), **{total}** in total{note}"
+    )
+
+
+@bot.command()
+async def leaderboard(ctx):
+    today = datetime.datetime.now(IST).date()
+    ranking = streaks.ranking(registered_users, today)
+    if not ranking or not ranking[0][1]:
+        return await ctx.reply("No active streaks yet 💤")
+
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    lines = [
+        f"{medals.get(rank, f'{rank}.')} {registered_users[uname]} — 🔥 {current} (best {longest}, {month} this month)"
+        for rank, (uname, current, longest, total, month) in enumerate(ranking[:LEADERBOARD_SIZE], 1)
+        if current
+    ]
+    mine = next((rank for rank, row in enumerate(ranking, 1) if row[0] == ctx.author.name), None)
+    if mine and mine > LEADERBOARD_SIZE:
+        lines.append(f"…\nYou: #{mine} — 🔥 {ranking[mine - 1][1]}")
+    await ctx.reply("🏁 **Streak leaderboard**\n" + "\n".join(lines))
+
+
 @bot.command()
 async def notcompleted(ctx):
     if not ctx.guild or not ctx.author.guild_permissions.administrator:
         return await ctx.reply("Admin only")
 
-    try:
-        ws = sheet.worksheet(today_str())
-    except:
+    submitted = store.submission_counts(today_str())
+    if not submitted:
         return await ctx.reply("No submissions today")
 
-    submitted = set(ws.col_values(2)[1:])
-
     pending = [
         registered_users[u]
         for u in registered_users
@@ -402,9 +744,9 @@ async def pause(ctx, date: str | None = None):
     if target_date in paused_dates:
         return await ctx.reply(f"ℹ️ Already paused for **{target_date}**")
 
-    ws = get_paused_ws()
     paused_dates.add(target_date)
-    ws.append_row([target_date])
+    store.pause(target_date)
+    rebuild_streaks()
     await ctx.reply(f"⏸️ Submissions paused for **{target_date}** (ignored in reminders and targets)")
 
 
@@ -419,12 +761,8 @@ async def unpause(ctx, date: str | None = None):
 
     if target_date in paused_dates:
         paused_dates.remove(target_date)
-        ws = get_paused_ws()
-        rows = ws.col_values(1)
-        for idx, val in enumerate(rows, start=1):
-            if val == target_date:
-                ws.delete_rows(idx)
-                break
+        store.unpause(target_date)
+        rebuild_streaks()
         await ctx.reply(f"▶️ Submissions unpaused for **{target_date}**")
     else:
         await ctx.reply(f"ℹ️ No pause set for **{target_date}**")
@@ -437,38 +775,23 @@ async def summarize(ctx):
     now = datetime.datetime.now(IST)
     title = f"Summary-{now.strftime('%B')}-{now.year}"
 
-    try:
-        sheet.worksheet(title)
+    if await gateway.find_worksheet(title) is not None:
         return await ctx.reply("Summary already exists")
-    except:
-        sws = sheet.add_worksheet(title, rows=200, cols=4)
-        sws.append_row(["Real Name", "Days Submitted", "Total Days", "Consistency %"])
 
     current_year = now.year
     current_month = now.month
 
-    day_sheets = []
-    for ws in sheet.worksheets():
-        if not is_valid_date(ws.title):
-            continue
-        try:
-            d = datetime.datetime.strptime(ws.title, "%Y-%m-%d").date()
-        except:
-            continue
-        if d.year == current_year and d.month == current_month:
-            day_sheets.append(ws)
-
-    total_days = len(day_sheets)
-
-    submissions_per_day = [
-        set(ws.col_values(2)[1:]) for ws in day_sheets
-    ]
+    month_start = datetime.date(current_year, current_month, 1)
+    total_days = index.active_days(month_start, now.date())
+    days_submitted = index.days_between(registered_users, month_start, now.date())
 
+    rows = []
     for uname, real_name in registered_users.items():
-        days = sum(1 for day in submissions_per_day if uname in day)
-        percent = (days / total_days * 100) if total_days else 0
-        sws.append_row([real_name, days, total_days, f"{percent:.1f}%"])
+        days = days_submitted[uname]
+        ratio = (days / total_days) if total_days else 0
+        rows.append([real_name, days, total_days, ratio])
 
+    await gateway.write_report(title, SUMMARY_HEADER, rows, percent_cols=[3])
     await ctx.reply("📊 Summary generated")
 @bot.command()
 async def weeksummarize(ctx, date_str):
@@ -483,30 +806,17 @@ async def weeksummarize(ctx, date_str):
 
     title = f"Week-{start}_to_{end}"
 
-    try:
-        sheet.worksheet(title)
+    if await gateway.find_worksheet(title) is not None:
         return await ctx.reply("Weekly summary already exists")
-    except:
-        ws = sheet.add_worksheet(title, rows=200, cols=4)
-        ws.append_row(["Real Name", "Days Submitted", "Total Days", "Consistency %"])
 
-    week_days = [
-        (start + datetime.timedelta(days=i)).strftime("%Y-%m-%d")
-        for i in range(7)
-    ]
+    days_submitted = index.days_between(registered_users, start, end)
 
-    submissions = []
-    for d in week_days:
-        try:
-            day_ws = sheet.worksheet(d)
-            submissions.append(set(day_ws.col_values(2)[1:]))
-        except:
-            submissions.append(set())
+    rows = [
+        [real_name, days_submitted[uname], 7, days_submitted[uname] / 7]
+        for uname, real_name in registered_users.items()
+    ]
 
-    for uname, real_name in registered_users.items():
-        days = sum(1 for day in submissions if uname in day)
-        percent = (days / 7) * 100
-        ws.append_row([real_name, days, 7, f"{percent:.1f}%"])
+    await gateway.write_report(title, SUMMARY_HEADER, rows, percent_cols=[3])
 
     await ctx.reply(f"📊 Weekly summary created ({start} → {end})")
 
@@ -527,83 +837,149 @@ async def inactive(ctx):
     await ctx.send(f"Inactive last 4 days:\n{msg}")
 
 
+@bot.command()
+async def queue(ctx):
+    if not ctx.guild or not ctx.author.guild_permissions.administrator:
+        return await ctx.reply("Admin only")
+
+    stats = jobs.stats()
+    leader, _ = store.lease_holder("scheduler")
+    await ctx.reply(
+        f"🧾 Jobs: **{stats['pending']}** pending (oldest {stats['oldest_pending']:.0f}s), "
+        f"{stats['done']} done, {stats['failed']} failed · outbox {store.pending_count()}\n"
+        f"🗓️ Scheduler: {leader or 'none'}"
+    )
+
+
+@bot.command()
+async def nightly(ctx):
+    if not ctx.guild or not ctx.author.guild_permissions.administrator:
+        return await ctx.reply("Admin only")
+
+    snapshot = aggregator.last()
+    if snapshot is None:
+        return await ctx.reply("No nightly snapshot yet, it is built at 21:00 🕘")
+
+    lines = [f"🧮 Nightly snapshot for **{snapshot.date}**, built {snapshot.age / 60:.0f} min ago"
+             + ("" if snapshot.refreshed else " (⚠️ Sheets refresh failed, index only)")]
+    for name, (start, end) in snapshot.windows.items():
+        counts = snapshot.counts[name]
+        zero = sum(1 for n in counts.values() if n == 0)
+        lines.append(f"• {name} ({start} → {end}): {sum(counts.values())} submissions, {zero} users with none")
+    await ctx.reply(
+        "\n".join(lines),
+        file=discord.File(io.BytesIO(snapshot.to_csv(registered_users).encode()),
+                          filename=f"nightly-{snapshot.date}.csv"),
+    )
+
+
+def export_and_report(history):
+    history.save()
+    return build_report(history)
+
+
+@bot.command()
+async def analytics(ctx):
+    if not ctx.guild or not ctx.author.guild_permissions.administrator:
+        return await ctx.reply("Admin only")
+
+    started = time.perf_counter()
+    today = datetime.datetime.now(IST).date()
+    history = History.from_index(index, registered_users, paused_dates, end=today)
+    report, summary = await asyncio.to_thread(export_and_report, history)
+    elapsed = time.perf_counter() - started
+
+    await ctx.reply(
+        f"{summary}\n⏱️ {elapsed:.2f}s",
+        file=discord.File(io.BytesIO(report.encode()), filename=f"analytics-{today}.csv"),
+    )
+
+
 
 # ================== REMINDER ==================
 
+@tasks.loop(time=datetime.time(hour=21, minute=0, tzinfo=IST))
+async def nightly_aggregate():
+    """Refresh every reminder window from Sheets in one pass, before the first reminder runs."""
+    if not is_scheduler:
+        return
+    started = time.perf_counter()
+    snapshot = await aggregator.get(datetime.datetime.now(IST).date())
+    start, end = aggregator.span(snapshot.date)
+    print(f"🧮 Nightly aggregates for {start} → {end} built in {time.perf_counter() - started:.1f}s")
+
+
 @tasks.loop(time=datetime.time(hour=22, minute=0, tzinfo=IST))
 async def daily_reminder():
+    if not is_scheduler:
+        return
     if is_paused_date(today_str()):
-        submissions_today.clear()
         return
-    for uname in registered_users:
-        if uname not in submissions_today:
-            user = discord.utils.get(bot.users, name=uname)
-            if user:
-                try:
-                    await user.send("⏰ Reminder: submit today’s CP")
-                except:
-                    pass
-    submissions_today.clear()
+    snapshot = await aggregator.get(datetime.datetime.now(IST).date())
+    result = await fan_out(bot, directory, {
+        uname: "⏰ Reminder: submit today’s CP"
+        for uname, total in snapshot.counts["today"].items()
+        if total == 0
+    }, reminder="daily")
+    print(f"📨 Daily reminder: {result}")
 
 
 @tasks.loop(time=datetime.time(hour=21, minute=15, tzinfo=IST))
 async def weekly_reminder():
+    if not is_scheduler:
+        return
     now = datetime.datetime.now(IST)
     if now.weekday() != 6:  # Run only on Sundays
         return
 
-    week_end = now.date()
-    week_start = week_end - datetime.timedelta(days=6)
-    counts = count_submissions_between(week_start, week_end)
+    snapshot = await aggregator.get(now.date())
+    week_start, week_end = snapshot.windows["week"]
+    counts = snapshot.counts["week"]
 
-    for uname, total in counts.items():
-        if total < 3:
-            user = discord.utils.get(bot.users, name=uname)
-            if user:
-                try:
-                    await user.send(
-                        f"📅 Weekly reminder: {total} submissions from {week_start} to {week_end}. Target is 3+."
-                    )
-                except:
-                    pass
+    result = await fan_out(bot, directory, {
+        uname: f"📅 Weekly reminder: {total} submissions from {week_start} to {week_end}. Target is 3+."
+        for uname, total in counts.items()
+        if total < 3
+    }, reminder="weekly")
+    print(f"📨 Weekly reminder: {result}")
 
 
 @tasks.loop(time=datetime.time(hour=21, minute=30, tzinfo=IST))
 async def monthly_target_check():
+    if not is_scheduler:
+        return
     now = datetime.datetime.now(IST)
     if now.day != 1:  # Run on the first day of the month for the previous month
         return
 
-    last_month_end = now.date() - datetime.timedelta(days=1)
-    last_month_start = last_month_end.replace(day=1)
-
-    counts = count_submissions_between(last_month_start, last_month_end)
+    snapshot = await aggregator.get(now.date())
+    last_month_start, _ = snapshot.windows["last_month"]
+    counts = snapshot.counts["last_month"]
     month_label = last_month_start.strftime("%B %Y")
 
-    for uname, total in counts.items():
-        if total < 14:
-            user = discord.utils.get(bot.users, name=uname)
-            if user:
-                try:
-                    await user.send(
-                        f"🗓️ Monthly target alert: {total} submissions in {month_label}. Please aim for 14+ to hit the target."
-                    )
-                except:
-                    pass
+    result = await fan_out(bot, directory, {
+        uname: f"🗓️ Monthly target alert: {total} submissions in {month_label}. Please aim for 14+ to hit the target."
+        for uname, total in counts.items()
+        if total < 14
+    }, reminder="monthly")
+    print(f"📨 Monthly target check: {result}")
 
 
 @tasks.loop(time=datetime.time(hour=21, minute=45, tzinfo=IST))
 async def inactive_reminder():
+    if not is_scheduler:
+        return
     today = datetime.datetime.now(IST).date()
     if today.toordinal() % 4 != 0:  # Every 4th day
         return
 
-    channel = get_announcement_channel()
+    channel = await get_announcement_channel()
     if not channel:
         return
 
-    start, end = last_four_day_range()
-    counts = count_submissions_between(start, end)
+    snapshot = await aggregator.get(today)
+    start, end = snapshot.windows["last_4_days"]
+    counts = snapshot.counts["last_4_days"]
     inactive_users = [registered_users[u] for u, total in counts.items() if total == 0]
 
     if not inactive_users:
@@ -612,6 +988,76 @@ async def inactive_reminder():
     msg = "\n".join(f"• {name}" for name in inactive_users)
     await channel.send(f"Inactive last 4 days ({start} to {end}):\n{msg}")
 
+# ================== SCHEDULER ==================
+
+@tasks.loop(seconds=SCHEDULER_LEASE_SECONDS / 3)
+async def scheduler_lease():
+    """Renew the lease while alive; a standby takes over once the holder stops renewing."""
+    global is_scheduler
+    held = store.acquire_lease("scheduler", INSTANCE, SCHEDULER_LEASE_SECONDS)
+    if held != is_scheduler:
+        print("👑 Took over the scheduler lease" if held else "💤 Lost the scheduler lease, standing by")
+    is_scheduler = held
+
+
+@tasks.loop(seconds=STATE_SYNC_SECONDS)
+async def state_sync():
+    if not sync_shared_state():
+        load_submissions_today()  # also rolls today's counts over at midnight
+
+# ================== SHEETS SYNC ==================
+
+@tasks.loop(seconds=SHEETS_FLUSH_SECONDS)
+async def sheets_flush():
+    if not is_scheduler:
+        return  # one flusher per store, or rows would be appended twice
+    try:
+        await flusher.flush()
+    except Exception as e:
+        print(f"⚠️ Sheets flush failed: {e}")
+
+@tasks.loop(minutes=INDEX_REFRESH_MINUTES)
+async def index_refresh():
+    """Re-read the recent window to pick up form imports. The full history is read by the startup reconcile."""
+    if index_refresh.current_loop == 0:
+        return
+    today = datetime.datetime.now(IST).date()
+    start = today - datetime.timedelta(days=INDEX_REFRESH_DAYS)
+    try:
+        await refresh_index(start, today)
+    except Exception as e:
+        print(f"⚠️ Index refresh failed: {e}")
+
 # ================== RUN ==================
 
-bot.run(TOKEN)
+async def release_resources():
+    """Shutdown, from bot.close(): hand back the scheduler lease, stop the workers, close the gateway."""
+    global is_scheduler
+    scheduler_lease.cancel()
+    if is_scheduler:
+        store.release_lease("scheduler", INSTANCE)  # a standby takes over now, not when the lease expires
+        is_scheduler = False
+    await ingestor.close()
+    pipeline.close()
+    gateway.close()
+
+
+async def run_headless():
+    """Scheduler / ingest processes: log in over HTTP for DMs and posts, without a gateway connection."""
+    async with bot:
+        await bot.login(TOKEN)  # runs setup_hook
+        await asyncio.Event().wait()
+
+
+def run():
+    """Start this process's roles. Deployments start it through run.py."""
+    if METRICS_PORT:
+        keep_alive(METRICS_PORT)
+    if "gateway" in ROLES:
+        bot.run(TOKEN)
+    else:
+        asyncio.run(run_headless())
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,195 @@
+"""Process metrics in the Prometheus text format, without a client library.
+
+Recording is a lock, a bisect and two additions, so it is cheap enough for
+every command and Sheets call. Values derived from existing state (dict
+sizes, outbox depth) are registered as callbacks and only computed when
+/metrics is scraped.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# ================== CONFIG ==================
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+BYTES_BUCKETS = (16e3, 64e3, 256e3, 1e6, 4e6, 10e6)
+LOOP_LAG_INTERVAL = 0.5
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ================== METRIC TYPES ==================
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # {labels: [per-bucket counts..., +Inf count, sum]}
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = []
+        for labels, series in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), series):
+                cumulative += n
+                le = _labels(self.labelnames, labels, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Callback(_Metric):
+    """A gauge or counter whose value is read from `fn()` at scrape time.
+
+    `fn` returns a number, or {label tuple: number} when `labelnames` is set.
+    """
+
+    def __init__(self, name, help_text, fn, kind="gauge", labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return []   # a failing callback must not break the whole scrape
+        if not self.labelnames:
+            return [f"{self.name} {_number(value)}"]
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in value.items()]
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        samples = metric.samples()
+        if samples:
+            lines += metric.header() + samples
+    return "\n".join(lines) + "\n"
+
+
+# ================== BOT METRICS ==================
+
+COMMAND_SECONDS = Histogram(
+    "cpbot_command_seconds", "Command handling time.", ["command", "outcome"]
+)
+SHEETS_SECONDS = Histogram(
+    "cpbot_sheets_call_seconds", "Sheets gateway call time, including retries and throttling.",
+    ["operation"],
+)
+SHEETS_ERRORS = Counter(
+    "cpbot_sheets_errors_total", "Sheets gateway calls that raised.", ["operation", "error"]
+)
+IMAGE_BYTES = Histogram(
+    "cpbot_image_download_bytes", "Size of downloaded screenshots.", ["mode"], buckets=BYTES_BUCKETS
+)
+IMAGE_SECONDS = Histogram(
+    "cpbot_image_download_seconds", "Screenshot download and store time.", ["mode"]
+)
+FANOUT_SECONDS = Histogram(
+    "cpbot_fanout_seconds", "Reminder DM fan-out duration.", ["reminder"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800),
+)
+FANOUT_MESSAGES = Counter(
+    "cpbot_fanout_messages_total", "Reminder DMs by result.", ["reminder", "result"]
+)
+JOB_SECONDS = Histogram(
+    "cpbot_job_seconds", "Background job run time per attempt.", ["kind", "outcome"]
+)
+JOB_RESULTS = Counter(
+    "cpbot_job_attempts_total", "Background job attempts by outcome.", ["kind", "outcome"]
+)
+LOOP_LAG = Histogram(
+    "cpbot_event_loop_lag_seconds", "How late the event loop woke a sleeping task.",
+    buckets=LOOP_LAG_BUCKETS,
+)
+
+
+async def monitor_loop_lag(interval=LOOP_LAG_INTERVAL):
+    """Sleep `interval` forever and record how much longer each sleep took."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
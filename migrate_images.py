@@ -0,0 +1,122 @@
+"""One-time move of flat IMAGE_DIR screenshots into the content-addressed layout.
+
+Every `<uuid>.<ext>` file at the top of IMAGE_DIR is hashed and hard-linked
+to `ab/cd/<sha256>.<ext>` (duplicates collapse into one file). The
+Screenshot column of every day sheet and monthly log and the bot's local
+store are then rewritten to the new URLs. Only after that are the flat
+files removed, and a file whose old URL is still in a sheet is kept, so
+every URL in the sheet keeps working throughout.
+
+    python migrate_images.py --dry-run
+    python migrate_images.py
+"""
+import argparse
+import os
+from pathlib import Path
+
+import bulk_reader
+from image_store import ContentStore, hash_file, shard_relpath
+from local_store import LocalStore, STORE_PATH
+from sheet_catalog import parse_day_title, parse_log_title
+from sheets_client import authorize
+
+VM_PUBLIC_IP = "52.172.194.26"
+IMAGE_BASE_URL = f"http://{VM_PUBLIC_IP}:8080"
+IMAGE_DIR = Path(os.getenv("IMAGE_DIR", "/home/Chakradhar/cpbot_images"))
+
+SHEET_ID = "1qPoJ0uBdVCQZMZYWRS6Bt60YjJnYUkD4OePSTRMiSrI"
+SCOPE = ["https://www.googleapis.com/auth/spreadsheets"]
+
+UPDATE_BATCH = 500
+
+
+def is_submission_title(title):
+    """Day sheets and monthly logs: the sheets with a Screenshot column (C)."""
+    return parse_day_title(title) is not None or parse_log_title(title) is not None
+
+
+def link_files(store, dry_run):
+    """Link every flat image into its shard. Returns ({old_url: new_url}, [flat paths])."""
+    mapping = {}
+    flat = []
+    linked = duplicates = 0
+    for path in sorted(IMAGE_DIR.iterdir()):
+        if not path.is_file() or path.suffix == ".part":
+            continue
+        ext = path.suffix.lstrip(".").lower() or "png"
+        digest = hash_file(path)
+        relpath = store.find(digest)
+        if relpath is None:
+            relpath = shard_relpath(digest, ext)
+            if not dry_run:
+                dest = IMAGE_DIR / relpath
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                os.link(path, dest)
+            linked += 1
+        else:
+            duplicates += 1
+        mapping[f"{IMAGE_BASE_URL}/{path.name}"] = store.url_for(relpath)
+        flat.append(path)
+    print(f"📦 Files: {linked} stored, {duplicates} duplicates")
+    return mapping, flat
+
+
+def rewrite_sheets(sheet, mapping, dry_run):
+    """Point Screenshot cells at new URLs ({old: new}). Returns the old URLs still in a sheet afterwards.
+
+    The column is read back after writing, so a row that landed mid-run or a
+    failed batch keeps its file from being deleted.
+    """
+    titles = [ws.title for ws in sheet.worksheets() if is_submission_title(ws.title)]
+    cells = bulk_reader.read_column_cells(sheet, titles, "C", first_row=2)
+
+    updates = []
+    for title, values in cells.items():
+        for offset, url in enumerate(values):
+            if url in mapping:
+                updates.append({
+                    "range": bulk_reader.a1_cell(title, "C", offset + 2),
+                    "values": [[mapping[url]]],
+                })
+
+    print(f"📝 Sheet cells to rewrite: {len(updates)} across {len(titles)} day sheets / monthly logs")
+    if dry_run:
+        return set()
+    for i in range(0, len(updates), UPDATE_BATCH):
+        sheet.values_batch_update({
+            "valueInputOption": "RAW",
+            "data": updates[i:i + UPDATE_BATCH],
+        })
+
+    titles = [ws.title for ws in sheet.worksheets() if is_submission_title(ws.title)]
+    after = bulk_reader.read_column_cells(sheet, titles, "C", first_row=2)
+    remaining = {url for values in after.values() for url in values if url in mapping}
+    if remaining:
+        print(f"⚠️ {len(remaining)} old URLs are still in the sheets; keeping their files")
+    return remaining
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move screenshots to content-addressed storage")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change")
+    args = parser.parse_args()
+
+    store = ContentStore(IMAGE_DIR, IMAGE_BASE_URL)
+    mapping, flat = link_files(store, args.dry_run)
+    if not mapping:
+        print("✅ Nothing to migrate")
+        return
+
+    sheet = authorize(SCOPE).open_by_key(SHEET_ID)
+    remaining = rewrite_sheets(sheet, mapping, args.dry_run)
+
+    if not args.dry_run:
+        LocalStore(STORE_PATH).rewrite_screenshots(mapping)
+        for path in flat:
+            if f"{IMAGE_BASE_URL}/{path.name}" not in remaining:
+                path.unlink()
+    print("✅ Image migration DONE" + (" (dry run)" if args.dry_run else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Fold the per-day submission sheets into monthly log sheets ("Log-YYYY-MM").
+
+Stop the bot first. Every "YYYY-MM-DD" sheet is read in batched range reads,
+its rows are appended to the log of its month (rows already in the log are
+not appended again, so the tool can be re-run after a failure), and the logs
+are read back and compared with the day sheets row for row, per date. Day
+sheets are only deleted with --delete-days, and only when every count
+matches. Start the bot again with SHEET_LAYOUT=monthly.
+
+    python migrate_layout.py --dry-run
+    python migrate_layout.py
+    python migrate_layout.py --delete-days
+"""
+import argparse
+import sys
+from collections import Counter
+
+import bulk_reader
+from sheet_catalog import month_log_title, parse_day_title, parse_log_title
+from sheet_layout import DAY_HEADER, MonthlyLayout
+from sheets_client import authorize
+
+SHEET_ID = "1qPoJ0uBdVCQZMZYWRS6Bt60YjJnYUkD4OePSTRMiSrI"
+SCOPE = ["https://www.googleapis.com/auth/spreadsheets"]
+
+DELETE_BATCH = 100
+
+
+def read_day_sheets(sheet, day_titles):
+    """{date_str: [[date, username, screenshot, problem, id], ...]} with blank rows dropped."""
+    per_day = {}
+    for title, rows in bulk_reader.read_rows(sheet, day_titles, "A", "E").items():
+        per_day[title] = [[title, *row[1:]] for row in rows if any(row[1:])]
+    return per_day
+
+
+def plan_appends(per_day, existing):
+    """{log title: rows missing from that log}, in date order.
+
+    Compared as a multiset, so a row submitted twice in a day is kept twice
+    and rows copied by an earlier run are not copied again.
+    """
+    by_month = {}
+    for date_str in sorted(per_day):
+        by_month.setdefault(month_log_title(date_str), []).extend(per_day[date_str])
+
+    plan = {}
+    for title, rows in by_month.items():
+        already = Counter(tuple(r) for r in existing.get(title, []))
+        missing = []
+        for row in rows:
+            key = tuple(row)
+            if already[key]:
+                already[key] -= 1
+            else:
+                missing.append(row)
+        if missing:
+            plan[title] = missing
+    return plan
+
+
+def verify(sheet, per_day, log_titles):
+    """Per-date row counts in the logs vs the day sheets. Returns the mismatching dates."""
+    logs = bulk_reader.read_rows(sheet, log_titles, "A", "D")
+    in_logs = Counter(row[0] for rows in logs.values() for row in rows if row[0] and any(row[1:]))
+    mismatches = {}
+    for date_str, rows in per_day.items():
+        if in_logs[date_str] != len(rows):
+            mismatches[date_str] = (len(rows), in_logs[date_str])
+    return mismatches
+
+
+def delete_sheets(sheet, worksheets):
+    for i in range(0, len(worksheets), DELETE_BATCH):
+        chunk = worksheets[i:i + DELETE_BATCH]
+        sheet.batch_update({"requests": [{"deleteSheet": {"sheetId": ws.id}} for ws in chunk]})
+
+
+def migrate(sheet, dry_run=False, delete_days=False):
+    worksheets = sheet.worksheets()
+    day_sheets = sorted((ws for ws in worksheets if parse_day_title(ws.title)), key=lambda ws: ws.title)
+    logs = {ws.title: ws for ws in worksheets if parse_log_title(ws.title)}
+    print(f"📄 Day sheets: {len(day_sheets)}, existing monthly logs: {len(logs)}")
+    if not day_sheets:
+        print("✅ Nothing to migrate")
+        return True
+
+    per_day = read_day_sheets(sheet, [ws.title for ws in day_sheets])
+    existing = bulk_reader.read_rows(sheet, list(logs), "A", "E")
+    plan = plan_appends(per_day, existing)
+    total = sum(len(rows) for rows in per_day.values())
+    print(f"📥 Rows in day sheets: {total}, to append: {sum(len(r) for r in plan.values())} "
+          f"into {len(plan)} logs")
+
+    if dry_run:
+        for title, rows in sorted(plan.items()):
+            print(f"   {title}: +{len(rows)}" + ("" if title in logs else " (new sheet)"))
+        print("✅ Dry run, nothing written")
+        return True
+
+    for title, rows in sorted(plan.items()):
+        if title in logs:
+            logs[title].append_rows(rows)
+        else:
+            ws = sheet.add_worksheet(title, rows=max(len(rows) + 1, MonthlyLayout.rows), cols=len(DAY_HEADER))
+            ws.append_rows([DAY_HEADER, *rows])
+            logs[title] = ws
+        print(f"   {title}: +{len(rows)}")
+
+    mismatches = verify(sheet, per_day, sorted({month_log_title(d) for d in per_day}))
+    if mismatches:
+        print(f"❌ Row counts differ for {len(mismatches)} dates (day sheet vs log):")
+        for date_str, (want, got) in sorted(mismatches.items()):
+            print(f"   {date_str}: {want} vs {got}")
+        print("Day sheets were left in place.")
+        return False
+    print(f"✅ Row counts match for all {len(per_day)} dates ({total} rows)")
+
+    if delete_days:
+        delete_sheets(sheet, day_sheets)
+        print(f"🗑️ Deleted {len(day_sheets)} day sheets")
+    print("➡️ Restart the bot with SHEET_LAYOUT=monthly")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move per-day sheets into monthly log sheets")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be copied")
+    parser.add_argument("--delete-days", action="store_true",
+                        help="delete the day sheets once every row count matches")
+    args = parser.parse_args()
+
+    sheet = authorize(SCOPE).open_by_key(SHEET_ID)
+    ok = migrate(sheet, dry_run=args.dry_run, delete_days=args.delete_days)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""One evening aggregation pass shared by every reminder loop.
+
+Each reminder rule names a window in `WINDOWS`. The aggregator refreshes
+the index from Sheets once per evening over the union of those windows, so
+every needed day is fetched once. From the index it then builds a single
+per-user snapshot with a count for every window. A window listed in `DUE`
+only widens the refresh on the nights its reminder runs; on other nights
+its count comes from the index alone. The snapshot is rebuilt
+from the index, with no Sheets traffic, when it is older than
+AGGREGATE_MAX_AGE_SECONDS. That way the 22:00 reminder still sees the
+submissions made since 21:00. A new rule adds a window, not a Sheets read.
+"""
+import asyncio
+import csv
+import datetime
+import io
+import os
+import time
+from dataclasses import dataclass
+
+# ================== CONFIG ==================
+
+AGGREGATE_MAX_AGE_SECONDS = float(os.getenv("AGGREGATE_MAX_AGE_SECONDS", 300))
+NIGHTLY_SNAPSHOT = "nightly_aggregates"
+
+
+def _days(n):
+    return datetime.timedelta(days=n)
+
+
+def last_month(today):
+    end = today.replace(day=1) - _days(1)
+    return end.replace(day=1), end
+
+
+# {window name: today -> (start, end)}, both inclusive
+WINDOWS = {
+    "today": lambda today: (today, today),
+    "last_4_days": lambda today: (today - _days(4), today - _days(1)),
+    "week": lambda today: (today - _days(6), today),
+    "last_month": last_month,
+}
+
+# {window name: today -> whether its reminder runs tonight}; unlisted windows are refreshed every night
+DUE = {
+    "last_month": lambda today: today.day == 1,   # monthly_target_check, else ~5 weeks of reads nightly
+}
+
+
+# ================== SNAPSHOT ==================
+
+@dataclass
+class Aggregates:
+    date: datetime.date
+    built_at: float
+    refreshed: bool    # whether tonight's Sheets refresh succeeded before this was built
+    windows: dict      # {name: (start, end)}
+    counts: dict       # {name: {username: submissions}}
+
+    @property
+    def age(self):
+        return time.time() - self.built_at
+
+    def to_dict(self):
+        return {
+            "date": self.date.isoformat(),
+            "built_at": self.built_at,
+            "refreshed": self.refreshed,
+            "windows": {name: [s.isoformat(), e.isoformat()] for name, (s, e) in self.windows.items()},
+            "counts": self.counts,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            date=datetime.date.fromisoformat(data["date"]),
+            built_at=data["built_at"],
+            refreshed=data["refreshed"],
+            windows={
+                name: (datetime.date.fromisoformat(s), datetime.date.fromisoformat(e))
+                for name, (s, e) in data["windows"].items()
+            },
+            counts=data["counts"],
+        )
+
+    def to_csv(self, names):
+        """One row per user ({username: real name}) with a column per window."""
+        out = io.StringIO()
+        writer = csv.writer(out)
+        windows = list(self.windows)
+        writer.writerow(["Real Name", "Username", *(f"{w} ({s} → {e})" for w, (s, e) in self.windows.items())])
+        for uname, real_name in names.items():
+            writer.writerow([real_name, uname, *(self.counts[w].get(uname, 0) for w in windows)])
+        return out.getvalue()
+
+
+# ================== AGGREGATOR ==================
+
+class NightlyAggregator:
+    """`refresh(start, end)` re-reads a date range from Sheets; `count(start, end)` gives {user: n} from the index."""
+
+    def __init__(self, refresh, count, store=None, windows=WINDOWS, due=DUE, max_age=AGGREGATE_MAX_AGE_SECONDS):
+        self._refresh = refresh
+        self._count = count
+        self.store = store
+        self.windows = windows
+        self.due = due
+        self.max_age = max_age
+        self._refreshed_on = None
+        self._current = None
+        self._lock = asyncio.Lock()
+
+    def span(self, today):
+        """(start, end) covering every window due tonight: the only range the evening refresh reads."""
+        ranges = [window(today) for name, window in self.windows.items()
+                  if name not in self.due or self.due[name](today)]
+        return min(s for s, _ in ranges), max(e for _, e in ranges)
+
+    async def get(self, today, rebuild=False):
+        """Tonight's snapshot: Sheets refreshed at most once per day, counts at most `max_age` old."""
+        async with self._lock:
+            if self._refreshed_on != today:
+                try:
+                    await self._refresh(*self.span(today))
+                    self._refreshed_on = today
+                except Exception as e:
+                    print(f"⚠️ Nightly refresh failed, aggregating the index as it is: {e}")
+            current = self._current
+            if rebuild or current is None or current.date != today or current.age > self.max_age \
+                    or current.refreshed != (self._refreshed_on == today):
+                current = self._current = self._build(today)
+            return current
+
+    def last(self):
+        """The most recent snapshot, also from before a restart; None when there never was one."""
+        if self._current is None and self.store is not None:
+            data, _ = self.store.load_snapshot(NIGHTLY_SNAPSHOT)
+            if data is not None:
+                self._current = Aggregates.from_dict(data)
+        return self._current
+
+    def _build(self, today):
+        windows = {name: window(today) for name, window in self.windows.items()}
+        aggregates = Aggregates(
+            date=today,
+            built_at=time.time(),
+            refreshed=self._refreshed_on == today,
+            windows=windows,
+            counts={name: self._count(start, end) for name, (start, end) in windows.items()},
+        )
+        if self.store is not None:
+            self.store.save_snapshot(NIGHTLY_SNAPSHOT, aggregates.to_dict())
+        return aggregates
@@ -0,0 +1,205 @@
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import aiohttp
+import discord
+
+from metrics import FANOUT_MESSAGES, FANOUT_SECONDS
+
+# ================== CONFIG ==================
+
+# Discord allows roughly 5 DM channel sends per second per bot before it
+# starts answering 429, so keep the number in flight close to that.
+DM_CONCURRENCY = int(os.getenv("DM_CONCURRENCY", 5))
+DM_MAX_ATTEMPTS = int(os.getenv("DM_MAX_ATTEMPTS", 4))
+# discord.User objects kept for DMs. Without the members intent nothing else
+# caches them, so this bounds what resolving registered users can hold.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 256))
+
+
+# ================== USER DIRECTORY ==================
+
+class UserDirectory:
+    """username -> Discord user ID, so reminders never scan `bot.users`.
+
+    IDs are persisted in the local store and refreshed from member events
+    and commands. Users are resolved by ID on demand and kept in a bounded
+    LRU, so memory stays flat however large the guilds are.
+    """
+
+    def __init__(self, store, cache_size=USER_CACHE_SIZE):
+        self.store = store
+        self._ids = store.user_ids()
+        self._users = OrderedDict()   # {user_id: discord.User}, least recently used first
+        self.cache_size = cache_size
+        self.fetches = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def cached_count(self):
+        """discord.User objects held in the LRU right now."""
+        return len(self._users)
+
+    def reload(self):
+        """Pick up IDs other processes stored."""
+        self._ids = self.store.user_ids()
+
+    def get_id(self, username):
+        return self._ids.get(username)
+
+    def remember(self, user):
+        if self._ids.get(user.name) != user.id:
+            self._ids[user.name] = user.id
+            self.store.set_user_id(user.name, user.id)
+
+    def rename(self, before, after):
+        if before.name != after.name and self._ids.get(before.name) == before.id:
+            del self._ids[before.name]
+        self.remember(after)
+
+    def missing(self, usernames):
+        """The usernames with no known ID."""
+        return [u for u in usernames if u not in self._ids]
+
+    async def backfill(self, guilds, usernames):
+        """Look up missing IDs by name in each guild (gateway member queries). Returns those still missing."""
+        wanted = set(self.missing(usernames))
+        for guild in guilds:
+            for username in sorted(wanted):
+                try:
+                    members = await guild.query_members(query=username, limit=5, cache=False)
+                except (asyncio.TimeoutError, discord.ClientException) as e:
+                    print(f"⚠️ Member lookup for {username} in {guild} failed: {e!r}")
+                    continue
+                for member in members:
+                    if member.name == username:
+                        self.remember(member)
+                        wanted.discard(username)
+                        break
+        return sorted(wanted)
+
+    def seed(self, users, usernames):
+        """Fill in IDs for `usernames` from an iterable of cached users (one pass)."""
+        wanted = set(usernames) - self._ids.keys()
+        for user in users:
+            if user.name in wanted:
+                self.remember(user)
+
+    async def resolve(self, bot, username):
+        user_id = self._ids.get(username)
+        if user_id is None:
+            return None
+        return await self.resolve_id(bot, user_id)
+
+    async def resolve_id(self, bot, user_id):
+        """discord.User for an ID: from the LRU, the client cache, or one fetch_user call.
+
+        None when Discord has no such user; other fetch_user errors propagate.
+        """
+        user = self._users.get(user_id)
+        if user is not None:
+            self._users.move_to_end(user_id)
+            return user
+        user = bot.get_user(user_id)
+        if user is None:
+            try:
+                user = await bot.fetch_user(user_id)
+            except discord.NotFound:
+                return None
+            self.fetches += 1
+        self._users[user_id] = user
+        if len(self._users) > self.cache_size:
+            self._users.popitem(last=False)
+        return user
+
+
+# ================== DM FAN-OUT ==================
+
+NO_USER_ID = "no user ID"
+
+@dataclass
+class FanoutResult:
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0
+    retried: int = 0
+    elapsed: float = 0.0
+    failures: dict = field(default_factory=dict)   # {username: reason}
+
+    def __str__(self):
+        text = (
+            f"sent {self.sent}, failed {self.failed}, skipped {self.skipped}, "
+            f"retries {self.retried} in {self.elapsed:.1f}s"
+        )
+        unknown = sorted(u for u, reason in self.failures.items() if reason == NO_USER_ID)
+        if unknown:
+            text += f"; no user ID for {', '.join(unknown)}"
+        return text
+
+
+async def fan_out(bot, directory, messages, concurrency=DM_CONCURRENCY, reminder="dm"):
+    """DM {username: text} concurrently under a rate-limit friendly semaphore.
+
+    Users without a known ID are skipped and listed in `failures`. Closed
+    DMs and failed user lookups count as failed for that user only, and
+    429s / 5xx on send are retried with the server's retry-after (or
+    backoff). Lookups and sends both run under the semaphore.
+    `reminder` labels the run in the fan-out metrics.
+    """
+    result = FanoutResult()
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    async def deliver(username, text):
+        try:
+            async with semaphore:
+                user = await directory.resolve(bot, username)
+        except discord.HTTPException as e:
+            result.failed += 1
+            result.failures[username] = f"lookup failed: HTTP {e.status}"
+            return
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            result.failed += 1
+            result.failures[username] = f"lookup failed: {e!r}"
+            return
+        if user is None:
+            result.skipped += 1
+            result.failures[username] = NO_USER_ID
+            return
+        for attempt in range(1, DM_MAX_ATTEMPTS + 1):
+            try:
+                async with semaphore:
+                    await user.send(text)
+                result.sent += 1
+                return
+            except discord.Forbidden:
+                result.failed += 1
+                result.failures[username] = "DMs closed"
+                return
+            except discord.RateLimited as e:
+                delay = e.retry_after
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    result.failed += 1
+                    result.failures[username] = f"HTTP {e.status}"
+                    return
+                retry_after = e.response.headers.get("Retry-After") if e.response else None
+                delay = float(retry_after) if retry_after else 2 ** attempt
+            if attempt == DM_MAX_ATTEMPTS:
+                break
+            result.retried += 1
+            await asyncio.sleep(delay + random.uniform(0, 0.5))
+        result.failed += 1
+        result.failures[username] = "rate limited"
+
+    await asyncio.gather(*(deliver(u, text) for u, text in messages.items()))
+    result.elapsed = time.perf_counter() - started
+    FANOUT_SECONDS.observe(result.elapsed, reminder)
+    for outcome in ("sent", "failed", "skipped", "retried"):
+        FANOUT_MESSAGES.inc(reminder, outcome, amount=getattr(result, outcome))
+    return result
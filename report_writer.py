@@ -0,0 +1,77 @@
+PERCENT_FORMAT = {"type": "PERCENT", "pattern": "0.0%"}
+
+
+def _cell(value):
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def build_requests(sheet_id, header, rows, percent_cols=()):
+    """spreadsheets.batchUpdate requests that fill and format a freshly added sheet."""
+    width = len(header)
+    height = len(rows) + 1
+    requests = [
+        {
+            "updateCells": {
+                "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+                "rows": [{"values": [_cell(v) for v in row]} for row in [header, *rows]],
+                "fields": "userEnteredValue",
+            }
+        },
+        {
+            "repeatCell": {
+                "range": {"sheetId": sheet_id, "startRowIndex": 0, "endRowIndex": 1},
+                "cell": {"userEnteredFormat": {"textFormat": {"bold": True}}},
+                "fields": "userEnteredFormat.textFormat.bold",
+            }
+        },
+        {
+            "updateSheetProperties": {
+                "properties": {"sheetId": sheet_id, "gridProperties": {"frozenRowCount": 1}},
+                "fields": "gridProperties.frozenRowCount",
+            }
+        },
+        {
+            "autoResizeDimensions": {
+                "dimensions": {
+                    "sheetId": sheet_id,
+                    "dimension": "COLUMNS",
+                    "startIndex": 0,
+                    "endIndex": width,
+                }
+            }
+        },
+    ]
+    for col in percent_cols:
+        requests.append({
+            "repeatCell": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "startRowIndex": 1,
+                    "endRowIndex": height,
+                    "startColumnIndex": col,
+                    "endColumnIndex": col + 1,
+                },
+                "cell": {"userEnteredFormat": {"numberFormat": PERCENT_FORMAT}},
+                "fields": "userEnteredFormat.numberFormat",
+            }
+        })
+    return requests
+
+
+def write_report(spreadsheet, title, header, rows, percent_cols=()):
+    """Create `title` sized to the table and fill + format it in one batchUpdate.
+
+    Two API calls whatever the number of rows. If the write fails, the new
+    sheet is deleted again so no half-written report is left behind.
+    """
+    ws = spreadsheet.add_worksheet(title, rows=len(rows) + 1, cols=len(header))
+    try:
+        spreadsheet.batch_update({"requests": build_requests(ws.id, header, rows, percent_cols)})
+    except Exception:
+        spreadsheet.del_worksheet(ws)
+        raise
+    return ws
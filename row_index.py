@@ -0,0 +1,177 @@
+"""Where rows sit in the worksheets the bot writes to, so deletes can target a row directly.
+
+`RowIndex` mirrors the worksheets the flusher deletes from: for each title a
+list whose position `i` holds the cells of sheet row `i + 1`. A sheet is
+read once, in a batched read, the first time a delete needs it. After that
+the mirror is kept in step with the sheet: appends are placed where the
+append response says they landed, and deletes shift the rows below up.
+Rows other writers appended after ours are padded with None until they are
+read.
+
+Submission rows carry a stable ID in column E (`ID_COLUMN`). A row with an
+ID is only ever matched by its ID (and its date and username, in case an
+older local ID was reused), so two identical rows can't be confused.
+Rows without one (form imports, older rows, Paused_Dates) are matched on
+the cells the outbox recorded.
+
+Each mirrored sheet keeps its rows in slots that never move; a delete only
+marks its slot empty, and a Fenwick tree over the live slots turns a slot
+into its current row number (and back) in O(log rows). The slots are also
+filed by username and by ID, so a lookup only looks at that user's few rows
+however long the sheet gets, and a delete doesn't renumber anything.
+"""
+import re
+
+from sheet_layout import DAY_HEADER, ID_COLUMN
+
+USERNAME_COLUMN = DAY_HEADER.index("Username")
+
+_UPDATED_ROW = re.compile(r"![A-Z]+(\d+)")
+
+
+def appended_at(response):
+    """First sheet row an append landed on, from the values.append response, or None."""
+    try:
+        updated = response["updates"]["updatedRange"]
+    except (KeyError, TypeError):
+        return None
+    m = _UPDATED_ROW.search(updated)
+    return int(m.group(1)) if m else None
+
+
+def row_matches(cells, row):
+    """Whether sheet `cells` hold the outbox `row` (by date, username and ID when the row has one)."""
+    if cells is None:
+        return False
+    if len(row) > ID_COLUMN and row[ID_COLUMN]:
+        stored = cells[ID_COLUMN] if len(cells) > ID_COLUMN else ""
+        if stored:
+            return stored == row[ID_COLUMN] and cells[:USERNAME_COLUMN + 1] == row[:USERNAME_COLUMN + 1]
+        row = row[:ID_COLUMN]   # written before IDs existed, or by another writer
+    return cells[:len(row)] == row
+
+
+# ================== INDEX ==================
+
+def row_keys(cells):
+    """Where a row is filed in RowIndex: under its username (the date in one-column sheets), and its ID if any."""
+    keys = [("user", cells[USERNAME_COLUMN] if len(cells) > USERNAME_COLUMN else (cells[0] if cells else ""))]
+    if len(cells) > ID_COLUMN and cells[ID_COLUMN]:
+        keys.append(("id", cells[ID_COLUMN]))
+    return keys
+
+
+class SheetRows:
+    """One mirrored sheet: cells by slot, and which slots still hold a row."""
+
+    def __init__(self):
+        self.cells = []   # slot -> cells or None (not read yet); slot i was sheet row i + 1 when added
+        self.count = 0    # live rows, i.e. the sheet's current height
+        self._tree = [0]  # Fenwick tree over the live flags, 1-based
+
+    def append(self, cells):
+        """Add a row below the last one; returns its slot."""
+        self.cells.append(cells)
+        i = len(self.cells)
+        # _tree[i] sums the flags in (i - lowbit(i), i]: this row plus the nodes below it in that span
+        total, j, stop = 1, i - 1, i - (i & -i)
+        while j > stop:
+            total += self._tree[j]
+            j -= j & -j
+        self._tree.append(total)
+        self.count += 1
+        return i - 1
+
+    def remove(self, slot):
+        self.cells[slot] = None
+        i = slot + 1
+        while i < len(self._tree):
+            self._tree[i] -= 1
+            i += i & -i
+        self.count -= 1
+
+    def number(self, slot):
+        """Current sheet row number of a live slot."""
+        i, n = slot + 1, 0
+        while i:
+            n += self._tree[i]
+            i -= i & -i
+        return n
+
+    def slot(self, number):
+        """Slot holding sheet row `number` (1 <= number <= count)."""
+        pos, step = 0, 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            if pos + step < len(self._tree) and self._tree[pos + step] < number:
+                pos += step
+                number -= self._tree[pos]
+            step >>= 1
+        return pos
+
+
+class RowIndex:
+    def __init__(self):
+        self._sheets = {}   # {title: SheetRows}
+        self._keys = {}     # {title: {row_key: ascending [slots]}}
+
+    def __contains__(self, title):
+        return title in self._sheets
+
+    def load(self, title, rows):
+        """Start mirroring a sheet from all of its rows (header included)."""
+        mirror = self._sheets[title] = SheetRows()
+        keys = self._keys[title] = {}
+        for number, cells in enumerate(rows, start=1):
+            slot = mirror.append(list(cells))
+            if number > 1:
+                for key in row_keys(cells):
+                    keys.setdefault(key, []).append(slot)
+
+    def forget(self, title):
+        self._sheets.pop(title, None)
+        self._keys.pop(title, None)
+
+    def appended(self, title, first_row, rows):
+        """Record rows an append wrote at `first_row` onward; unknown position drops the mirror."""
+        mirror = self._sheets.get(title)
+        if mirror is None:
+            return
+        if first_row is None or first_row <= mirror.count:
+            self.forget(title)   # can't place them for sure; re-read on the next delete
+            return
+        while mirror.count < first_row - 1:
+            mirror.append(None)
+        keys = self._keys[title]
+        for cells in rows:
+            slot = mirror.append(list(cells))
+            for key in row_keys(cells):
+                keys.setdefault(key, []).append(slot)
+
+    def find(self, title, row, exclude=()):
+        """Sheet row number of the last row matching `row`, skipping row numbers in `exclude`.
+
+        Only the rows filed under the same username or ID are checked.
+        """
+        keys = self._keys[title]
+        candidates = sorted({slot for key in row_keys(row) for slot in keys.get(key, ())})
+        mirror = self._sheets[title]
+        for slot in reversed(candidates):
+            if row_matches(mirror.cells[slot], row):
+                number = mirror.number(slot)
+                if number not in exclude:
+                    return number
+        return None
+
+    def deleted(self, title, row_number):
+        """A row was removed from the sheet: everything below moves up one."""
+        mirror = self._sheets.get(title)
+        if mirror is None or row_number > mirror.count:
+            return
+        slot = mirror.slot(row_number)
+        cells = mirror.cells[slot]
+        mirror.remove(slot)
+        keys = self._keys[title]
+        for key in row_keys(cells) if cells is not None and slot else ():   # slot 0 is the header
+            keys[key].remove(slot)
+            if not keys[key]:
+                del keys[key]
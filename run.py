@@ -0,0 +1,10 @@
+"""Process entry point: `python run.py` starts the roles in CPBOT_ROLES.
+
+main.py builds the store, image archive and bot at import. The image
+recompression workers import the entry script as `__mp_main__`, so the
+entry script imports main only under the `__main__` guard.
+"""
+if __name__ == "__main__":
+    import main
+
+    main.run()
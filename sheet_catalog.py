@@ -0,0 +1,92 @@
+import bisect
+import datetime
+import os
+import time
+
+# ================== CONFIG ==================
+
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", 600))
+
+LOG_TITLE_PREFIX = "Log-"
+
+
+def parse_day_title(title):
+    """Date of a per-day worksheet title ("YYYY-MM-DD"), or None for any other sheet."""
+    try:
+        return datetime.datetime.strptime(title, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def month_log_title(d):
+    """Title of the monthly submission log holding date `d` ("Log-YYYY-MM")."""
+    if isinstance(d, str):
+        d = datetime.datetime.strptime(d, "%Y-%m-%d").date()
+    return f"{LOG_TITLE_PREFIX}{d:%Y-%m}"
+
+
+def parse_log_title(title):
+    """First day of the month of a monthly log title, or None for any other sheet."""
+    if not title.startswith(LOG_TITLE_PREFIX):
+        return None
+    try:
+        return datetime.datetime.strptime(title[len(LOG_TITLE_PREFIX):], "%Y-%m").date()
+    except ValueError:
+        return None
+
+
+# ================== CATALOG ==================
+
+class WorksheetCatalog:
+    """In-process map of worksheet title -> handle, plus date-sorted indexes of day and log sheets.
+
+    Rebuilt from a single `worksheets()` listing once the TTL expires and
+    updated incrementally as sheets are created, so lookups cost no API call.
+    """
+
+    def __init__(self, ttl=CATALOG_TTL_SECONDS):
+        self.ttl = ttl
+        self._by_title = {}
+        self._days = []          # sorted [(date, title)]
+        self._logs = []          # sorted [(first of month, title)]
+        self._loaded_at = None
+
+    def is_stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def rebuild(self, worksheets):
+        self._by_title = {ws.title: ws for ws in worksheets}
+        self._days = sorted(
+            (d, title) for title in self._by_title
+            if (d := parse_day_title(title)) is not None
+        )
+        self._logs = sorted(
+            (m, title) for title in self._by_title
+            if (m := parse_log_title(title)) is not None
+        )
+        self._loaded_at = time.monotonic()
+
+    def add(self, ws):
+        if ws.title not in self._by_title:
+            d = parse_day_title(ws.title)
+            if d is not None:
+                bisect.insort(self._days, (d, ws.title))
+            m = parse_log_title(ws.title)
+            if m is not None:
+                bisect.insort(self._logs, (m, ws.title))
+        self._by_title[ws.title] = ws
+
+    def get(self, title):
+        return self._by_title.get(title)
+
+    def day_titles(self, start, end):
+        """Titles of the existing day sheets between two dates (inclusive), oldest first."""
+        lo = bisect.bisect_left(self._days, (start, ""))
+        hi = bisect.bisect_right(self._days, (end, "\uffff"))
+        return [title for _, title in self._days[lo:hi]]
+
+    def log_titles(self, start, end):
+        """Titles of the existing monthly logs overlapping two dates (inclusive), oldest first."""
+        lo = bisect.bisect_left(self._logs, (start.replace(day=1), ""))
+        hi = bisect.bisect_right(self._logs, (end, "\uffff"))
+        return [title for _, title in self._logs[lo:hi]]
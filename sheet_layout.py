@@ -0,0 +1,93 @@
+"""Where submission rows live in the spreadsheet.
+
+Two layouts share the row shape [Date, Username, Screenshot, Problem, ID]:
+
+- `daily`   (default): one worksheet per day, titled "YYYY-MM-DD".
+- `monthly`: one log worksheet per month, titled "Log-YYYY-MM", holding
+  every row of that month. Far fewer tabs (less spreadsheet metadata and no
+  pre-allocated 300x4 grid per day), and a month of data is one range read.
+
+Pick one with SHEET_LAYOUT; `migrate_layout.py` moves existing day sheets
+into monthly logs. Readers go through `read_rows` / `read_usernames` so they
+work with either.
+
+ID is a random per-submission row ID (a uuid4, or the local id for rows
+written before that), unique across stores. Rows from the form or typed
+into the sheet leave it empty.
+"""
+import os
+
+import bulk_reader
+from sheet_catalog import month_log_title
+
+# ================== CONFIG ==================
+
+SHEET_LAYOUT = os.getenv("SHEET_LAYOUT", "daily")
+
+DAY_HEADER = ["Date", "Username", "Screenshot", "Problem", "ID"]
+ID_COLUMN = DAY_HEADER.index("ID")
+
+
+def _bounds(start, end):
+    """ISO strings for a date range; ISO dates compare correctly as strings."""
+    return start.isoformat(), end.isoformat()
+
+
+# ================== LAYOUTS ==================
+
+class DailyLayout:
+    name = "daily"
+    rows = 300   # initial grid of a new sheet; append_rows grows it as needed
+
+    def title_for(self, date_str):
+        return date_str
+
+    def titles(self, catalog, start, end):
+        return catalog.day_titles(start, end)
+
+    def read_rows(self, spreadsheet, titles, start, end):
+        """{date_str: [[date, username, screenshot, problem, id], ...]} for the given sheets."""
+        return bulk_reader.read_rows(spreadsheet, titles, "A", "E")
+
+    def read_usernames(self, spreadsheet, titles, start, end):
+        """{date_str: [usernames]}; a day sheet only needs its Username column."""
+        return bulk_reader.read_columns(spreadsheet, titles, "B")
+
+
+class MonthlyLayout:
+    name = "monthly"
+    rows = 2000
+
+    def title_for(self, date_str):
+        return month_log_title(date_str)
+
+    def titles(self, catalog, start, end):
+        return catalog.log_titles(start, end)
+
+    def read_rows(self, spreadsheet, titles, start, end):
+        lo, hi = _bounds(start, end)
+        by_day = {}
+        for rows in bulk_reader.read_rows(spreadsheet, titles, "A", "E").values():
+            for row in rows:
+                if lo <= row[0] <= hi:
+                    by_day.setdefault(row[0], []).append(row)
+        return by_day
+
+    def read_usernames(self, spreadsheet, titles, start, end):
+        lo, hi = _bounds(start, end)
+        by_day = {}
+        for rows in bulk_reader.read_rows(spreadsheet, titles, "A", "B").values():
+            for date_str, username in rows:
+                if username and lo <= date_str <= hi:
+                    by_day.setdefault(date_str, []).append(username)
+        return by_day
+
+
+LAYOUTS = {layout.name: layout for layout in (DailyLayout(), MonthlyLayout())}
+
+
+def get_layout(name=SHEET_LAYOUT):
+    try:
+        return LAYOUTS[name]
+    except KeyError:
+        raise ValueError(f"unknown SHEET_LAYOUT {name!r} (use one of {', '.join(LAYOUTS)})") from None
@@ -0,0 +1,153 @@
+import os
+
+from bulk_reader import a1_range
+from row_index import RowIndex, appended_at, row_matches
+from sheet_layout import DAY_HEADER
+
+# ================== CONFIG ==================
+
+SHEETS_FLUSH_SECONDS = float(os.getenv("SHEETS_FLUSH_SECONDS", 5))
+SHEETS_FLUSH_BATCH = int(os.getenv("SHEETS_FLUSH_BATCH", 500))
+
+MIRROR_WIDTH = len(DAY_HEADER)   # widest row the bot writes
+MIRROR_LAST_COLUMN = chr(ord("A") + MIRROR_WIDTH - 1)
+
+
+# ================== FLUSHER ==================
+
+class SheetsFlusher:
+    """Mirrors the LocalStore outbox into Google Sheets in batches.
+
+    `open_ws(title)` is a coroutine returning the worksheet for a title,
+    creating it (with its header row) when missing.
+    """
+
+    def __init__(self, store, gateway, open_ws, batch_size=SHEETS_FLUSH_BATCH):
+        self.store = store
+        self.gateway = gateway
+        self.open_ws = open_ws
+        self.batch_size = batch_size
+        self.rows = RowIndex()
+
+    async def flush(self):
+        """Push pending changes in order. Returns how many were synced.
+
+        Runs of appends are grouped per worksheet into one `append_rows`
+        call, and runs of deletes go out as a single batchUpdate. A run is
+        pushed before the next run of the other kind starts, so the sheet
+        always sees changes in the order they happened. On failure the
+        unsynced tail stays in the outbox for the next run.
+        """
+        ops = self.store.pending_ops(self.batch_size)
+        synced = 0
+        appends = {}   # {sheet: [rows]}
+        append_seqs = []
+        deletes = []   # [(seq, sheet, row)]
+
+        async def push_appends():
+            nonlocal synced
+            for title, rows in appends.items():
+                ws = await self.open_ws(title)
+                response = await self.gateway.append_rows(ws, rows)
+                self.rows.appended(ws.title, appended_at(response), rows)
+            self.store.ack_ops(append_seqs)
+            synced += len(append_seqs)
+            appends.clear()
+            append_seqs.clear()
+
+        async def push_deletes():
+            nonlocal synced
+            if not deletes:
+                return
+            await self._delete_rows([(title, row) for _, title, row in deletes])
+            self.store.ack_ops([seq for seq, _, _ in deletes])
+            synced += len(deletes)
+            deletes.clear()
+
+        for seq, op, title, row in ops:
+            if op == "append":
+                await push_deletes()
+                appends.setdefault(title, []).append(row)
+                append_seqs.append(seq)
+            elif op == "delete":
+                await push_appends()
+                deletes.append((seq, title, row))
+            else:
+                await push_appends()
+                await push_deletes()
+                self.store.ack_ops([seq])
+                synced += 1
+
+        await push_appends()
+        await push_deletes()
+        return synced
+
+    async def _delete_rows(self, targets):
+        """Delete the last sheet row matching each (sheet, row). Returns how many were found.
+
+        Rows are located in the RowIndex. Sheets not mirrored yet are read
+        once, together. Positions taken from an older mirror are re-read in
+        one batched call first, and if another writer moved rows the sheet
+        is mirrored again. Every delete then goes out in one batchUpdate,
+        bottom row first, so no delete shifts another's target. The cost is
+        the same whether the day has ten rows or ten thousand.
+        """
+        opened = {}   # outbox sheet -> worksheet; with monthly logs many dates share one
+        for title, _ in targets:
+            if title not in opened:
+                opened[title] = await self.open_ws(title)
+        worksheets = {ws.title: ws for ws in opened.values()}
+        targets = [(opened[title].title, row) for title, row in targets]
+        fresh = [title for title in worksheets if title not in self.rows]
+        await self._mirror(fresh)
+
+        found = self._locate(targets)
+        stale = await self._moved(found, skip=fresh)
+        if stale:
+            await self._mirror(stale)
+            found = self._locate(targets)
+
+        requests = []
+        for title, located in found.items():
+            for number in sorted(located, reverse=True):
+                requests.append({"deleteDimension": {"range": {
+                    "sheetId": worksheets[title].id, "dimension": "ROWS",
+                    "startIndex": number - 1, "endIndex": number,
+                }}})
+        if requests:
+            await self.gateway.batch_update({"requests": requests})
+        for title, located in found.items():
+            for number in sorted(located, reverse=True):
+                self.rows.deleted(title, number)
+        return len(requests)
+
+    async def _mirror(self, titles):
+        if titles:
+            values = await self.gateway.read_rows(titles, "A", MIRROR_LAST_COLUMN, first_row=1)
+            for title in titles:
+                self.rows.load(title, values[title])
+
+    def _locate(self, targets):
+        """{sheet: {row number: outbox row}}; repeated identical rows claim different sheet rows."""
+        found = {}
+        for title, row in targets:
+            located = found.setdefault(title, {})
+            number = self.rows.find(title, row, exclude=located)
+            if number is not None:
+                located[number] = row
+        return found
+
+    async def _moved(self, found, skip=()):
+        """Sheets where a located row no longer holds what the mirror says, checked in one read."""
+        checks = {
+            a1_range(title, "A", number, MIRROR_LAST_COLUMN) + str(number): (title, row)
+            for title, located in found.items() if title not in skip
+            for number, row in located.items()
+        }
+        if not checks:
+            return []
+        values = await self.gateway.read_ranges(checks, MIRROR_WIDTH)
+        return sorted({
+            title for a1, (title, row) in checks.items()
+            if not row_matches((values.get(a1) or [None])[0], row)
+        })
@@ -0,0 +1,199 @@
+"""Shared gspread HTTP layer: quota-aware rate limiting, retries and read coalescing.
+
+Every Sheets request made through `authorize()` passes through
+`QuotaHTTPClient`, whether it comes from the bot's thread pool or from a
+maintenance script, so one process never runs past the per-minute quota and
+a transient 429/5xx is retried instead of surfacing as wrong counts.
+"""
+import os
+import random
+import threading
+import time
+
+import gspread
+import requests
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+from oauth2client.service_account import ServiceAccountCredentials
+
+import metrics
+
+# ================== CONFIG ==================
+
+SERVICE_ACCOUNT_FILE = os.getenv("SERVICE_ACCOUNT_FILE", "service_account.json")
+
+# Sheets allows 60 read and 60 write requests per minute per user.
+SHEETS_READS_PER_MINUTE = int(os.getenv("SHEETS_READS_PER_MINUTE", 60))
+SHEETS_WRITES_PER_MINUTE = int(os.getenv("SHEETS_WRITES_PER_MINUTE", 60))
+SHEETS_BURST = int(os.getenv("SHEETS_BURST", 10))
+SHEETS_MAX_ATTEMPTS = int(os.getenv("SHEETS_MAX_ATTEMPTS", 6))
+SHEETS_BACKOFF_BASE = float(os.getenv("SHEETS_BACKOFF_BASE", 1.0))
+SHEETS_BACKOFF_CAP = float(os.getenv("SHEETS_BACKOFF_CAP", 32.0))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class SheetsUnavailable(Exception):
+    """Sheets kept failing with a retryable error (quota, 5xx, network) after every retry.
+
+    Distinct from gspread's WorksheetNotFound / 4xx APIError so callers can
+    tell "the sheet isn't there" from "Google isn't answering right now".
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+# ================== RATE LIMIT ==================
+
+class TokenBucket:
+    """Thread-safe token bucket; `acquire()` blocks until a request may go out.
+
+    The refill rate leaves room for the burst, so no rolling minute can see
+    more than `per_minute` requests.
+    """
+
+    def __init__(self, per_minute, burst=SHEETS_BURST):
+        self.capacity = max(1, min(burst, per_minute))
+        self.rate = max(per_minute - self.capacity, 1) / 60.0
+        self._tokens = float(self.capacity)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token. Returns the seconds spent waiting for it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1   # reserve even when short, so waiters queue up in order
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+READ_BUCKET = TokenBucket(SHEETS_READS_PER_MINUTE)
+WRITE_BUCKET = TokenBucket(SHEETS_WRITES_PER_MINUTE)
+
+
+def backoff_delay(attempt, base=SHEETS_BACKOFF_BASE, cap=SHEETS_BACKOFF_CAP):
+    """Exponential backoff with full jitter for the given (1-based) attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _freeze(params):
+    if not params:
+        return ()
+    return tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in params.items()))
+
+
+# ================== HTTP CLIENT ==================
+
+class _Flight:
+    __slots__ = ("done", "response", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class QuotaHTTPClient(HTTPClient):
+    """gspread HTTP client that rate limits, retries and coalesces identical GETs.
+
+    Concurrent GETs for the same endpoint and parameters share one request
+    and its response (or error). `stats` counts requests, retries, coalesced
+    reads and seconds spent throttled across all clients in the process.
+    """
+
+    stats = {"requests": 0, "retries": 0, "coalesced": 0, "throttled_seconds": 0.0, "errors": 0}
+    _stats_lock = threading.Lock()
+
+    def __init__(self, auth, session=None):
+        super().__init__(auth, session)
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    @classmethod
+    def _count(cls, key, amount=1):
+        with cls._stats_lock:
+            cls.stats[key] += amount
+
+    def request(self, method, endpoint, params=None, data=None, json=None, files=None, headers=None):
+        kwargs = dict(params=params, data=data, json=json, files=files, headers=headers)
+        if method.upper() != "GET" or data or json or files:
+            return self._send(WRITE_BUCKET, method, endpoint, kwargs)
+
+        key = (endpoint, _freeze(params))
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            self._count("coalesced")
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            flight.response = self._send(READ_BUCKET, method, endpoint, kwargs)
+            return flight.response
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _send(self, bucket, method, endpoint, kwargs):
+        for attempt in range(1, SHEETS_MAX_ATTEMPTS + 1):
+            waited = bucket.acquire()
+            if waited:
+                self._count("throttled_seconds", waited)
+            self._count("requests")
+            try:
+                return super().request(method, endpoint, **kwargs)
+            except APIError as e:
+                if e.code not in RETRYABLE_STATUS:
+                    self._count("errors")
+                    raise
+                status, delay = e.code, _retry_after(e.response)
+                error = e
+            except (requests.ConnectionError, requests.Timeout) as e:
+                status, delay, error = None, None, e
+            if attempt == SHEETS_MAX_ATTEMPTS:
+                break
+            self._count("retries")
+            time.sleep(delay if delay is not None else backoff_delay(attempt))
+        self._count("errors")
+        raise SheetsUnavailable(
+            f"{method} {endpoint} failed after {SHEETS_MAX_ATTEMPTS} attempts: {error}", status
+        ) from error
+
+
+metrics.Callback(
+    "cpbot_sheets_http_total", "Sheets HTTP layer totals (requests, retries, coalesced, throttled_seconds, errors).",
+    lambda: {(k,): v for k, v in QuotaHTTPClient.stats.items()},
+    kind="counter", labelnames=["stat"],
+)
+
+
+# ================== AUTH ==================
+
+def authorize(scope, keyfile=SERVICE_ACCOUNT_FILE):
+    """gspread client whose every request goes through `QuotaHTTPClient`."""
+    creds = ServiceAccountCredentials.from_json_keyfile_name(keyfile, scope)
+    return gspread.authorize(creds, http_client=QuotaHTTPClient)
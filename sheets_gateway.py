@@ -0,0 +1,168 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import gspread
+
+import bulk_reader
+import report_writer
+from metrics import SHEETS_ERRORS, SHEETS_SECONDS
+from sheet_catalog import WorksheetCatalog
+
+# ================== CONFIG ==================
+
+SHEETS_WORKERS = int(os.getenv("SHEETS_WORKERS", 8))
+SHEETS_CONCURRENCY = int(os.getenv("SHEETS_CONCURRENCY", 4))
+
+
+# ================== GATEWAY ==================
+
+class SheetsGateway:
+    """Runs blocking gspread calls on a bounded thread pool so the event loop never waits on Sheets.
+
+    `open_spreadsheet` is a zero-argument callable (auth + open_by_key). It is
+    only called on first use, on the pool, so the bot can start and serve
+    commands from local state while Google is slow or unreachable.
+    """
+
+    def __init__(self, open_spreadsheet, max_workers=SHEETS_WORKERS, concurrency=SHEETS_CONCURRENCY,
+                 catalog=None):
+        self._open_spreadsheet = open_spreadsheet
+        self._spreadsheet = None
+        self._open_lock = asyncio.Lock()
+        self.catalog = catalog or WorksheetCatalog()
+        self._catalog_lock = asyncio.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="sheets",
+        )
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run any blocking callable on the Sheets pool, respecting the concurrency limit."""
+        operation = getattr(fn, "__name__", "call")
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            try:
+                return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+            except Exception as e:
+                SHEETS_ERRORS.inc(operation, type(e).__name__)
+                raise
+            finally:
+                SHEETS_SECONDS.observe(time.perf_counter() - started, operation)
+
+    # ---- spreadsheet level ----
+
+    async def spreadsheet(self):
+        """The opened spreadsheet; authorizes on first call and retries after a failure."""
+        if self._spreadsheet is None:
+            async with self._open_lock:
+                if self._spreadsheet is None:
+                    self._spreadsheet = await self.run(self._open_spreadsheet)
+        return self._spreadsheet
+
+    async def refresh_catalog(self):
+        sheet = await self.spreadsheet()
+        self.catalog.rebuild(await self.run(sheet.worksheets))
+
+    async def _ensure_catalog(self):
+        if not self.catalog.is_stale():
+            return
+        async with self._catalog_lock:
+            if self.catalog.is_stale():  # another caller may have refreshed while we waited
+                await self.refresh_catalog()
+
+    async def worksheet(self, title):
+        """Cached worksheet handle; raises WorksheetNotFound without an API call when missing."""
+        await self._ensure_catalog()
+        ws = self.catalog.get(title)
+        if ws is None:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return ws
+
+    async def find_worksheet(self, title):
+        """Cached worksheet handle, or None when no such sheet exists.
+
+        Only a missing sheet gives None; quota and network failures still
+        raise (SheetsUnavailable), so an outage is never mistaken for "absent".
+        """
+        await self._ensure_catalog()
+        return self.catalog.get(title)
+
+    async def read_rows(self, titles, first_column, last_column, first_row=2):
+        """{title: [[cells], ...]} for a block of columns from many worksheets, in batched reads."""
+        sheet = await self.spreadsheet()
+        return await self.run(bulk_reader.read_rows, sheet, titles, first_column, last_column, first_row)
+
+    async def read_ranges(self, ranges, width):
+        sheet = await self.spreadsheet()
+        return await self.run(bulk_reader.read_ranges, sheet, ranges, width)
+
+    async def batch_update(self, body):
+        sheet = await self.spreadsheet()
+        return await self.run(sheet.batch_update, body)
+
+    async def read_day_rows(self, layout, start, end):
+        """{date_str: [[date, username, screenshot, problem, id], ...]} between two dates, whatever the layout."""
+        await self._ensure_catalog()
+        titles = layout.titles(self.catalog, start, end)
+        sheet = await self.spreadsheet()
+        return await self.run(layout.read_rows, sheet, titles, start, end)
+
+    async def read_day_usernames(self, layout, start, end):
+        """{date_str: [usernames]} between two dates, whatever the layout."""
+        await self._ensure_catalog()
+        titles = layout.titles(self.catalog, start, end)
+        sheet = await self.spreadsheet()
+        return await self.run(layout.read_usernames, sheet, titles, start, end)
+
+    async def add_worksheet(self, title, rows, cols):
+        sheet = await self.spreadsheet()
+        ws = await self.run(sheet.add_worksheet, title, rows=rows, cols=cols)
+        self.catalog.add(ws)
+        return ws
+
+    async def ensure_worksheet(self, title, rows, cols, header):
+        """Return the worksheet, creating it with a header row when it doesn't exist yet."""
+        try:
+            return await self.worksheet(title)
+        except gspread.exceptions.WorksheetNotFound:
+            pass
+        try:
+            ws = await self.add_worksheet(title, rows=rows, cols=cols)
+        except gspread.exceptions.APIError:
+            # Created elsewhere (form sync, another admin) since the catalog was built.
+            await self.refresh_catalog()
+            ws = self.catalog.get(title)
+            if ws is None:
+                raise
+            return ws
+        await self.append_row(ws, header)
+        return ws
+
+    async def write_report(self, title, header, rows, percent_cols=()):
+        """Create and fill a report sheet with a constant number of API calls."""
+        sheet = await self.spreadsheet()
+        ws = await self.run(report_writer.write_report, sheet, title, header, rows, percent_cols)
+        self.catalog.add(ws)
+        return ws
+
+    # ---- worksheet level ----
+
+    async def append_row(self, ws, row):
+        return await self.run(ws.append_row, row)
+
+    async def append_rows(self, ws, rows):
+        return await self.run(ws.append_rows, rows)
+
+    async def col_values(self, ws, col):
+        return await self.run(ws.col_values, col)
+
+    async def get_all_values(self, ws):
+        return await self.run(ws.get_all_values)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,168 @@
+"""Per-user streaks for /streak and /leaderboard, kept up to date as days change.
+
+Each user's history is one integer with a bit per *counted* day, meaning
+days in `paused_dates` are left out of the numbering. Bit `n` is the n-th
+non-paused day from the start. A paused day therefore sits between its
+neighbours without breaking a streak and without extending one. A streak
+is then simply a run of set bits, and every question about it takes a
+handful of big-int operations:
+
+- current streak: the run ending today, or yesterday if today has no
+  submission yet (the day isn't over).
+- longest streak: cached per user. A new day only needs the run through it.
+  Clearing a day rescans that user only if the cleared day sat in their
+  longest run.
+- total days and days this month: popcount, of a masked window for the month.
+
+`update()` is called after every submit/delete, with the index already
+changed. `rebuild()` runs after the index is (re)loaded or reconciled with
+Sheets, which is also how form imports arrive, and after a pause or unpause
+renumbers the days.
+"""
+from bisect import bisect_left, bisect_right
+
+from submission_index import _ordinal
+
+
+def longest_run(bits):
+    """Length of the longest run of set bits, in O(log length) big-int operations."""
+    if not bits:
+        return 0
+    length, starts = 1, bits   # bit i of `starts` set <=> bits i .. i+length-1 all set
+    while True:
+        longer = starts & (starts >> length)
+        if not longer:
+            break
+        starts, length = longer, length * 2
+    step = length // 2
+    while step:
+        longer = starts & (starts >> step)
+        if longer:
+            starts, length = longer, length + step
+        step //= 2
+    return length
+
+
+def run_ending_at(bits, pos):
+    """Set bits in a row ending at `pos` (0 when bit `pos` is clear)."""
+    if pos < 0:
+        return 0
+    gaps = ~bits & ((1 << (pos + 1)) - 1)
+    return pos - gaps.bit_length() + 1
+
+
+def run_through(bits, pos):
+    """Length of the run of set bits that contains `pos` (0 when bit `pos` is clear)."""
+    down = run_ending_at(bits, pos)
+    if not down:
+        return 0
+    above = ~(bits >> pos)
+    return down + (above & -above).bit_length() - 2
+
+
+# ================== BOARD ==================
+
+class StreakBoard:
+    def __init__(self, index):
+        self.index = index
+        self._start = None    # ordinal of the first indexed day
+        self._paused = []     # sorted paused ordinals from _start on
+        self._bits = {}       # {username: int}, bit n = n-th counted day
+        self._longest = {}    # {username: longest streak}
+
+    def __len__(self):
+        return len(self._bits)
+
+    def _pos(self, o):
+        """Counted-day position of ordinal `o`, or None for a paused day."""
+        i = bisect_left(self._paused, o)
+        if i < len(self._paused) and self._paused[i] == o:
+            return None
+        return o - self._start - i
+
+    def _last_pos(self, o):
+        """Position of the last counted day on or before ordinal `o`."""
+        return o - self._start - bisect_right(self._paused, o)
+
+    def rebuild(self, usernames, paused_dates):
+        """Recompute every user's bits and longest streak from the index."""
+        first = self.index.first_day()
+        last = self.index.last_day()
+        self._bits.clear()
+        self._longest.clear()
+        if first is None:
+            self._start = None
+            self._paused = []
+            return
+        self._start = first.toordinal()
+        self._paused = sorted(o for o in map(_ordinal, paused_dates) if o >= self._start)
+        offsets = [o - self._start for o in reversed(self._paused) if o <= last.toordinal()]
+        _, rows = self.index.export(usernames, first, last)
+        for u, (bits, _) in rows.items():
+            for off in offsets:   # drop paused days, highest first so lower offsets stay valid
+                bits = bits & ((1 << off) - 1) | bits >> (off + 1) << off
+            self._bits[u] = bits
+            self._longest[u] = longest_run(bits)
+
+    def update(self, username, d):
+        """Match one user-day to the index after a submit or delete."""
+        o = _ordinal(d)
+        if self._start is None or o < self._start:
+            return False   # outside the numbering; the caller rebuilds
+        pos = self._pos(o)
+        if pos is None:
+            return True
+        bit = 1 << pos
+        bits = self._bits.get(username, 0)
+        if self.index.submitted_on(username, d):
+            bits |= bit
+            self._bits[username] = bits
+            self._longest[username] = max(self._longest.get(username, 0), run_through(bits, pos))
+        elif bits & bit:
+            rescan = run_through(bits, pos) == self._longest.get(username, 0)
+            bits &= ~bit
+            self._bits[username] = bits
+            if rescan:
+                self._longest[username] = longest_run(bits)
+        return True
+
+    # ---- queries ----
+
+    def current(self, username, today):
+        if self._start is None:
+            return 0
+        bits = self._bits.get(username, 0)
+        o = _ordinal(today)
+        pos = self._last_pos(o)
+        if self._pos(o) is None:   # paused today: the streak stands on the last counted day
+            return run_ending_at(bits, pos)
+        return run_ending_at(bits, pos) or run_ending_at(bits, pos - 1)
+
+    def month_days(self, username, today):
+        """Counted days with a submission from the 1st of today's month through today."""
+        if self._start is None:
+            return 0
+        o = _ordinal(today)
+        lo = max(self._last_pos(_ordinal(today.replace(day=1)) - 1) + 1, 0)
+        hi = self._last_pos(o)
+        if hi < lo:
+            return 0
+        return (self._bits.get(username, 0) >> lo & ((1 << (hi - lo + 1)) - 1)).bit_count()
+
+    def stats(self, username, today):
+        """(current streak, longest streak, total days, days this month)."""
+        return (
+            self.current(username, today),
+            self._longest.get(username, 0),
+            self._bits.get(username, 0).bit_count(),
+            self.month_days(username, today),
+        )
+
+    def ranking(self, usernames, today):
+        """[(username, current, longest, total days, month days)], best current streak first.
+
+        Ties go to the longer best streak, then to more days overall.
+        """
+        rows = [(u, *self.stats(u, today)) for u in usernames]
+        rows.sort(key=lambda r: (-r[1], -r[2], -r[3], r[0]))
+        return rows
@@ -0,0 +1,193 @@
+import datetime
+from collections import Counter
+
+
+def _ordinal(d):
+    if isinstance(d, str):
+        d = datetime.datetime.strptime(d, "%Y-%m-%d").date()
+    return d.toordinal()
+
+
+# ================== INDEX ==================
+
+class SubmissionIndex:
+    """Per-user submission history as one bit per day.
+
+    Bit `n` of a user's integer is set when they submitted on day
+    `base + n` (date ordinals). Window questions become a shift, a mask and
+    `int.bit_count()`. The rare extra submissions on an already-set day are
+    kept in a small side table, so submission totals stay exact as well.
+    """
+
+    def __init__(self):
+        self._base = None
+        self._bits = {}      # {username: int}
+        self._extra = {}     # {username: {ordinal: submissions beyond the first}}
+        self._days = set()   # ordinals that have ever held a submission
+
+    def __len__(self):
+        return len(self._bits)
+
+    def _pos(self, ordinal):
+        if self._base is None:
+            self._base = ordinal
+        elif ordinal < self._base:
+            shift = self._base - ordinal
+            self._bits = {u: bits << shift for u, bits in self._bits.items()}
+            self._base = ordinal
+        return ordinal - self._base
+
+    def _window(self, start, end):
+        """(shift, mask) selecting days start..end, or None when nothing is indexed there."""
+        if self._base is None:
+            return None
+        lo = max(_ordinal(start), self._base)
+        hi = _ordinal(end)
+        if hi < lo:
+            return None
+        return lo - self._base, (1 << (hi - lo + 1)) - 1
+
+    def _skip_mask(self, skip, start, end):
+        lo = max(_ordinal(start), self._base)
+        hi = _ordinal(end)
+        mask = 0
+        for d in skip:
+            o = _ordinal(d)
+            if lo <= o <= hi:
+                mask |= 1 << (o - lo)
+        return mask
+
+    # ---- updates ----
+
+    def add(self, username, d):
+        """Record one submission."""
+        o = _ordinal(d)
+        bit = 1 << self._pos(o)
+        self._days.add(o)
+        bits = self._bits.get(username, 0)
+        if bits & bit:
+            extra = self._extra.setdefault(username, {})
+            extra[o] = extra.get(o, 0) + 1
+        else:
+            self._bits[username] = bits | bit
+
+    def remove(self, username, d):
+        """Forget one submission; the day bit clears when the last one goes."""
+        if self._base is None or username not in self._bits:
+            return
+        o = _ordinal(d)
+        if o < self._base:
+            return
+        extra = self._extra.get(username)
+        if extra and o in extra:
+            extra[o] -= 1
+            if not extra[o]:
+                del extra[o]
+            return
+        self._bits[username] &= ~(1 << (o - self._base))
+
+    def set_day(self, d, usernames):
+        """Replace everything known about one day with the given submitter list (duplicates count)."""
+        o = _ordinal(d)
+        bit = 1 << self._pos(o)
+        if o in self._days:
+            for u in self._bits:
+                self._bits[u] &= ~bit
+            for extra in self._extra.values():
+                extra.pop(o, None)
+        self._days.add(o)
+        for u, n in Counter(usernames).items():
+            self._bits[u] = self._bits.get(u, 0) | bit
+            if n > 1:
+                self._extra.setdefault(u, {})[o] = n - 1
+
+    # ---- snapshots ----
+
+    def snapshot(self):
+        """JSON-safe copy of the index; bitmaps are stored as hex strings."""
+        return {
+            "base": self._base,
+            "bits": {u: format(bits, "x") for u, bits in self._bits.items()},
+            "extra": {u: {str(o): n for o, n in extra.items()} for u, extra in self._extra.items() if extra},
+            "days": sorted(self._days),
+        }
+
+    def restore(self, data):
+        """Replace the whole index with a `snapshot()`; loading twice changes nothing."""
+        self._base = data["base"]
+        self._bits = {u: int(bits, 16) for u, bits in data["bits"].items()}
+        self._extra = {u: {int(o): n for o, n in extra.items()} for u, extra in data["extra"].items()}
+        self._days = set(data["days"])
+
+    # ---- queries ----
+
+    def submitted_on(self, username, d):
+        o = _ordinal(d)
+        if self._base is None or o < self._base:
+            return False
+        return bool(self._bits.get(username, 0) >> (o - self._base) & 1)
+
+    def first_day(self):
+        """Earliest date the index holds data for, or None when empty."""
+        return datetime.date.fromordinal(min(self._days)) if self._days else None
+
+    def last_day(self):
+        """Latest date the index holds data for, or None when empty."""
+        return datetime.date.fromordinal(max(self._days)) if self._days else None
+
+    def export(self, usernames, start, end):
+        """(days, {username: (bits, {day offset: extra submissions})}) for a date window.
+
+        Bit / offset `n` is day `start + n`, whatever the index's own base.
+        """
+        lo, hi = _ordinal(start), _ordinal(end)
+        days = hi - lo + 1
+        mask = (1 << days) - 1
+        out = {}
+        for u in usernames:
+            bits = self._bits.get(u, 0)
+            if self._base is None:
+                bits = 0
+            elif lo >= self._base:
+                bits = bits >> (lo - self._base) & mask
+            else:
+                bits = bits << (self._base - lo) & mask
+            extra = {o - lo: n for o, n in self._extra.get(u, {}).items() if lo <= o <= hi}
+            out[u] = (bits, extra)
+        return days, out
+
+    def known_days(self, start, end):
+        """ISO dates between two dates (inclusive) that the index holds any data for."""
+        lo, hi = _ordinal(start), _ordinal(end)
+        return {datetime.date.fromordinal(o).isoformat() for o in self._days if lo <= o <= hi}
+
+    def active_days(self, start, end):
+        """Number of days between two dates (inclusive) on which anyone submitted."""
+        window = self._window(start, end)
+        if window is None:
+            return 0
+        shift, mask = window
+        union = 0
+        for bits in self._bits.values():
+            union |= bits >> shift & mask
+        return union.bit_count()
+
+    def days_between(self, usernames, start, end, skip=()):
+        """{username: days with at least one submission} between two dates (inclusive)."""
+        window = self._window(start, end)
+        if window is None:
+            return {u: 0 for u in usernames}
+        shift, mask = window
+        mask &= ~self._skip_mask(skip, start, end)
+        return {u: (self._bits.get(u, 0) >> shift & mask).bit_count() for u in usernames}
+
+    def submissions_between(self, usernames, start, end, skip=()):
+        """{username: submissions} between two dates (inclusive), counting repeats on a day."""
+        counts = self.days_between(usernames, start, end, skip)
+        lo, hi = _ordinal(start), _ordinal(end)
+        skipped = {_ordinal(d) for d in skip}
+        for u in counts:
+            extra = self._extra.get(u)
+            if extra:
+                counts[u] += sum(n for o, n in extra.items() if lo <= o <= hi and o not in skipped)
+        return counts